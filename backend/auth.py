@@ -1,14 +1,31 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
+from starlette.concurrency import run_in_threadpool
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.orm import Session
-from .database import get_db
+from .cache import make_cache, offload, shared_client
+from .config import Settings, get_settings
+from .database import run_in_read_session
+from .metrics import BCRYPT_SECONDS
 from . import models
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Changing BCRYPT_ROUNDS makes existing hashes "need update"; they are rehashed on next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+HASH_QUEUE_DEPTH = int(os.getenv("HASH_QUEUE_DEPTH", "64"))
+HASH_RETRY_AFTER = os.getenv("HASH_RETRY_AFTER", "1")
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 bearer_scheme = HTTPBearer()
 
 def hash_password(password: str) -> str:
@@ -17,34 +34,109 @@ def hash_password(password: str) -> str:
 def verify_password(password: str, password_hash: str) -> bool:
     return pwd_context.verify(password, password_hash)
 
+def verify_and_update(password: str, password_hash: str):
+    """(ok, new_hash); new_hash is set when the stored hash uses an outdated cost."""
+    return pwd_context.verify_and_update(password, password_hash)
+
+class HashPool:
+    """Bounded process pool for bcrypt so hashing never holds the server's GIL.
+
+    At most `workers + queue_depth` calls are admitted at once; beyond that the
+    caller gets a 503 with Retry-After instead of queueing unboundedly. With
+    `workers=0` calls run in the threadpool instead (handy for tests and dev).
+    """
+
+    def __init__(self, workers: int = HASH_WORKERS, queue_depth: int = HASH_QUEUE_DEPTH):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + queue_depth)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    # spawn: forking a threaded server process is not safe
+                    self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent logins, retry shortly",
+                headers={"Retry-After": HASH_RETRY_AFTER},
+            )
+        start = time.perf_counter()
+        try:
+            if self.workers <= 0:
+                return await run_in_threadpool(fn, *args)
+            return await asyncio.wrap_future(self._pool().submit(fn, *args))
+        finally:
+            self._slots.release()
+            BCRYPT_SECONDS.observe(time.perf_counter() - start, fn.__name__)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+hash_pool = HashPool()
+
+async def hash_password_async(password: str) -> str:
+    return await hash_pool.run(hash_password, password)
+
+async def verify_and_update_async(password: str, password_hash: str):
+    return await hash_pool.run(verify_and_update, password, password_hash)
+
 def create_access_token(data: dict, secret_key: str, algorithm: str, expires_minutes: int = 60):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=expires_minutes)
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, secret_key, algorithm=algorithm)
 
-def get_current_user(
+@dataclass(frozen=True)
+class Principal:
+    """The parts of a User that authenticated handlers need, cacheable across requests."""
+    id: int
+    username: str
+    is_admin: bool
+    team_id: Optional[int]
+
+# Keyed by token subject (username); mutations that change a user's team call forget_principal.
+# With CACHE_URL pointing at Redis the entries (and their eviction) are shared by all workers.
+principal_cache = make_cache(shared_client, "principal", get_settings().principal_cache_size, get_settings().principal_cache_ttl)
+
+def forget_principal(username: str):
+    principal_cache.pop(username)
+
+def get_user_by_username(db: Session, username: str) -> Optional[models.User]:
+    return db.query(models.User).filter(models.User.username == username).first()
+
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
-    db: Session = Depends(get_db),
-    settings: dict = Depends(lambda: {})
-):
+    settings: Settings = Depends(get_settings)
+) -> Principal:
     token = credentials.credentials
-    secret_key = settings["SECRET_KEY"]
-    algorithm = settings.get("ALGORITHM", "HS256")
     try:
-        payload = jwt.decode(token, secret_key, algorithms=[algorithm])
+        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
         username: str = payload.get("sub")
         if username is None:
             raise HTTPException(status_code=401, detail="Invalid token payload")
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
-    return user
+    principal = await offload(principal_cache, principal_cache.get, username)
+    if principal is None:
+        # A read: off the single writer connection when SQLite reads and writes are split
+        user = await run_in_read_session(get_user_by_username, username)
+        if not user:
+            raise HTTPException(status_code=401, detail="User not found")
+        principal = Principal(id=user.id, username=user.username, is_admin=bool(user.is_admin), team_id=user.team_id)
+        await offload(principal_cache, principal_cache.set, username, principal)
+    return principal
 
-def require_admin(user: models.User = Depends(get_current_user)):
+async def require_admin(user: Principal = Depends(get_current_user)):
     if not user.is_admin:
         raise HTTPException(status_code=403, detail="Admin privilege required")
     return user
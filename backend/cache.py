@@ -0,0 +1,370 @@
+import json
+import logging
+import os
+import pickle
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+from starlette.concurrency import run_in_threadpool
+
+# Empty / memory:// keeps every cache in this process. redis://host:6379/0 shares them
+# between workers and replicas; fakeredis:// runs the Redis code path in-process (dev/tests).
+CACHE_URL = os.getenv("CACHE_URL", "")
+CACHE_PREFIX = os.getenv("CACHE_PREFIX", "ml-league")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+# Bus messages waiting for the sender thread; past this (Redis down) new ones are dropped
+BUS_QUEUE_SIZE = int(os.getenv("BUS_QUEUE_SIZE", "10000"))
+
+log = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Thread-safe LRU mapping whose entries also expire `ttl` seconds after being set.
+
+    This is the in-process cache backend. `incr`/`counter`/`setdefault` work on a
+    separate set of keys that never expire or get evicted.
+    """
+
+    remote = False
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self._meta = {}
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                self.evictions += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+            return None if item is None else item[0]
+
+    def drop_prefix(self, prefix: tuple):
+        """Remove every entry whose (tuple) key starts with `prefix`."""
+        n = len(prefix)
+        with self._lock:
+            for key in [k for k in self._data if isinstance(k, tuple) and k[:n] == prefix]:
+                del self._data[key]
+
+    def incr(self, key) -> int:
+        with self._lock:
+            self._meta[key] = self._meta.get(key, 0) + 1
+            return self._meta[key]
+
+    def counter(self, key) -> int:
+        return self._meta.get(key, 0)
+
+    def setdefault(self, key, value):
+        with self._lock:
+            return self._meta.setdefault(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "entries": len(self._data), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCache:
+    """TTLCache-compatible backend over any Redis-protocol client (redis-py, fakeredis).
+
+    Keys are namespaced as `<prefix>:<namespace>:<key>`; tuple keys are encoded as
+    JSON so every worker derives the same string. Values are pickled: the cache is
+    trusted infrastructure, like the database. Calls are synchronous round trips:
+    async code goes through `offload()`, which runs them in the threadpool. Bumps
+    and principal evictions made inside a `run_sync` transaction stay inline; in
+    async database mode that body runs on the event loop, so there each of those
+    round trips still blocks the worker (once per mutation, not per read).
+    """
+
+    remote = True
+
+    def __init__(self, client, namespace: str, ttl: float, prefix: str = CACHE_PREFIX):
+        self.client = client
+        self.ttl = ttl
+        self._ns = f"{prefix}:{namespace}:"
+        self.hits = self.misses = 0
+
+    def _key(self, key) -> str:
+        if isinstance(key, tuple):
+            key = json.dumps(_plain(key), default=str, separators=(",", ":"))
+        return self._ns + key
+
+    def get(self, key):
+        raw = self.client.get(self._key(key))
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return pickle.loads(raw)
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        self.client.set(self._key(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), px=max(int(ttl * 1000), 1))
+
+    def pop(self, key):
+        self.client.delete(self._key(key))
+
+    def drop_prefix(self, prefix: tuple):
+        # Scanning the keyspace on every mutation would cost more than it saves; callers
+        # put a version in their keys, so stale entries are unreachable and age out by TTL.
+        pass
+
+    def incr(self, key) -> int:
+        return int(self.client.incr(self._ns + "meta:" + key))
+
+    def counter(self, key) -> int:
+        return int(self.client.get(self._ns + "meta:" + key) or 0)
+
+    def setdefault(self, key, value):
+        self.client.set(self._ns + "meta:" + key, value, nx=True)
+        return self.client.get(self._ns + "meta:" + key).decode()
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self._ns + "*", count=1000):
+            if b":meta:" not in key:
+                self.client.delete(key)
+
+    def stats(self) -> dict:
+        out = {"backend": "redis", "hits": self.hits, "misses": self.misses, "evictions": None}
+        try:
+            # Memory-pressure evictions are server-wide; the server does not break them down per key prefix
+            out["evictions"] = int(self.client.info("stats").get("evicted_keys", 0))
+        except Exception:  # servers/fakes without INFO
+            pass
+        return out
+
+
+async def offload(store, fn, *args, **kwargs):
+    """`fn(*args, **kwargs)`, in the threadpool when `store` is remote (Redis) so the
+    round trip does not block the event loop; in-process stores are called inline."""
+    if store.remote:
+        return await run_in_threadpool(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+def _plain(key):
+    # Sets iterate in a per-process (hash-seeded) order; sort them so keys match across workers
+    if isinstance(key, (set, frozenset)):
+        return sorted(_plain(k) for k in key)
+    if isinstance(key, (tuple, list)):
+        return [_plain(k) for k in key]
+    return key
+
+
+class InvalidationBus:
+    """Cross-worker fan-out of invalidation messages over Redis pub/sub.
+
+    Without Redis there is a single process and `publish()` is a no-op. Handlers
+    run on a background listener thread and never see this process's own messages.
+    `publish()` only queues the message: a sender thread makes the Redis round trip,
+    in publish order, so callers holding a lock (the leaderboard emits its changes
+    under its own) never wait on Redis.
+    """
+
+    def __init__(self, client=None, channel: str = f"{CACHE_PREFIX}:invalidate", queue_size: int = BUS_QUEUE_SIZE):
+        self.client = client
+        self.channel = channel
+        self.node = os.urandom(8).hex()  # tags messages so a worker skips its own
+        self._handlers = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._outbox = queue.Queue(queue_size)
+        self._sender = None
+        self.sent = self.received = self.dropped = 0
+
+    def subscribe(self, handler):
+        self._handlers.append(handler)
+
+    def publish(self, message: dict):
+        if self.client is None:
+            return
+        try:
+            self._outbox.put_nowait(json.dumps({"node": self.node, **message}, separators=(",", ":")))
+        except queue.Full:
+            # Other workers miss this change until their next reload or TTL expiry
+            self.dropped += 1
+            if self.dropped % 1000 == 1:
+                log.warning("cache bus: send queue full, %d message(s) dropped so far", self.dropped)
+
+    def start(self):
+        if self.client is None or self._thread is not None:
+            return
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, args=(pubsub,), name="cache-bus", daemon=True)
+        self._thread.start()
+        self._sender = threading.Thread(target=self._send, name="cache-bus-send", daemon=True)
+        self._sender.start()
+
+    def _send(self):
+        while True:
+            data = self._outbox.get()
+            if data is None:
+                return
+            try:
+                self.client.publish(self.channel, data)
+                self.sent += 1
+            except Exception:
+                self.dropped += 1
+                log.exception("cache bus: publish failed, message dropped")
+
+    def _listen(self, pubsub):
+        try:
+            while not self._stop.is_set():
+                try:
+                    msg = pubsub.get_message(timeout=1.0)
+                except Exception:
+                    log.exception("cache bus: lost connection, retrying")
+                    time.sleep(1.0)
+                    continue
+                if msg is None:
+                    continue
+                message = json.loads(msg["data"])
+                if message.pop("node", None) == self.node:
+                    continue
+                self.received += 1
+                for handler in self._handlers:
+                    try:
+                        handler(message)
+                    except Exception:
+                        log.exception("cache bus: handler failed for %s", message.get("type"))
+        finally:
+            pubsub.close()
+
+    def stop(self):
+        if self._sender is not None:
+            # Queued messages go out first
+            self._outbox.put(None)
+            self._sender.join(timeout=5)
+            self._sender = None
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+def redis_client(url: str = CACHE_URL):
+    """Client for CACHE_URL, or None when caches stay in-process."""
+    if not url or url.startswith("memory://"):
+        return None
+    if url.startswith("fakeredis://"):
+        import fakeredis
+        return fakeredis.FakeRedis(server=_fake_server())
+    import redis
+    return redis.Redis.from_url(url, socket_timeout=1.0, socket_connect_timeout=1.0, health_check_interval=30)
+
+
+_fake = None
+
+def _fake_server():
+    global _fake
+    if _fake is None:
+        import fakeredis
+        _fake = fakeredis.FakeServer()
+    return _fake
+
+
+def make_cache(client, namespace: str, maxsize: int, ttl: float):
+    """A Redis-backed cache when `client` is set, otherwise an in-process TTLCache."""
+    if client is None:
+        return TTLCache(maxsize, ttl)
+    return RedisCache(client, namespace, ttl)
+
+
+# Shared by every cache in the process; None without Redis
+shared_client = redis_client()
+bus = InvalidationBus(shared_client)
+
+
+class ResponseCache:
+    """Pre-serialized JSON bodies for public endpoints, tagged with a version.
+
+    Any mutation calls `bump()`, which advances the version; bodies are stored under
+    (version, key), so older ones are never served again. The version and epoch live
+    in the backing store, so with Redis every worker hands out the same ETags, and
+    bumps are broadcast on the bus so other workers switch versions right away. The
+    ETag only depends on the version, so conditional requests can be answered
+    without building anything.
+    """
+
+    def __init__(self, backend=None, max_entries: int = RESPONSE_CACHE_SIZE, bus: InvalidationBus = None):
+        self.backend = backend if backend is not None else TTLCache(max_entries, RESPONSE_CACHE_TTL)
+        self.bus = bus
+        self._lock = threading.Lock()
+        self._epoch = os.urandom(4).hex()  # keeps ETags unique across restarts
+        self._version = 0
+        self.max_entries = max_entries
+        if bus is not None:
+            bus.subscribe(self._on_message)
+
+    def load(self):
+        """Adopt the epoch and version already in the backend (shared with other workers)."""
+        with self._lock:
+            self._epoch = self.backend.setdefault("epoch", self._epoch)
+            self._version = max(self._version, self.backend.counter("version"))
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def etag(self, version: int = None) -> str:
+        return f'"{self._epoch}-{self._version if version is None else version}"'
+
+    def bump(self):
+        with self._lock:
+            old, self._version = self._version, self.backend.incr("version")
+        self.backend.drop_prefix((old,))
+        if self.bus is not None:
+            self.bus.publish({"type": "bump", "version": self._version})
+
+    def _on_message(self, message: dict):
+        if message["type"] == "bump":
+            with self._lock:
+                self._version = max(self._version, message["version"])
+
+    def lookup(self, key):
+        """Return (version, body) for `key`; body is None on a miss."""
+        version = self._version
+        return version, self.backend.get((version, key))
+
+    def store(self, key, version: int, body):
+        # Drop bodies built from data that was committed over while building
+        if self._version == version:
+            self.backend.set((version, key), body)
+
+    def stats(self) -> dict:
+        return {"version": self._version, **self.backend.stats()}
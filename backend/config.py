@@ -0,0 +1,26 @@
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from dotenv import load_dotenv
+
+
+@dataclass(frozen=True)
+class Settings:
+    secret_key: str
+    algorithm: str
+    access_token_expire_minutes: int
+    principal_cache_ttl: float
+    principal_cache_size: int
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Read configuration from the environment once and share it for the process lifetime."""
+    load_dotenv()
+    return Settings(
+        secret_key=os.getenv("SECRET_KEY", "change-me-in-prod"),
+        algorithm=os.getenv("ALGORITHM", "HS256"),
+        access_token_expire_minutes=int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "240")),
+        principal_cache_ttl=float(os.getenv("PRINCIPAL_CACHE_TTL", "30")),
+        principal_cache_size=int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000")),
+    )
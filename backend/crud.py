@@ -0,0 +1,350 @@
+import math
+from collections import defaultdict
+from sqlalchemy import bindparam, case, delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from . import models
+
+# Keep IN (...) lists under SQLite's bound-parameter limit
+_IN_CHUNK = 500
+
+def _chunks(items, size=_IN_CHUNK):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _team_cols():
+    t = models.Team.__table__
+    return (t.c.id, t.c.name, t.c.banned, t.c.submission_count, t.c.total_score, t.c.version)
+
+def team_rows(db: Session, team_ids):
+    """Lightweight (id, name, banned, submission_count, total_score, version) rows for `team_ids`."""
+    t = models.Team.__table__
+    out = []
+    for chunk in _chunks(list(team_ids)):
+        out.extend(db.execute(select(*_team_cols()).where(t.c.id.in_(chunk))).all())
+    return out
+
+def active_team_rows(db: Session):
+    """(id, name, banned, submission_count, total_score, version) rows of every non-banned team."""
+    t = models.Team.__table__
+    return db.execute(select(*_team_cols()).where(t.c.banned == False)).all()
+
+def submission_series(db: Session):
+    """(team_id, submitted_at, score) of every submission in id order, streamed.
+
+    Not in (team_id, submitted_at) order: that index does not cover score, and
+    fetching each row through it is ~3x slower than reading the table straight.
+    """
+    s = models.Submission.__table__
+    stmt = select(s.c.team_id, s.c.submitted_at, s.c.score).order_by(s.c.id)
+    return db.execute(stmt, execution_options={"yield_per": 10_000})
+
+def record_submission(db: Session, team_id: int, score: float, week):
+    """Insert one submission and bump its team's aggregates atomically on the server.
+
+    Returns (submission_row, team_row), or None when the team is missing or banned.
+    The aggregate UPDATE runs first so concurrent writers serialize on the team row
+    instead of racing a read-modify-write in Python.
+    """
+    teams, subs = models.Team.__table__, models.Submission.__table__
+    dialect = db.get_bind().dialect
+    bump = (
+        update(teams)
+        .where(teams.c.id == team_id, teams.c.banned == False)
+        .values(
+            submission_count=teams.c.submission_count + 1, total_score=teams.c.total_score + score,
+            version=teams.c.version + 1,
+        )
+    )
+    add = insert(subs).values(team_id=team_id, score=score, week=week)
+    if dialect.update_returning and dialect.insert_returning:
+        team = db.execute(bump.returning(*_team_cols())).first()
+        if team is None:
+            db.rollback()
+            return None
+        sub = db.execute(add.returning(*subs.c)).first()
+    else:
+        if db.execute(bump).rowcount == 0:
+            db.rollback()
+            return None
+        sub_id = db.execute(add).inserted_primary_key[0]
+        team = db.execute(select(*_team_cols()).where(teams.c.id == team_id)).first()
+        sub = db.execute(select(*subs.c).where(subs.c.id == sub_id)).first()
+    if week is not None:
+        bump_weekly(db, {(team_id, week): (1, score, score)})
+    db.commit()
+    return sub, team
+
+def bump_weekly(db: Session, deltas):
+    """Fold {(team_id, week): (count, total, best)} into weekly_scores with an upsert."""
+    if not deltas:
+        return
+    ws = models.WeeklyScore.__table__
+    rows = [
+        {"team_id": team_id, "week": week, "count": n, "total": total, "best": best}
+        for (team_id, week), (n, total, best) in deltas.items()
+    ]
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        stmt = (sqlite.insert if dialect == "sqlite" else postgresql.insert)(ws)
+        new = stmt.excluded
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[ws.c.team_id, ws.c.week],
+                set_={
+                    "count": ws.c["count"] + new["count"],
+                    "total": ws.c.total + new.total,
+                    "best": case((new.best > ws.c.best, new.best), else_=ws.c.best),
+                },
+            ),
+            rows,
+        )
+        return
+    for row in rows:
+        key = (ws.c.team_id == row["team_id"]) & (ws.c.week == row["week"])
+        updated = db.execute(
+            update(ws).where(key).values(
+                count=ws.c["count"] + row["count"],
+                total=ws.c.total + row["total"],
+                best=case((ws.c.best < row["best"], row["best"]), else_=ws.c.best),
+            )
+        )
+        if updated.rowcount == 0:
+            db.execute(insert(ws).values(**row))
+
+def _insert_returning(db: Session, rows):
+    """Bulk-insert submission `rows`, returning the stored rows in the same order."""
+    subs = models.Submission.__table__
+    if db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        return db.execute(insert(subs).returning(*subs.c, sort_by_parameter_order=True), rows).all()
+    ids = [db.execute(insert(subs).values(**row)).inserted_primary_key[0] for row in rows]
+    stored = {}
+    for chunk in _chunks(ids):
+        stored.update((r.id, r) for r in db.execute(select(*subs.c).where(subs.c.id.in_(chunk))))
+    return [stored[i] for i in ids]
+
+def ingest_submissions(db: Session, rows, returning: bool = False):
+    """Insert validated batch rows and fold them into team aggregates in one transaction.
+
+    `rows` is a list of (row_index, SubmissionBatchRow). Rows for unknown or banned
+    teams are rejected; the rest are bulk-inserted and each touched team gets a single
+    grouped UPDATE. Returns (results, touched_team_rows); with `returning`, accepted
+    results also carry the stored row as "submission".
+    """
+    status = {r.id: r.banned for r in team_rows(db, {row.team_id for _, row in rows})}
+    results, accepted, accepted_results = [], [], []
+    deltas = defaultdict(lambda: [0, 0.0])
+    weekly = {}
+    for index, row in rows:
+        if row.team_id not in status:
+            results.append({"row": index, "ok": False, "team_id": row.team_id, "detail": "Team not found"})
+            continue
+        if status[row.team_id]:
+            results.append({"row": index, "ok": False, "team_id": row.team_id, "detail": "Team is banned"})
+            continue
+        accepted.append({"team_id": row.team_id, "score": float(row.score), "week": row.week})
+        delta = deltas[row.team_id]
+        delta[0] += 1
+        delta[1] += float(row.score)
+        if row.week is not None:
+            n, total, best = weekly.get((row.team_id, row.week), (0, 0.0, float(row.score)))
+            weekly[(row.team_id, row.week)] = (n + 1, total + float(row.score), max(best, float(row.score)))
+        results.append({"row": index, "ok": True, "team_id": row.team_id, "detail": None})
+        accepted_results.append(results[-1])
+
+    if not accepted:
+        return results, []
+    teams = models.Team.__table__
+    if returning:
+        for result, stored in zip(accepted_results, _insert_returning(db, accepted)):
+            result["submission"] = dict(stored._mapping)
+    else:
+        db.execute(insert(models.Submission.__table__), accepted)
+    db.execute(
+        update(teams)
+        .where(teams.c.id == bindparam("tid"))
+        .values(
+            submission_count=teams.c.submission_count + bindparam("n"),
+            total_score=teams.c.total_score + bindparam("s"),
+            version=teams.c.version + 1,
+        ),
+        [{"tid": tid, "n": n, "s": s} for tid, (n, s) in deltas.items()],
+    )
+    bump_weekly(db, weekly)
+    db.commit()
+    return results, team_rows(db, deltas.keys())
+
+def team_members(db: Session, team_ids):
+    """Usernames of the users in any of `team_ids`."""
+    users = models.User.__table__
+    out = []
+    for chunk in _chunks(list(team_ids)):
+        out.extend(db.execute(select(users.c.username).where(users.c.team_id.in_(chunk))).scalars())
+    return out
+
+def set_teams_banned(db: Session, team_ids, banned: bool):
+    """Ban or unban `team_ids` with one UPDATE per chunk, in one transaction.
+
+    Returns the (id, name, banned, submission_count, total_score, version) rows of the teams found.
+    """
+    teams = models.Team.__table__
+    team_ids = sorted(set(team_ids))
+    for chunk in _chunks(team_ids):
+        db.execute(update(teams).where(teams.c.id.in_(chunk)).values(banned=banned, version=teams.c.version + 1))
+    db.commit()
+    return team_rows(db, team_ids)
+
+def delete_teams(db: Session, team_ids):
+    """Delete `team_ids` with set-based statements in one transaction: their weekly
+    scores and submissions, then the teams; members are left without a team.
+
+    The foreign keys say as much (ON DELETE CASCADE / SET NULL), but SQLite only
+    enforces them with PRAGMA foreign_keys, so nothing here relies on them. Returns
+    ((id, version) rows of the teams deleted, usernames of their former members).
+    """
+    teams, subs, ws, users = (
+        models.Team.__table__, models.Submission.__table__, models.WeeklyScore.__table__, models.User.__table__
+    )
+    deleted, members = [], []
+    for chunk in _chunks(sorted(set(team_ids))):
+        deleted.extend(db.execute(select(teams.c.id, teams.c.version).where(teams.c.id.in_(chunk))).all())
+        members.extend(db.execute(select(users.c.username).where(users.c.team_id.in_(chunk))).scalars())
+        db.execute(update(users).where(users.c.team_id.in_(chunk)).values(team_id=None))
+        db.execute(delete(ws).where(ws.c.team_id.in_(chunk)))
+        db.execute(delete(subs).where(subs.c.team_id.in_(chunk)))
+        db.execute(delete(teams).where(teams.c.id.in_(chunk)))
+    db.commit()
+    return deleted, members
+
+def reconcile_team_aggregates(db: Session, repair: bool = False):
+    """Compare teams.submission_count/total_score with what the submissions table says.
+
+    Returns a list of drift records. With `repair`, drifted teams are recomputed by a
+    single correlated UPDATE so submissions landing meanwhile are not lost.
+    """
+    teams, subs = models.Team.__table__, models.Submission.__table__
+    actual = (
+        select(subs.c.team_id, func.count().label("n"), func.sum(subs.c.score).label("total"))
+        .group_by(subs.c.team_id)
+        .subquery()
+    )
+    rows = db.execute(
+        select(
+            teams.c.id, teams.c.submission_count, teams.c.total_score,
+            func.coalesce(actual.c.n, 0), func.coalesce(actual.c.total, 0.0),
+        ).select_from(teams.outerjoin(actual, actual.c.team_id == teams.c.id))
+    ).all()
+    drift = [
+        {
+            "team_id": team_id,
+            "submission_count": count, "expected_submission_count": n,
+            "total_score": total, "expected_total_score": expected,
+        }
+        for team_id, count, total, n, expected in rows
+        if (count or 0) != n or not math.isclose(total or 0.0, expected, rel_tol=1e-9, abs_tol=1e-6)
+    ]
+    if repair and drift:
+        correlated = subs.c.team_id == teams.c.id
+        for chunk in _chunks([d["team_id"] for d in drift]):
+            db.execute(
+                update(teams)
+                .where(teams.c.id.in_(chunk))
+                .values(
+                    submission_count=select(func.count()).where(correlated).scalar_subquery(),
+                    total_score=select(func.coalesce(func.sum(subs.c.score), 0.0)).where(correlated).scalar_subquery(),
+                    version=teams.c.version + 1,
+                )
+            )
+        db.commit()
+    return drift
+
+def rebuild_weekly_scores(db: Session) -> int:
+    """Recompute weekly_scores from submissions with one INSERT ... SELECT pass."""
+    ws, subs = models.WeeklyScore.__table__, models.Submission.__table__
+    db.execute(delete(ws))
+    db.execute(
+        insert(ws).from_select(
+            ["team_id", "week", "total", "best", "count"],
+            select(subs.c.team_id, subs.c.week, func.sum(subs.c.score), func.max(subs.c.score), func.count())
+            .where(subs.c.week.isnot(None))
+            .group_by(subs.c.team_id, subs.c.week),
+        )
+    )
+    db.commit()
+    return db.execute(select(func.count()).select_from(ws)).scalar()
+
+def ensure_weekly_scores(db: Session):
+    """Backfill weekly_scores once when it is empty but labelled submissions exist."""
+    ws, subs = models.WeeklyScore.__table__, models.Submission.__table__
+    if db.execute(select(ws.c.team_id).limit(1)).first() is not None:
+        return
+    if db.execute(select(subs.c.id).where(subs.c.week.isnot(None)).limit(1)).first() is not None:
+        rebuild_weekly_scores(db)
+
+def _row_dict(row) -> dict:
+    # Keys of subquery columns are SQLAlchemy label objects, which orjson rejects
+    return {str(key): value for key, value in row._mapping.items()}
+
+def _ranked(rows, offset: int):
+    return [{"rank": offset + i + 1, **_row_dict(row)} for i, row in enumerate(rows)]
+
+def weekly_leaderboard(db: Session, week: str, offset: int = 0, limit=None):
+    ws, teams = models.WeeklyScore.__table__, models.Team.__table__
+    rows = db.execute(
+        select(
+            ws.c.team_id, teams.c.name.label("team_name"), ws.c.week,
+            ws.c.total, ws.c.best, ws.c["count"].label("submission_count"),
+        )
+        .join(teams, teams.c.id == ws.c.team_id)
+        .where(ws.c.week == week, teams.c.banned == False)
+        .order_by(ws.c.total.desc(), ws.c.team_id)
+        .offset(offset).limit(limit)
+    ).all()
+    return _ranked(rows, offset)
+
+def multi_week_leaderboard(db: Session, mode: str, n: int = 3, offset: int = 0, limit=None):
+    """Rank teams across weeks: `sum_of_weeks` adds every weekly total, `best_of`
+    adds only each team's best `n` weekly totals."""
+    ws, teams = models.WeeklyScore.__table__, models.Team.__table__
+    source = ws
+    if mode == "best_of":
+        ranked = select(
+            ws.c.team_id, ws.c.total,
+            func.row_number().over(partition_by=ws.c.team_id, order_by=ws.c.total.desc()).label("rn"),
+        ).subquery()
+        source = select(ranked.c.team_id, ranked.c.total).where(ranked.c.rn <= n).subquery()
+    score = func.sum(source.c.total).label("score")
+    rows = db.execute(
+        select(source.c.team_id, teams.c.name.label("team_name"), func.count().label("weeks"), score)
+        .join(teams, teams.c.id == source.c.team_id)
+        .where(teams.c.banned == False)
+        .group_by(source.c.team_id, teams.c.name)
+        .order_by(score.desc(), source.c.team_id)
+        .offset(offset).limit(limit)
+    ).all()
+    return _ranked(rows, offset)
+
+def list_weeks(db: Session):
+    ws = models.WeeklyScore.__table__
+    rows = db.execute(
+        select(
+            ws.c.week, func.count().label("teams"),
+            func.sum(ws.c["count"]).label("submissions"), func.max(ws.c.total).label("top_total"),
+        ).group_by(ws.c.week).order_by(ws.c.week.desc())
+    ).all()
+    return [_row_dict(row) for row in rows]
+
+def week_and_previous_scores(db: Session, week=None):
+    """(week, previous, week_rows, previous_rows): `week` (default: the latest), the
+    latest week before it, and the (team_id, total) weekly_scores rows of each."""
+    ws = models.WeeklyScore.__table__
+    weeks = select(ws.c.week).distinct().order_by(ws.c.week.desc())
+    if week is None:
+        found = db.execute(weeks.limit(2)).scalars().all()
+        week, previous = (found + [None, None])[:2]
+    else:
+        previous = db.execute(weeks.where(ws.c.week < week).limit(1)).scalar()
+
+    def scores(w):
+        return db.execute(select(ws.c.team_id, ws.c.total).where(ws.c.week == w)).all() if w is not None else []
+    return week, previous, scores(week), scores(previous)
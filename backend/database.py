@@ -1,17 +1,227 @@
+import asyncio
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from fastapi import Request
+from starlette.concurrency import run_in_threadpool
+from .metrics import instrument_engine, timed_pool
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./app.db")
 
+# Async mode is opt-in through the driver in the URL, e.g. sqlite+aiosqlite:// or postgresql+asyncpg://
+ASYNC_DRIVERS = ("+aiosqlite", "+asyncpg", "+aiomysql", "+asyncmy", "+psycopg_async")
+ASYNC_MODE = any(driver in DATABASE_URL.split("://", 1)[0] for driver in ASYNC_DRIVERS)
+
+# Scale-out against one server (PostgreSQL): every worker of every API node has its
+# own pool, so by default they split the server's connection budget between them.
+# WEB_CONCURRENCY is the worker count (uvicorn and gunicorn read it too), DB_NODES
+# the number of API nodes; DB_POOL_SIZE / DB_MAX_OVERFLOW still win when set.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+DB_NODES = int(os.getenv("DB_NODES", "1"))
+# Server max_connections, less what migrations, psql and monitoring keep in reserve
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "100"))
+DB_RESERVED_CONNECTIONS = int(os.getenv("DB_RESERVED_CONNECTIONS", "10"))
+
+def pool_limits(workers: int = WEB_CONCURRENCY, nodes: int = DB_NODES):
+    """(pool_size, max_overflow) for one worker: its share of the connection budget,
+    at most 10 + 20 (the single-process defaults) and at least 2. Past budget / 2
+    workers in total, put PgBouncer in front rather than shrinking pools further."""
+    share = max(2, (DB_MAX_CONNECTIONS - DB_RESERVED_CONNECTIONS) // max(1, workers * nodes))
+    pool_size = min(10, share)
+    return pool_size, min(20, share - pool_size)
+
 connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-engine = create_engine(DATABASE_URL, echo=False, future=True, connect_args=connect_args)
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+engine_kwargs = {"pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1"}
+if not DATABASE_URL.startswith("sqlite"):
+    _pool_size, _max_overflow = pool_limits()
+    engine_kwargs.update(
+        pool_size=int(os.getenv("DB_POOL_SIZE", str(_pool_size))),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", str(_max_overflow))),
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        # Fail over to 503 rather than queueing requests for the default 30s
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+    )
+# Same pool class the dialect would pick, plus checkout wait timing for /metrics
+_url = make_url(DATABASE_URL)
+_pool_class = _url.get_dialect().get_pool_class(_url)
+if issubclass(_pool_class, QueuePool):
+    engine_kwargs["poolclass"] = timed_pool(_pool_class)
+
+# SQLite file databases get the "performance" profile unless SQLITE_PROFILE=default:
+# WAL, so readers never wait for the writer, plus the pragmas below on every
+# connection, and reads split from writes. GET handlers (and run_in_read_session)
+# use a pool of query_only connections; everything else shares ONE writer
+# connection, so writes queue on the pool instead of retrying on SQLITE_BUSY.
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "performance")
+SQLITE_READERS = int(os.getenv("SQLITE_READERS", "4"))
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    # Durable across application crashes; a power loss can drop the last commits
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 2**20))),
+    "cache_size": -int(os.getenv("SQLITE_CACHE_KB", "65536")),  # negative = KiB
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "temp_store": "MEMORY",
+}
+SQLITE_TUNED = (
+    _url.get_backend_name() == "sqlite" and SQLITE_PROFILE == "performance"
+    and _url.database not in (None, "", ":memory:") and "mode=memory" not in str(_url)
+)
+
+def _set_pragmas(readonly: bool):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        if readonly:
+            cursor.execute("PRAGMA query_only=1")
+        cursor.close()
+    return on_connect
+
+write_kwargs = read_kwargs = engine_kwargs
+if SQLITE_TUNED:
+    # aiosqlite defaults to NullPool, which could not cap the writers at one
+    pool_class = engine_kwargs.get("poolclass") or timed_pool(AsyncAdaptedQueuePool)
+    write_kwargs = {**engine_kwargs, "poolclass": pool_class, "pool_size": 1, "max_overflow": 0}
+    read_kwargs = {**engine_kwargs, "poolclass": pool_class, "pool_size": SQLITE_READERS, "max_overflow": 0}
+
+if ASYNC_MODE:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(DATABASE_URL, echo=False, connect_args=connect_args, **write_kwargs)
+    async_read_engine = create_async_engine(DATABASE_URL, echo=False, connect_args=connect_args, **read_kwargs) if SQLITE_TUNED else async_engine
+    engine, read_engine = async_engine.sync_engine, async_read_engine.sync_engine
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+    AsyncReadSessionLocal = async_sessionmaker(bind=async_read_engine, autoflush=False, expire_on_commit=False)
+    SessionLocal = ReadSessionLocal = None
+else:
+    async_engine = async_read_engine = AsyncSessionLocal = AsyncReadSessionLocal = None
+    engine = create_engine(DATABASE_URL, echo=False, future=True, connect_args=connect_args, **write_kwargs)
+    read_engine = create_engine(DATABASE_URL, echo=False, future=True, connect_args=connect_args, **read_kwargs) if SQLITE_TUNED else engine
+    SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False, future=True)
+if SQLITE_TUNED:
+    event.listen(engine, "connect", _set_pragmas(readonly=False))
+    event.listen(read_engine, "connect", _set_pragmas(readonly=True))
+# Engines by role, as labelled in db_pool_connections and /readyz
+ENGINES = {"write": engine, "read": read_engine} if read_engine is not engine else {"primary": engine}
+for _role, _engine in ENGINES.items():
+    instrument_engine(_engine, _role)
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+# Safe methods read from the read pool; the rest (and any write) go to the writer
+READ_METHODS = ("GET", "HEAD")
+
+def get_db(request: Request):
+    db = (ReadSessionLocal if request.method in READ_METHODS else SessionLocal)()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db(request: Request):
+    async with (AsyncReadSessionLocal if request.method in READ_METHODS else AsyncSessionLocal)() as db:
+        yield db
+
+# Request-scoped session for async handlers: an AsyncSession in async mode, a plain Session otherwise
+get_session = get_async_db if ASYNC_MODE else get_db
+
+def _releasing_writer(fn):
+    # With a single writer connection a request session must not keep it between
+    # calls: the handler may await (bcrypt, the response) before the session is
+    # closed, and in sync mode the waiters would hold every threadpool thread.
+    # Objects loaded by `fn` stay readable, detached.
+    def call(db, *args):
+        try:
+            return fn(db, *args)
+        finally:
+            if db.bind is engine:
+                db.close()
+    return call
+
+async def run_sync(db, fn, *args):
+    """Run `fn(session, *args)` on the request's session without blocking the event loop.
+
+    In async mode this goes through AsyncSession.run_sync, otherwise the call is
+    pushed to the threadpool like a regular sync handler.
+    """
+    if SQLITE_TUNED:
+        fn = _releasing_writer(fn)
+    if ASYNC_MODE:
+        return await db.run_sync(fn, *args)
+    return await run_in_threadpool(fn, db, *args)
+
+async def run_in_session(fn, *args, readonly: bool = False):
+    """Like `run_sync`, but on a short-lived session opened just for this call.
+
+    `readonly` takes it from the read pool (only differs with the SQLite profile).
+    """
+    if ASYNC_MODE:
+        async with (AsyncReadSessionLocal if readonly else AsyncSessionLocal)() as db:
+            return await db.run_sync(fn, *args)
+
+    def call():
+        with (ReadSessionLocal if readonly else SessionLocal)() as db:
+            return fn(db, *args)
+    return await run_in_threadpool(call)
+
+async def run_in_read_session(fn, *args):
+    return await run_in_session(fn, *args, readonly=True)
+
+# Connections opened at startup, so the first requests do not pay for connecting
+# (and, with the SQLite profile, for the pragmas); capped by each pool's size
+DB_POOL_WARM = int(os.getenv("DB_POOL_WARM", "4"))
+
+def _warm_count(sync_engine) -> int:
+    size = getattr(sync_engine.pool, "size", None)
+    return min(DB_POOL_WARM, size()) if size is not None else 0
+
+async def _warm(engine_, n: int):
+    if ASYNC_MODE:
+        conns = [await engine_.connect() for _ in range(n)]
+        for conn in conns:
+            await conn.close()
+        return
+
+    def run():
+        # Held together, or the pool would hand the same connection back each time
+        conns = [engine_.connect() for _ in range(n)]
+        for conn in conns:
+            conn.close()
+    await run_in_threadpool(run)
+
+async def warm_pools():
+    pairs = [(async_engine or engine, engine)]
+    if read_engine is not engine:
+        pairs.append((async_read_engine or read_engine, read_engine))
+    await asyncio.gather(*(_warm(e, _warm_count(sync)) for e, sync in pairs))
+
+def pool_status() -> dict:
+    """Occupancy of each engine's pool: size, checked out, and the most it will open."""
+    status = {}
+    for role, sync_engine in ENGINES.items():
+        pool = sync_engine.pool
+        if isinstance(pool, QueuePool):
+            status[role] = {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "capacity": pool.size() + max(0, pool._max_overflow),
+            }
+    return status
+
+async def ping(timeout: float):
+    """Round-trip to the database through the read pool; raises on error or after `timeout`."""
+    if ASYNC_MODE:
+        async def run():
+            async with async_read_engine.connect() as conn:
+                await conn.exec_driver_sql("SELECT 1")
+        await asyncio.wait_for(run(), timeout)
+        return
+
+    def run():
+        with read_engine.connect() as conn:
+            conn.exec_driver_sql("SELECT 1")
+    await asyncio.wait_for(run_in_threadpool(run), timeout)
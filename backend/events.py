@@ -0,0 +1,105 @@
+import asyncio
+import json
+import os
+from typing import Optional
+
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "64"))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+
+
+def sse(event: str, data, event_id: Optional[int] = None) -> bytes:
+    """Encode one Server-Sent Event frame."""
+    payload = data if isinstance(data, str) else json.dumps(data, default=str, separators=(",", ":"))
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {payload}\n\n".encode()
+
+
+class Subscription:
+    __slots__ = ("topic", "queue", "dropped")
+
+    def __init__(self, topic: str, maxsize: int):
+        self.topic = topic
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = False
+
+
+class Broker:
+    """In-process pub/sub fan-out for the streaming endpoints.
+
+    Events are encoded once in `publish()` and handed to every subscriber's bounded
+    queue. A subscriber whose queue is full is dropped rather than slowing down the
+    publisher; its stream ends and the client reconnects for a fresh snapshot.
+    `publish()` may be called from any thread (sync handlers run in the threadpool).
+    """
+
+    def __init__(self, queue_size: int = STREAM_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subs = {}
+        self._loop = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    @property
+    def loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        return self._loop
+
+    def subscribe(self, topic: str) -> Subscription:
+        sub = Subscription(topic, self.queue_size)
+        self._subs.setdefault(topic, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        self._subs.get(sub.topic, set()).discard(sub)
+
+    def subscribers(self, topic: str) -> int:
+        return len(self._subs.get(topic, ()))
+
+    def publish(self, topic: str, event: str, data, event_id: Optional[int] = None):
+        loop = self._loop
+        if loop is None or not self._subs.get(topic):
+            return
+        frame = sse(event, data, event_id)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._deliver(topic, frame)
+        else:
+            loop.call_soon_threadsafe(self._deliver, topic, frame)
+
+    def _deliver(self, topic: str, frame: bytes):
+        for sub in list(self._subs.get(topic, ())):
+            try:
+                sub.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self._drop(sub)
+
+    def _drop(self, sub: Subscription):
+        self.unsubscribe(sub)
+        sub.dropped = True
+        # Make room for the sentinel so the consumer wakes up and ends its stream
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(None)
+
+    async def stream(self, sub: Subscription, snapshot: bytes):
+        """Yield the snapshot, then queued frames with periodic heartbeats."""
+        try:
+            yield snapshot
+            while True:
+                try:
+                    frame = await asyncio.wait_for(sub.queue.get(), STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                if frame is None:
+                    yield sse("dropped", {"reason": "slow consumer"})
+                    return
+                yield frame
+        finally:
+            self.unsubscribe(sub)
+
+
+broker = Broker()
@@ -0,0 +1,250 @@
+"""Streaming table exports for admins (CSV, NDJSON, Parquet).
+
+Rows are read in partitions of EXPORT_CHUNK_ROWS, one keyset query each (the
+rows after the last id sent), and each partition is encoded and handed to the
+response before the next one is fetched. At most one partition is held at a
+time, so memory stays flat however large the table is, and the first bytes (the
+CSV header, or the first rows) go out as soon as the first query returns. No
+read connection is held between partitions: a slow download does not take one
+of the read pool's few connections away from the API for its whole length.
+"""
+import csv
+import io
+import os
+from datetime import datetime, timezone
+from importlib.util import find_spec
+
+from sqlalchemy import String, exists, select, type_coerce
+from starlette.concurrency import run_in_threadpool
+
+from . import models
+from .database import ASYNC_MODE, async_read_engine, read_engine
+from .serialization import dumps
+
+# Parquet export is only offered when pyarrow is installed. It is imported on the
+# first Parquet export: pyarrow (and numpy with it) would add ~80ms to every
+# worker's startup.
+HAVE_PYARROW = find_spec("pyarrow") is not None
+pyarrow = None
+
+
+def _load_pyarrow():
+    global pyarrow
+    import pyarrow.parquet  # binds the module-level name
+
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+# Parquet partitions are kept as (compact) Arrow batches until a row group is full
+EXPORT_PARQUET_ROW_GROUP = int(os.getenv("EXPORT_PARQUET_ROW_GROUP", "65536"))
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def _stored_time(when: datetime):
+    """`when` as the timestamp columns hold it: naive UTC and, on SQLite (which keeps
+    text and compares it as such), in CURRENT_TIMESTAMP's "YYYY-MM-DD HH:MM:SS"
+    form. Bound as-is, an offset would be dropped rather than applied, and the
+    ".ffffff" SQLAlchemy appends would sort after a stored value of the same second."""
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    if read_engine.dialect.name != "sqlite":
+        return when
+    return type_coerce(when.isoformat(" ", "microseconds" if when.microsecond else "seconds"), String)
+
+
+def submissions_query(week: str = None, since: datetime = None):
+    s = models.Submission.__table__
+    stmt = select(s.c.id, s.c.team_id, s.c.score, s.c.week, s.c.submitted_at).order_by(s.c.id)
+    if week is not None:
+        stmt = stmt.where(s.c.week == week)
+    if since is not None:
+        stmt = stmt.where(s.c.submitted_at >= _stored_time(since))
+    return stmt
+
+
+def teams_query(week: str = None, since: datetime = None):
+    """Every team (banned ones included); `week` keeps teams that submitted in that week."""
+    t, ws = models.Team.__table__, models.WeeklyScore.__table__
+    stmt = select(
+        t.c.id, t.c.name, t.c.member1, t.c.member2, t.c.member3, t.c.banned,
+        t.c.submission_count, t.c.total_score, t.c.created_at, t.c.owner_user_id,
+    ).order_by(t.c.id)
+    if week is not None:
+        stmt = stmt.where(exists().where(ws.c.team_id == t.c.id, ws.c.week == week))
+    if since is not None:
+        stmt = stmt.where(t.c.created_at >= _stored_time(since))
+    return stmt
+
+
+# ---------- encoders ----------
+class CsvEncoder:
+    def __init__(self, stmt):
+        self.names = [c.name for c in stmt.selected_columns]
+        self._dates = [i for i, c in enumerate(stmt.selected_columns) if c.type.python_type is datetime]
+
+    def _text(self, rows) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(rows)
+        return buffer.getvalue().encode()
+
+    def header(self) -> bytes:
+        return self._text([self.names])
+
+    def encode(self, rows) -> bytes:
+        if self._dates:
+            dates = self._dates
+            rows = [list(row) for row in rows]
+            for row in rows:
+                for i in dates:
+                    if row[i] is not None:
+                        row[i] = row[i].isoformat()
+        return self._text(rows)
+
+    def footer(self) -> bytes:
+        return b""
+
+
+class NdjsonEncoder:
+    def __init__(self, stmt):
+        self.names = [c.name for c in stmt.selected_columns]
+
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, rows) -> bytes:
+        names = self.names
+        return b"".join(dumps(dict(zip(names, row))) + b"\n" for row in rows)
+
+    def footer(self) -> bytes:
+        return b""
+
+
+class _Drain(io.RawIOBase):
+    """Write-only file that keeps what was written since the last `take()`."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts.clear()
+        return out
+
+
+def _arrow_type(column):
+    kind = column.type.python_type
+    if kind is bool:
+        return pyarrow.bool_()
+    if kind is int:
+        return pyarrow.int64()
+    if kind is float:
+        return pyarrow.float64()
+    if kind is datetime:
+        return pyarrow.timestamp("us")
+    return pyarrow.string()
+
+
+class ParquetEncoder:
+    """Buffers partitions as Arrow batches and writes a row group per
+    EXPORT_PARQUET_ROW_GROUP rows; the file footer is written by `footer()`."""
+
+    def __init__(self, stmt):
+        _load_pyarrow()
+        self.schema = pyarrow.schema([(c.name, _arrow_type(c)) for c in stmt.selected_columns])
+        self._sink = _Drain()
+        self._writer = pyarrow.parquet.ParquetWriter(self._sink, self.schema, compression="zstd")
+        self._batches = []
+        self._buffered = 0
+
+    def header(self) -> bytes:
+        return b""
+
+    def _flush(self):
+        if self._batches:
+            self._writer.write_table(pyarrow.Table.from_batches(self._batches, self.schema))
+            self._batches, self._buffered = [], 0
+
+    def encode(self, rows) -> bytes:
+        columns = zip(*rows)
+        self._batches.append(pyarrow.RecordBatch.from_arrays(
+            [pyarrow.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+            schema=self.schema,
+        ))
+        self._buffered += len(rows)
+        if self._buffered >= EXPORT_PARQUET_ROW_GROUP:
+            self._flush()
+        return self._sink.take()
+
+    def footer(self) -> bytes:
+        self._flush()
+        self._writer.close()
+        return self._sink.take()
+
+
+ENCODERS = {"csv": CsvEncoder, "ndjson": NdjsonEncoder, "parquet": ParquetEncoder}
+
+
+def available_formats():
+    return [f for f in ENCODERS if f != "parquet" or HAVE_PYARROW]
+
+
+# ---------- streaming ----------
+def _sync_partition(stmt):
+    with read_engine.connect() as conn:
+        return conn.execute(stmt).all()
+
+
+async def _async_partition(stmt):
+    async with async_read_engine.connect() as conn:
+        return (await conn.execute(stmt)).all()
+
+
+async def partitions(stmt, chunk_rows: int = EXPORT_CHUNK_ROWS):
+    """Yield lists of up to `chunk_rows` rows of `stmt`, which is ordered by its `id` column.
+
+    Each partition is its own `id > last id sent` query on a connection that goes
+    back to the pool before the partition is yielded. Rows committed while the
+    export runs are included if their id comes after the last one sent.
+    """
+    key, after = stmt.selected_columns.id, None
+    while True:
+        page = stmt.where(key > after) if after is not None else stmt
+        page = page.limit(chunk_rows)
+        rows = await _async_partition(page) if ASYNC_MODE else await run_in_threadpool(_sync_partition, page)
+        if rows:
+            yield rows
+        if len(rows) < chunk_rows:
+            return
+        after = rows[-1].id
+
+
+async def stream(stmt, fmt: str):
+    """The encoded export of `stmt`, chunk by chunk."""
+    encoder = ENCODERS[fmt](stmt)
+    header = encoder.header()
+    if header:
+        yield header
+    async for rows in partitions(stmt):
+        # Encoding a partition takes milliseconds; keep it off the event loop
+        body = await run_in_threadpool(encoder.encode, rows)
+        if body:
+            yield body
+    footer = encoder.footer()
+    if footer:
+        yield footer
@@ -0,0 +1,294 @@
+"""Cumulative score over time per team, behind the /teams/{id}/history and
+/leaderboard/history endpoints.
+
+Each team's series is two array('d') columns, submission time (epoch seconds,
+UTC) and total_score after that submission: 16 bytes a point instead of an ORM
+row. It is loaded from the submissions table on first use, then follows the
+leaderboard: every rank change that raises a team's submission_count, local or
+replayed from another worker, appends a point. Queries sample the series at
+bucket edges or downsample them (LTTB, min/max per bucket) with NumPy, so a
+chart gets at most `points` points however many submissions are behind it.
+"""
+import threading
+from array import array
+from bisect import bisect_right
+from datetime import datetime, timezone
+
+from .lazy import np
+
+_EPOCH = datetime(1970, 1, 1)
+# Cells of the (teams x times) matrices ranking works through at once (16MB of floats)
+_RANK_CELLS = 2_000_000
+
+
+def to_epoch(when: datetime) -> float:
+    """Seconds since the epoch; naive datetimes are UTC, as the database stores them."""
+    if when.tzinfo is not None:
+        return when.timestamp()
+    return (when - _EPOCH).total_seconds()
+
+
+def _from_epoch(seconds: float) -> datetime:
+    return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+
+
+def _append(times, totals, when, total):
+    if times and when < times[-1]:
+        # Clock skew between nodes or writers; keep the series sorted by time
+        i = bisect_right(times, when)
+        times.insert(i, when)
+        totals.insert(i, total)
+    else:
+        times.append(when)
+        totals.append(total)
+
+
+class ScoreHistory:
+    """Per-team (time, cumulative total) series, appended to as the leaderboard changes.
+
+    Like the Leaderboard, submission_count orders the updates of one team: a point
+    arriving with a count at or below the last one recorded is already covered.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}  # team_id -> (times, totals)
+        self._counts = {}  # team_id -> submission_count at its last point
+        self._pending = None  # changes recorded while a load is scanning the table
+        self.loaded = False
+
+    def begin_load(self):
+        """Start buffering changes; call right before reading the submissions."""
+        with self._lock:
+            self._pending = []
+            self.loaded = False
+
+    def load(self, rows) -> bool:
+        """Replace every series from (team_id, submitted_at, score) rows in commit (id)
+        order, then replay the changes buffered since `begin_load`. Returns False
+        if `reset` was called meanwhile and the result was dropped."""
+        series, counts = {}, {}
+        for team_id, submitted_at, score in rows:
+            found = series.get(team_id)
+            if found is None:
+                found = series[team_id] = (array("d"), array("d"))
+                counts[team_id] = 0
+            times, totals = found
+            _append(times, totals, to_epoch(submitted_at), (totals[-1] if totals else 0.0) + score)
+            counts[team_id] += 1
+        with self._lock:
+            if self._pending is None:
+                return False
+            pending, self._pending = self._pending, None
+            self._series, self._counts = series, counts
+            for apply, *args in pending:
+                apply(*args)
+            self.loaded = True
+            return True
+
+    def reset(self):
+        """Forget everything (the leaderboard was rebuilt); the next query reloads."""
+        with self._lock:
+            self._series, self._counts = {}, {}
+            self._pending = None
+            self.loaded = False
+
+    def record(self, team_id: int, total_score: float, submission_count: int, when: float):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((self._record, team_id, total_score, submission_count, when))
+            elif self.loaded:
+                self._record(team_id, total_score, submission_count, when)
+
+    def forget(self, team_id: int):
+        """Drop a deleted team's series (SQLite may hand its id to the next team)."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((self._forget, team_id))
+            else:
+                self._forget(team_id)
+
+    def _forget(self, team_id):
+        self._series.pop(team_id, None)
+        self._counts.pop(team_id, None)
+
+    def _record(self, team_id, total_score, submission_count, when):
+        if submission_count <= self._counts.get(team_id, 0):
+            return
+        self._counts[team_id] = submission_count
+        times, totals = self._series.setdefault(team_id, (array("d"), array("d")))
+        _append(times, totals, when, total_score)
+
+    def _snapshot(self, team_ids) -> "_Flat":
+        """NumPy copy of the series of `team_ids` that have any points, end to end."""
+        with self._lock:
+            ids = [t for t in team_ids if t in self._series]
+            parts = [self._series[t] for t in ids]
+            lengths = [len(times) for times, _ in parts]
+            # The frombuffer views are dropped before the lock is, so appends can resize again
+            times = np.concatenate([np.frombuffer(times) for times, _ in parts]) if parts else np.empty(0)
+            totals = np.concatenate([np.frombuffer(totals) for _, totals in parts]) if parts else np.empty(0)
+        offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return _Flat(np.array(ids, dtype=np.int64), offsets, times, totals)
+
+    # ---------- queries ----------
+    def team(self, team_id: int, ranked_ids, start=None, end=None, points: int = 300, downsample: str = "lttb") -> dict:
+        """One team's cumulative total and rank among `ranked_ids` after each of its
+        submissions between `start` and `end`, downsampled to at most `points`."""
+        flat = self._snapshot(ranked_ids)
+        times, totals = flat.series(team_id)
+        lo = 0 if start is None else np.searchsorted(times, to_epoch(start), side="left")
+        hi = len(times) if end is None else np.searchsorted(times, to_epoch(end), side="right")
+        times, totals = times[lo:hi], totals[lo:hi]
+        if len(times) > points:
+            keep = lttb(times, totals, points) if downsample == "lttb" else minmax(times, totals, points)
+            times, totals = times[keep], totals[keep]
+        _, ranks = _ranks(flat, times, [team_id])
+        return {
+            "team_id": team_id,
+            "times": [_from_epoch(t) for t in times.tolist()],
+            "totals": totals.tolist(),
+            "ranks": _ints(ranks[0]),
+        }
+
+    def top(self, entries, ranked_ids, start=None, end=None, points: int = 100) -> dict:
+        """Cumulative total and rank of each team in `entries` (leaderboard rows) at
+        `points` evenly spaced times from `start` (default: the first submission) to `end`."""
+        flat = self._snapshot(ranked_ids)
+        end = to_epoch(end if end is not None else datetime.utcnow())
+        if start is not None:
+            start = to_epoch(start)
+        else:
+            start = float(flat.times.min()) if len(flat.times) else end
+        times = np.linspace(start, end, points) if start < end else np.array([end])
+        values, ranks = _ranks(flat, times, [e["team_id"] for e in entries])
+        teams = [
+            {"team_id": e["team_id"], "team_name": e["team_name"], "totals": _floats(v), "ranks": _ints(r)}
+            for e, v, r in zip(entries, values, ranks)
+        ]
+        return {"times": [_from_epoch(t) for t in times.tolist()], "teams": teams}
+
+
+class _Flat:
+    """Series of several teams end to end: team i's points are times/totals[offsets[i]:offsets[i + 1]]."""
+
+    __slots__ = ("ids", "offsets", "times", "totals")
+
+    def __init__(self, ids, offsets, times, totals):
+        self.ids, self.offsets, self.times, self.totals = ids, offsets, times, totals
+
+    def row(self, team_id: int):
+        found = np.flatnonzero(self.ids == team_id)
+        return int(found[0]) if len(found) else None
+
+    def series(self, team_id: int):
+        row = self.row(team_id)
+        if row is None:
+            return np.empty(0), np.empty(0)
+        lo, hi = self.offsets[row], self.offsets[row + 1]
+        return self.times[lo:hi], self.totals[lo:hi]
+
+
+def _floats(values):
+    return [None if v != v else v for v in values.tolist()]
+
+
+def _ints(values):
+    return [None if v != v else int(v) for v in values.tolist()]
+
+
+def _columns(flat: _Flat, at):
+    """Yield (k, m): every team's total (rows in flat.ids order) at the times
+    at[k:k + m.shape[1]], NaN before its first point. One pass over the points;
+    the times go in slices of about _RANK_CELLS // teams, to bound memory."""
+    n = len(flat.ids)
+    team = np.repeat(np.arange(n), np.diff(flat.offsets))
+    # Each point counts from the first of `at` at or after it; keep the last point per cell
+    column = np.searchsorted(at, flat.times, side="left")
+    last = np.ones(len(column), dtype=bool)
+    last[:-1] = (team[1:] != team[:-1]) | (column[1:] != column[:-1])
+    team, column, value = team[last], column[last], flat.totals[last]
+    carry = np.full(n, np.nan)
+    step = max(1, _RANK_CELLS // max(n, 1))
+    for k in range(0, len(at), step):
+        width = min(step, len(at) - k)
+        inside = (column >= k) & (column < k + width)
+        m = np.full((n, width + 1), np.nan)
+        m[:, 0] = carry
+        m[team[inside], column[inside] - k + 1] = value[inside]
+        # Forward-fill each row from its last point
+        source = np.where(np.isnan(m), 0, np.arange(width + 1))
+        np.maximum.accumulate(source, axis=1, out=source)
+        m = np.take_along_axis(m, source, axis=1)
+        carry = m[:, -1]
+        yield k, m[:, 1:]
+
+
+def _ranks(flat: _Flat, at, targets):
+    """(totals, ranks) of each of `targets` at each time in `at`, as (targets x times)
+    arrays. The rank is one plus the teams with a higher total then, or an equal
+    one and a lower id (the leaderboard's tie-break); NaN (both) before the
+    target's first submission. Teams without one yet are not counted either."""
+    rows = [flat.row(t) for t in targets]
+    values = np.full((len(targets), len(at)), np.nan)
+    ranks = np.full((len(targets), len(at)), np.nan)
+    target_ids = np.array(targets, dtype=np.int64)
+    for k, m in _columns(flat, at):
+        width = m.shape[1]
+        for i, row in enumerate(rows):
+            if row is not None:
+                values[i, k:k + width] = m[row]
+        ordered = np.sort(m, axis=0)  # NaN last
+        counted = np.count_nonzero(~np.isnan(m), axis=0)
+        for j in range(width):
+            column, mine = ordered[:counted[j], j], values[:, k + j]
+            above = np.searchsorted(column, mine, side="right")
+            rank = counted[j] - above + 1
+            for i in np.flatnonzero(above - np.searchsorted(column, mine, side="left") > 1):
+                rank[i] += np.count_nonzero((m[:, j] == mine[i]) & (flat.ids < target_ids[i]))
+            ranks[:, k + j] = np.where(np.isnan(mine), np.nan, rank)
+    return values, ranks
+
+
+# ---------- downsampling ----------
+def lttb(x, y, n: int):
+    """Indices of `n` points picked by Largest-Triangle-Three-Buckets (Steinarsson,
+    2013): first and last, then per bucket the point forming the largest triangle
+    with the previous pick and the next bucket's mean, which keeps a chart's shape."""
+    size = len(x)
+    if n >= size:
+        return np.arange(size)
+    if n < 3:
+        return np.array([0, size - 1][:n])
+    # n - 2 buckets over the interior points, strictly increasing since n < size
+    edges = np.linspace(1, size - 1, n - 1).astype(np.int64)
+    keep = np.empty(n, dtype=np.int64)
+    keep[0], keep[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else size
+        mean_x, mean_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        area = np.abs((x[a] - mean_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (mean_y - y[a]))
+        a = lo + int(area.argmax())
+        keep[i + 1] = a
+    return keep
+
+
+def minmax(x, y, n: int):
+    """Indices of the lowest and highest point in each of (n - 2) // 2 equal time
+    buckets, plus the first and last point: at most n, in time order."""
+    size = len(x)
+    buckets = max(1, (n - 2) // 2)
+    if size <= n:
+        return np.arange(size)
+    span = x[-1] - x[0]
+    bucket = np.minimum(((x - x[0]) / span * buckets).astype(np.int64), buckets - 1) if span > 0 else np.zeros(size, dtype=np.int64)
+    bounds = np.searchsorted(bucket, np.arange(buckets + 1))
+    keep = {0, size - 1}
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        if lo < hi:
+            keep.add(lo + int(y[lo:hi].argmin()))
+            keep.add(lo + int(y[lo:hi].argmax()))
+    return np.array(sorted(keep))
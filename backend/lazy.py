@@ -0,0 +1,22 @@
+"""NumPy for the history and stats modules, imported on first use.
+
+NumPy would add ~50ms to every worker's start, and most workers never serve a
+history or stats request. `np` stands in for the module: the first read of an
+attribute imports numpy and keeps that attribute on the stand-in, so later
+reads are plain attribute lookups.
+"""
+
+
+class _LazyModule:
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attr):
+        # Only called for attributes not yet copied over
+        module = __import__(self._name)
+        value = getattr(module, attr)
+        setattr(self, attr, value)
+        return value
+
+
+np = _LazyModule("numpy")
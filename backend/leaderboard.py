@@ -0,0 +1,251 @@
+import random
+import threading
+from typing import Optional
+
+_MAX_LEVEL = 32
+
+# Leaderboard._versions states
+RANKED, BANNED, DELETED = "ranked", "banned", "deleted"
+
+
+class _Node:
+    __slots__ = ("key", "value", "next", "width")
+
+    def __init__(self, key, value, level: int):
+        self.key = key
+        self.value = value
+        self.next = [None] * level
+        self.width = [1] * level
+
+
+class IndexableSkipList:
+    """Skip list ordered by key where every link also stores how many nodes it
+    skips, so rank lookups and positional access are O(log n)."""
+
+    def __init__(self):
+        self.head = _Node(None, None, _MAX_LEVEL)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _path(self, key):
+        """Per level, the last node strictly before `key` and its 0-based position."""
+        update = [None] * _MAX_LEVEL
+        positions = [0] * _MAX_LEVEL
+        node, pos = self.head, -1
+        for level in reversed(range(_MAX_LEVEL)):
+            while node.next[level] is not None and node.next[level].key < key:
+                pos += node.width[level]
+                node = node.next[level]
+            update[level] = node
+            positions[level] = pos
+        return update, positions
+
+    def insert(self, key, value):
+        update, positions = self._path(key)
+        level = 1
+        while level < _MAX_LEVEL and random.random() < 0.5:
+            level += 1
+        new = _Node(key, value, level)
+        index = positions[0] + 1
+        for lvl in range(_MAX_LEVEL):
+            prev = update[lvl]
+            if lvl < level:
+                new.next[lvl] = prev.next[lvl]
+                prev.next[lvl] = new
+                skipped = index - positions[lvl]
+                new.width[lvl] = prev.width[lvl] - skipped + 1
+                prev.width[lvl] = skipped
+            else:
+                prev.width[lvl] += 1
+        self.size += 1
+
+    def remove(self, key) -> bool:
+        update, _ = self._path(key)
+        target = update[0].next[0]
+        if target is None or target.key != key:
+            return False
+        for lvl in range(_MAX_LEVEL):
+            prev = update[lvl]
+            if prev.next[lvl] is target:
+                prev.width[lvl] += target.width[lvl] - 1
+                prev.next[lvl] = target.next[lvl]
+            else:
+                prev.width[lvl] -= 1
+        self.size -= 1
+        return True
+
+    def index(self, key) -> int:
+        update, positions = self._path(key)
+        target = update[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        return positions[0] + 1
+
+    def _node_at(self, index: int):
+        node, pos = self.head, -1
+        for level in reversed(range(_MAX_LEVEL)):
+            while node.next[level] is not None and pos + node.width[level] <= index:
+                pos += node.width[level]
+                node = node.next[level]
+        return node
+
+    def slice(self, start: int, stop: int):
+        if start >= stop or start >= self.size:
+            return []
+        node = self._node_at(start)
+        out = []
+        while node is not None and len(out) < stop - start:
+            out.append(node.value)
+            node = node.next[0]
+        return out
+
+
+class Leaderboard:
+    """Process-local ranking of non-banned teams, highest total_score first.
+
+    Ties are broken by team id so every team has a stable, unique position. Every
+    mutation bumps `seq`; if `on_change` is set it receives a rank-change event for
+    each mutation, in `seq` order.
+
+    Teams carry a `version` (teams.version, bumped by every write to the row) that
+    orders updates to one team: a change committed earlier can still arrive later,
+    from another worker or node over the bus or from a threadpool thread that lost
+    the race to the lock. The newest version seen per team is kept, for banned and
+    deleted teams too, and anything not newer is dropped.
+    """
+
+    def __init__(self, on_change=None):
+        self._lock = threading.Lock()
+        self._ranks = IndexableSkipList()
+        self._entries = {}
+        # team_id -> (version, state): RANKED, or the BANNED/DELETED tombstone of a removed team
+        self._versions = {}
+        self.seq = 0
+        self.on_change = on_change
+
+    @staticmethod
+    def _key(total_score: float, team_id: int):
+        return (-total_score, team_id)
+
+    def _emit(self, change: dict):
+        if self.on_change is not None:
+            self.on_change(change)
+
+    def rebuild(self, teams):
+        ranks, entries, versions = IndexableSkipList(), {}, {}
+        for t in teams:
+            entry = _entry(t)
+            ranks.insert(self._key(entry["total_score"], entry["team_id"]), entry)
+            entries[entry["team_id"]] = entry
+            versions[entry["team_id"]] = (int(t.version), RANKED)
+        with self._lock:
+            # Banned and deleted teams are not in `teams`; their tombstones still hold
+            for team_id, (version, state) in self._versions.items():
+                if state != RANKED and team_id not in versions:
+                    versions[team_id] = (version, state)
+            self._ranks, self._entries, self._versions = ranks, entries, versions
+            self.seq += 1
+            self._emit({"type": "reset", "seq": self.seq})
+
+    def upsert(self, team):
+        if team.banned:
+            self.remove(team.id, version=int(team.version))
+            return
+        self._put(_entry(team), int(team.version))
+
+    def apply(self, change: dict):
+        """Replay a `rank`/`remove` change emitted by another process's board."""
+        if change["type"] == "rank":
+            entry = {k: change[k] for k in ("team_id", "team_name", "submission_count", "total_score")}
+            self._put(entry, change["version"])
+        elif change["type"] == "remove":
+            self.remove(change["team_id"], change.get("deleted", False), change["version"])
+
+    def _stale(self, team_id: int, version: int) -> bool:
+        known = self._versions.get(team_id)
+        if known is None or version > known[0]:
+            return False
+        # SQLite hands a deleted team's id to the next team created, at version 0
+        return not (known[1] == DELETED and version == 0)
+
+    def _put(self, entry: dict, version: int):
+        team_id = entry["team_id"]
+        with self._lock:
+            if self._stale(team_id, version):
+                return
+            self._versions[team_id] = (version, RANKED)
+            old = self._entries.get(team_id)
+            if old == entry:
+                return
+            old_rank = None
+            if old is not None:
+                old_key = self._key(old["total_score"], team_id)
+                if self.on_change is not None:
+                    old_rank = self._ranks.index(old_key) + 1
+                self._ranks.remove(old_key)
+            key = self._key(entry["total_score"], team_id)
+            self._ranks.insert(key, entry)
+            self._entries[team_id] = entry
+            self.seq += 1
+            if self.on_change is not None:
+                self._emit({
+                    "type": "rank", "seq": self.seq, "old_rank": old_rank, "rank": self._ranks.index(key) + 1,
+                    "version": version, **entry,
+                })
+
+    def remove(self, team_id: int, deleted: bool = False, version: Optional[int] = None):
+        """Unrank `team_id`; `deleted` (rather than banned) is passed on in the change.
+
+        `version` is that of the ban or of the row deleted: the tombstone it leaves
+        drops updates to the team up to that version. Without it the team goes at
+        whatever version it is ranked at.
+        """
+        with self._lock:
+            known = self._versions.get(team_id)
+            if version is None:
+                version = known[0] if known is not None else 0
+            elif known is not None and version < known[0]:
+                return  # the team changed since
+            self._versions[team_id] = (version, DELETED if deleted else BANNED)
+            old = self._entries.pop(team_id, None)
+            if old is None:
+                return
+            old_key = self._key(old["total_score"], team_id)
+            old_rank = self._ranks.index(old_key) + 1 if self.on_change is not None else None
+            self._ranks.remove(old_key)
+            self.seq += 1
+            self._emit({
+                "type": "remove", "seq": self.seq, "team_id": team_id, "old_rank": old_rank,
+                "deleted": deleted, "version": version,
+            })
+
+    def page(self, offset: int = 0, limit: Optional[int] = None):
+        return self.snapshot(offset, limit)[1]
+
+    def snapshot(self, offset: int = 0, limit: Optional[int] = None):
+        """(seq, rows) taken atomically, so streamed changes can be matched against it."""
+        with self._lock:
+            stop = len(self._ranks) if limit is None else offset + limit
+            return self.seq, self._ranks.slice(offset, stop)
+
+    def rank(self, team_id: int):
+        """1-based rank and entry for `team_id`, or None if it is not ranked."""
+        with self._lock:
+            entry = self._entries.get(team_id)
+            if entry is None:
+                return None
+            return self._ranks.index(self._key(entry["total_score"], team_id)) + 1, entry
+
+    def __len__(self):
+        return len(self._ranks)
+
+
+def _entry(team) -> dict:
+    return {
+        "team_id": team.id,
+        "team_name": team.name,
+        "submission_count": int(team.submission_count or 0),
+        "total_score": float(team.total_score or 0.0),
+    }
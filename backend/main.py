@@ -1,24 +1,182 @@
+import asyncio
+import json
+import logging
 import os
-from fastapi import FastAPI, Depends, HTTPException, status
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Literal, Optional
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError, TimeoutError as PoolTimeout
 from sqlalchemy.orm import Session
+from pydantic import TypeAdapter, ValidationError
 from dotenv import load_dotenv
 
-from .database import Base, engine, get_db
-from . import models, schemas
+from .database import DB_NODES, WEB_CONCURRENCY, get_session, ping, pool_status, run_in_read_session, run_in_session, run_sync, warm_pools
+from .migrations import check_schema
+from . import crud, models, schemas
+from .leaderboard import Leaderboard
+from .history import ScoreHistory
+from .stats import LeaderboardStats, TeamColumns
+from .events import broker, sse
+from .serialization import Projection, dumps
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY, InstrumentedRoute, MetricsMiddleware
+from .cache import CACHE_URL, RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL, ResponseCache, bus, make_cache, offload, shared_client
+from . import export
+from .writebehind import SubmissionQueue
+from .ratelimit import limiter, rate_limit, rate_limit_user
+from .pagination import PAGE_DEFAULT_LIMIT, PAGE_MAX_LIMIT, keyset_page, parse_fields
+from .config import Settings, get_settings
 from .auth import (
-    hash_password, verify_password, create_access_token,
-    get_current_user, require_admin
+    hash_password_async, verify_and_update_async, hash_pool, create_access_token,
+    get_current_user, get_user_by_username, require_admin, Principal, forget_principal, principal_cache
 )
 
 load_dotenv()
 
-SECRET_KEY = os.getenv("SECRET_KEY", "change-me-in-prod")
-ALGORITHM = os.getenv("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "240"))
+log = logging.getLogger(__name__)
+
+settings = get_settings()
+SECRET_KEY = settings.secret_key
+ALGORITHM = settings.algorithm
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "*").split(",")
+SUBMISSION_BATCH_MAX = int(os.getenv("SUBMISSION_BATCH_MAX", "50000"))
+# /readyz fails when the database takes longer than this to answer
+READY_TIMEOUT = float(os.getenv("READY_TIMEOUT", "2"))
+
+# Set while replaying another worker's board change, so it is not broadcast back
+_remote = threading.local()
+
+def board_changed(change: dict):
+    # Called with the board's lock held, so nothing here may wait on the network:
+    # bus.publish only queues the change for the bus's sender thread
+    broker.publish("leaderboard", change["type"], change, change["seq"])
+    if change["type"] == "reset":
+        history.reset()
+        team_columns.reset()
+    else:
+        team_columns.apply(change)
+        if change["type"] == "rank":
+            history.record(change["team_id"], change["total_score"], change["submission_count"], time.time())
+        elif change.get("deleted"):
+            history.forget(change["team_id"])
+    if change["type"] != "reset" and not getattr(_remote, "active", False):
+        bus.publish({"type": "board", "change": change})
+
+# Ranked leaderboard kept in memory; handlers below update it after each commit, every
+# rank change is pushed to /stream/leaderboard subscribers and replayed by other workers
+board = Leaderboard(on_change=board_changed)
+# Score-over-time series per team and the board as NumPy-ready columns, both fed by
+# the board's changes (so by other workers' too) and loaded on first use
+history = ScoreHistory()
+team_columns = TeamColumns()
+
+ADMIN_USERNAME = os.getenv("ADMIN_USERNAME")
+ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
+
+def admin_exists(db: Session) -> bool:
+    return db.query(models.User.id).filter(models.User.username == ADMIN_USERNAME).first() is not None
+
+def seed_admin(db: Session, password_hash: str):
+    if not admin_exists(db):
+        admin = models.User(
+            username=ADMIN_USERNAME,
+            password_hash=password_hash,
+            is_admin=True
+        )
+        db.add(admin)
+        try:
+            db.commit()
+        except IntegrityError:  # another worker seeded it first
+            db.rollback()
+
+async def ensure_admin():
+    """Create the admin account if missing; the bcrypt hash is only paid on first boot."""
+    try:
+        if not await run_in_read_session(admin_exists):
+            await run_in_session(seed_admin, await hash_password_async(ADMIN_PASSWORD))
+    except Exception:
+        log.exception("could not seed the admin account %r", ADMIN_USERNAME)
+
+# Runs in the background from startup, so serving does not wait for it; login awaits it
+admin_seeding: Optional[asyncio.Task] = None
+# Set on shutdown so /readyz takes the node out of rotation while it drains
+draining = False
 
-app = FastAPI(title="ML League API")
+def load_board(db: Session):
+    board.rebuild(crud.active_team_rows(db))
+
+# Loaded on the first history request rather than at startup: it reads every submission
+def load_history(db: Session) -> bool:
+    history.begin_load()
+    return history.load(crud.submission_series(db))
+
+def load_team_columns() -> bool:
+    team_columns.begin_load()
+    return team_columns.load(*board.snapshot())
+
+# Loads in progress by store, shared by the requests waiting on them
+_loading = {}
+
+async def ensure_loaded(store, load):
+    """Await `load()` until `store` is loaded (a board rebuild meanwhile drops a load)."""
+    while not store.loaded:
+        running = _loading.get(store)
+        if running is None or running.done():
+            running = _loading[store] = asyncio.ensure_future(load())
+        await asyncio.shield(running)
+
+def on_bus_message(message: dict):
+    """Apply another worker's invalidation (runs on the bus listener thread)."""
+    if message["type"] == "board":
+        _remote.active = True
+        try:
+            board.apply(message["change"])
+        finally:
+            _remote.active = False
+    elif message["type"] == "reload":
+        asyncio.run_coroutine_threadsafe(run_in_read_session(load_board), broker.loop)
+
+bus.subscribe(on_bus_message)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global admin_seeding, draining
+    broker.bind(asyncio.get_running_loop())
+    if (WEB_CONCURRENCY > 1 or DB_NODES > 1) and not CACHE_URL:
+        log.warning("%d nodes x %d workers without CACHE_URL: leaderboards, caches and rate limits "
+                    "stay per process and will disagree between workers", DB_NODES, WEB_CONCURRENCY)
+    draining = False
+    # Cheap: one query for the schema version (migrations run from the CLI)
+    await check_schema()
+    if ADMIN_USERNAME and ADMIN_PASSWORD:
+        admin_seeding = asyncio.create_task(ensure_admin())
+    # Listen before loading so no other worker's change falls between the two
+    bus.start()
+    await asyncio.gather(
+        run_in_threadpool(public_cache.load),
+        run_in_read_session(load_board),
+        warm_pools(),
+    )
+    await submission_queue.start()
+    yield
+    draining = True
+    # Flush queued submissions while the board, cache and bus still work
+    await submission_queue.stop()
+    if admin_seeding is not None:
+        await admin_seeding
+    bus.stop()
+    hash_pool.shutdown()
+
+app = FastAPI(title="ML League API", lifespan=lifespan)
+app.router.route_class = InstrumentedRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,191 +184,590 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "Retry-After", "X-RateLimit-Limit", "X-RateLimit-Remaining", "X-RateLimit-Reset"],
 )
+# Outermost, so latency covers CORS and the whole response
+app.add_middleware(MetricsMiddleware)
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Serialized bodies of the public GET endpoints; every mutation bumps the version
+public_cache = ResponseCache(make_cache(shared_client, "responses", RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL), bus=bus)
+PUBLIC_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+# List endpoints select these columns as tuples and encode them with `dumps`
+team_projection = Projection(schemas.TeamOut, models.Team.__table__)
+announcement_projection = Projection(schemas.AnnouncementOut, models.Announcement.__table__)
 
-# Seed admin on first boot (optional)
-ADMIN_USERNAME = os.getenv("ADMIN_USERNAME")
-ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD")
-if ADMIN_USERNAME and ADMIN_PASSWORD:
-    with next(get_db()) as db:
-        maybe = db.query(models.User).filter(models.User.username == ADMIN_USERNAME).first()
-        if not maybe:
-            admin = models.User(
-                username=ADMIN_USERNAME,
-                password_hash=hash_password(ADMIN_PASSWORD),
-                is_admin=True
-            )
-            db.add(admin)
-            db.commit()
+async def cached_json(request: Request, key, build):
+    """Serve `key` from the public cache, awaiting `build()` for (body, headers) on a miss."""
+    etag = public_cache.etag()
+    headers = {"ETag": etag, "Cache-Control": PUBLIC_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    version, entry = await offload(public_cache.backend, public_cache.lookup, key)
+    if entry is None:
+        entry = await build()
+        await offload(public_cache.backend, public_cache.store, key, version, entry)
+    body, extra = entry
+    headers.update(extra, ETag=public_cache.etag(version))
+    return Response(content=body, media_type="application/json", headers=headers)
 
-# Dependency to pass settings to deps
-def settings_dep():
-    return {"SECRET_KEY": SECRET_KEY, "ALGORITHM": ALGORITHM, "ACCESS_TOKEN_EXPIRE_MINUTES": ACCESS_TOKEN_EXPIRE_MINUTES}
+def page_headers(next_cursor: Optional[str]) -> dict:
+    return {"X-Next-Cursor": next_cursor} if next_cursor else {}
+
+# Dependency to pass settings to deps (built once, shared by every request)
+settings_dep = get_settings
+
+def forget_team_members(db: Session, team_id: int):
+    """Drop cached principals of users pointing at `team_id` so their next request reloads."""
+    for (username,) in db.query(models.User.username).filter(models.User.team_id == team_id):
+        forget_principal(username)
 
 @app.get("/")
 def root():
     return {"ok": True, "service": "ml-league-api"}
 
+# ---------- Health ----------
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    # Liveness only: no database round-trip, so an outage does not get every node restarted
+    return {"ok": True}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """Readiness for the load balancer: 503 while draining, when the database does not
+    answer through the read pool within READY_TIMEOUT (down, or every connection busy),
+    or when the write-behind queue is full."""
+    problems = []
+    if draining:
+        problems.append("shutting down")
+    try:
+        await ping(READY_TIMEOUT)
+    except asyncio.TimeoutError:
+        problems.append(f"database did not answer within {READY_TIMEOUT}s")
+    except Exception as exc:
+        problems.append(f"database: {exc.__class__.__name__}")
+    if submission_queue.enabled and submission_queue.depth >= submission_queue.maxsize:
+        problems.append("submission queue full")
+    body = {"ready": not problems, "problems": problems, "pools": pool_status(), "queue_depth": submission_queue.depth}
+    return JSONResponse(body, status_code=status.HTTP_503_SERVICE_UNAVAILABLE if problems else status.HTTP_200_OK)
+
+@app.exception_handler(PoolTimeout)
+async def pool_timeout(request: Request, exc: PoolTimeout):
+    # Every connection stayed busy for DB_POOL_TIMEOUT: shed the request, another node may have room
+    return JSONResponse({"detail": "Database busy, retry shortly"}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE, headers={"Retry-After": "1"})
+
+@app.exception_handler(RequestValidationError)
+async def validation_error(request: Request, exc: RequestValidationError):
+    # FastAPI's own handler cannot encode the input of a rejected non-finite score
+    # (e.g. 1e999); orjson writes it as null
+    body = dumps({"detail": jsonable_encoder(exc.errors())})
+    return Response(body, status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, media_type="application/json")
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    # On the event loop, like every update to the lock-free HTTP series
+    return PlainTextResponse(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
 # ---------- Auth ----------
-@app.post("/auth/signup", response_model=schemas.TokenOut)
-def signup(payload: schemas.SignUpIn, db: Session = Depends(get_db)):
-    exists = db.query(models.User).filter(models.User.username == payload.username).first()
+@app.post("/auth/signup", response_model=schemas.TokenOut, dependencies=[Depends(rate_limit("signup"))])
+async def signup(payload: schemas.SignUpIn, db: Session = Depends(get_session)):
+    exists = await run_in_read_session(get_user_by_username, payload.username)
     if exists:
         raise HTTPException(status_code=400, detail="Username already taken")
-    user = models.User(username=payload.username, password_hash=hash_password(payload.password))
-    db.add(user)
-    db.commit()
+    password_hash = await hash_password_async(payload.password)
+
+    def txn(db: Session):
+        user = models.User(username=payload.username, password_hash=password_hash)
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+        return user
+
+    user = await run_sync(db, txn)
     access = create_access_token({"sub": user.username, "is_admin": user.is_admin}, SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES)
     return schemas.TokenOut(access_token=access, is_admin=user.is_admin)
 
 @app.post("/auth/login", response_model=schemas.TokenOut)
-def login(payload: schemas.LoginIn, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.username == payload.username).first()
-    if not user or not verify_password(payload.password, user.password_hash):
+async def login(payload: schemas.LoginIn, request: Request, response: Response, db: Session = Depends(get_session)):
+    # Per IP and per attempted username from that IP, before any bcrypt work. A
+    # username bucket shared by every client would let anyone lock its owner out
+    client = request.client.host if request.client else None
+    await offload(limiter.buckets, limiter.check, "login", request, response, username=f"{client}/{payload.username}")
+    if admin_seeding is not None and not admin_seeding.done():
+        await asyncio.wait([admin_seeding])  # first login right after startup
+    # Looked up on a reader: bcrypt below must not hold the writer connection
+    user = await run_in_read_session(get_user_by_username, payload.username)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    ok, new_hash = await verify_and_update_async(payload.password, user.password_hash)
+    if not ok:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     access = create_access_token({"sub": user.username, "is_admin": user.is_admin}, SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES)
-    return schemas.TokenOut(access_token=access, is_admin=user.is_admin)
+    out = schemas.TokenOut(access_token=access, is_admin=user.is_admin)
+    if new_hash:
+        def rehash(db: Session):
+            db.query(models.User).filter(models.User.id == user.id).update({"password_hash": new_hash})
+            db.commit()
+        await run_sync(db, rehash)
+    return out
 
 @app.get("/auth/me")
-def me(user: models.User = Depends(get_current_user), settings: dict = Depends(settings_dep)):
+async def me(user: Principal = Depends(get_current_user), settings: Settings = Depends(settings_dep)):
     return {"username": user.username, "is_admin": user.is_admin, "team_id": user.team_id}
 
 # ---------- Teams ----------
 @app.post("/teams/create", response_model=schemas.TeamOut)
-def create_team(data: schemas.TeamCreate, user: models.User = Depends(get_current_user), db: Session = Depends(get_db), settings: dict = Depends(settings_dep)):
+async def create_team(data: schemas.TeamCreate, user: Principal = Depends(get_current_user), db: Session = Depends(get_session), settings: Settings = Depends(settings_dep)):
     if user.team_id:
         raise HTTPException(status_code=400, detail="You already own a team")
-    exists = db.query(models.Team).filter(models.Team.name == data.name).first()
-    if exists:
-        raise HTTPException(status_code=400, detail="Team name already in use")
-    team = models.Team(
-        name=data.name.strip(),
-        member1=data.member1.strip(),
-        member2=data.member2.strip(),
-        member3=data.member3.strip(),
-        owner_user_id=user.id
-    )
-    db.add(team)
-    db.commit()
-    db.refresh(team)
-    user.team_id = team.id
-    db.add(user)
-    db.commit()
-    return team
+
+    def txn(db: Session):
+        exists = db.query(models.Team).filter(models.Team.name == data.name).first()
+        if exists:
+            raise HTTPException(status_code=400, detail="Team name already in use")
+        team = models.Team(
+            name=data.name.strip(),
+            member1=data.member1.strip(),
+            member2=data.member2.strip(),
+            member3=data.member3.strip(),
+            owner_user_id=user.id
+        )
+        db.add(team)
+        db.commit()
+        db.refresh(team)
+        db.query(models.User).filter(models.User.id == user.id).update({"team_id": team.id})
+        db.commit()
+        db.refresh(team)
+        forget_principal(user.username)
+        board.upsert(team)
+        public_cache.bump()
+        return team
+
+    return await run_sync(db, txn)
 
 @app.get("/teams/me", response_model=schemas.TeamOut)
-def get_my_team(user: models.User = Depends(get_current_user), db: Session = Depends(get_db), settings: dict = Depends(settings_dep)):
+async def get_my_team(user: Principal = Depends(get_current_user), db: Session = Depends(get_session), settings: Settings = Depends(settings_dep)):
     if not user.team_id:
         raise HTTPException(status_code=404, detail="No team yet")
-    team = db.query(models.Team).get(user.team_id)
-    return team
+    return await run_sync(db, lambda db: db.query(models.Team).get(user.team_id))
 
 @app.put("/teams/me", response_model=schemas.TeamOut)
-def update_my_team(data: schemas.TeamUpdate, user: models.User = Depends(get_current_user), db: Session = Depends(get_db), settings: dict = Depends(settings_dep)):
+async def update_my_team(data: schemas.TeamUpdate, user: Principal = Depends(get_current_user), db: Session = Depends(get_session), settings: Settings = Depends(settings_dep)):
     if not user.team_id:
         raise HTTPException(status_code=404, detail="No team yet")
-    team = db.query(models.Team).get(user.team_id)
-    if team.banned:
-        raise HTTPException(status_code=403, detail="Team is banned")
-    for field in ["name", "member1", "member2", "member3"]:
-        val = getattr(data, field)
-        if val is not None:
-            setattr(team, field, val.strip())
-    db.add(team)
-    db.commit()
-    db.refresh(team)
-    return team
+
+    def txn(db: Session):
+        team = db.query(models.Team).get(user.team_id)
+        if team.banned:
+            raise HTTPException(status_code=403, detail="Team is banned")
+        for field in ["name", "member1", "member2", "member3"]:
+            val = getattr(data, field)
+            if val is not None:
+                setattr(team, field, val.strip())
+        team.version = models.Team.version + 1
+        db.add(team)
+        db.commit()
+        db.refresh(team)
+        forget_team_members(db, team.id)
+        board.upsert(team)
+        public_cache.bump()
+        return team
+
+    return await run_sync(db, txn)
+
+def public_teams_json(db: Session, cursor, limit, include, q):
+    query = db.query(*team_projection.columns(include, "created_at", "id")).filter(models.Team.banned == False)
+    if q:
+        # Range on the unique name index instead of LIKE so the prefix search stays indexed
+        query = query.filter(models.Team.name >= q, models.Team.name < q + "\U0010ffff")
+    teams, next_cursor = keyset_page(query, models.Team.created_at, models.Team.id, cursor, limit)
+    return dumps(team_projection.dicts(teams, include)), page_headers(next_cursor)
 
 @app.get("/teams/public", response_model=list[schemas.TeamOut])
-def list_public(db: Session = Depends(get_db)):
-    teams = db.query(models.Team).filter(models.Team.banned == False).order_by(models.Team.created_at.desc()).all()
-    return teams
+async def list_public(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+    fields: Optional[str] = None,
+    q: Optional[str] = Query(None, min_length=1, max_length=80),
+):
+    include = parse_fields(fields, schemas.TeamOut.model_fields)
+    key = ("teams/public", cursor, limit, frozenset(include or ()), q)
+    return await cached_json(request, key, lambda: run_in_read_session(public_teams_json, cursor, limit, include, q))
 
 # ---------- Submissions & Leaderboard ----------
 @app.get("/leaderboard")
-def leaderboard(db: Session = Depends(get_db)):
-    teams = db.query(models.Team).filter(models.Team.banned == False).order_by(models.Team.total_score.desc()).all()
-    return [
-        {
-            "team_id": t.id,
-            "team_name": t.name,
-            "submission_count": t.submission_count,
-            "total_score": t.total_score
-        } for t in teams
-    ]
-
-@app.post("/submissions", response_model=schemas.SubmissionOut)
-def submit_score(data: schemas.SubmissionIn, user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def leaderboard(
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    week: Optional[str] = Query(None, max_length=32),
+    mode: Literal["total", "sum_of_weeks", "best_of"] = "total",
+    n: int = Query(3, ge=1, le=53),
+):
+    """Overall ranking by default; `week=` ranks one week, `mode=` ranks across weeks."""
+    if week is not None and mode != "total":
+        raise HTTPException(status_code=400, detail="Use either week= or mode=, not both")
+
+    async def build():
+        if week is not None:
+            rows = await run_in_read_session(crud.weekly_leaderboard, week, offset, limit)
+        elif mode != "total":
+            rows = await run_in_read_session(crud.multi_week_leaderboard, mode, n, offset, limit)
+        else:
+            rows = board.page(offset, limit)
+        return dumps(rows), {}
+    key = ("leaderboard", offset, limit, week, mode, n if mode == "best_of" else None)
+    return await cached_json(request, key, build)
+
+@app.get("/leaderboard/weeks")
+async def leaderboard_weeks(request: Request):
+    async def build():
+        return dumps(await run_in_read_session(crud.list_weeks)), {}
+    return await cached_json(request, "leaderboard/weeks", build)
+
+@app.get("/leaderboard/rank/{team_id}")
+async def leaderboard_rank(team_id: int):
+    found = board.rank(team_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Team not ranked")
+    rank, entry = found
+    return {"rank": rank, **entry}
+
+# Arrays behind /leaderboard/stats by (cache version, week): built once per mutation, not per page
+stats_memo = {}
+
+async def leaderboard_arrays(week: Optional[str]) -> LeaderboardStats:
+    key = (public_cache.version, week)
+    found = stats_memo.get(key)
+    if found is None:
+        await ensure_loaded(team_columns, lambda: run_in_threadpool(load_team_columns))
+        columns = team_columns.snapshot()
+        week, previous, week_rows, previous_rows = await run_in_read_session(crud.week_and_previous_scores, week)
+        found = await run_in_threadpool(LeaderboardStats, *columns, week, previous, week_rows, previous_rows)
+        for old in [k for k in stats_memo if k[0] != key[0]]:
+            stats_memo.pop(old, None)
+        stats_memo[key] = found
+    return found
+
+@app.get("/leaderboard/stats")
+async def leaderboard_stats(
+    request: Request,
+    week: Optional[str] = Query(None, max_length=32),
+    bins: int = Query(20, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(PAGE_DEFAULT_LIMIT, ge=0, le=PAGE_MAX_LIMIT),
+):
+    """Distributions (percentiles, histogram) of total_score, submission_count, one
+    week's scores (default: the latest) and their change on the week before, plus
+    z-score, percentile and week delta of each team in rank order from `offset`.
+    Teams with a non-finite total_score are left out and counted in `excluded`."""
+    async def build():
+        found = await leaderboard_arrays(week)
+        return dumps({**found.summary(bins), "rows": found.rows(offset, limit)}), {}
+    key = ("leaderboard/stats", week, bins, offset, limit)
+    return await cached_json(request, key, build)
+
+@app.get("/leaderboard/history")
+async def leaderboard_history(
+    request: Request,
+    top: int = Query(10, ge=1, le=50),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    points: int = Query(100, ge=2, le=1000),
+):
+    """Cumulative total and rank of the current top `top` teams at `points` evenly
+    spaced times (bucket ends) from the first submission, or `start`, to now or `end`."""
+    async def build():
+        await ensure_loaded(history, lambda: run_in_read_session(load_history))
+        entries = board.page()
+        ranked = [e["team_id"] for e in entries]
+        return dumps(await run_in_threadpool(history.top, entries[:top], ranked, start, end, points)), {}
+    # Between two mutations every series is flat, so an entry ending "now" stays right
+    key = ("leaderboard/history", top, start, end, points)
+    return await cached_json(request, key, build)
+
+@app.get("/teams/{team_id}/history")
+async def team_history(
+    request: Request,
+    team_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    points: int = Query(300, ge=2, le=1000),
+    downsample: Literal["lttb", "minmax"] = "lttb",
+):
+    """Cumulative total and rank after each submission of a ranked team, downsampled
+    to at most `points` (LTTB, or the min and max of each time bucket)."""
+    if board.rank(team_id) is None:
+        raise HTTPException(status_code=404, detail="Team not ranked")
+
+    async def build():
+        await ensure_loaded(history, lambda: run_in_read_session(load_history))
+        ranked = [e["team_id"] for e in board.page()]
+        return dumps(await run_in_threadpool(history.team, team_id, ranked, start, end, points, downsample)), {}
+    key = ("teams/history", team_id, start, end, points, downsample)
+    return await cached_json(request, key, build)
+
+def ingest_queued(db: Session, rows):
+    """Group commit for the submission queue; returns one result per row."""
+    results, touched = crud.ingest_submissions(db, rows, returning=True)
+    for team in touched:
+        board.upsert(team)
+    if touched:
+        public_cache.bump()
+    return results
+
+# Off unless SUBMIT_MODE is flush or enqueue; then POST /submissions goes through it
+submission_queue = SubmissionQueue(lambda rows: run_in_session(ingest_queued, rows))
+
+@app.post("/submissions", response_model=schemas.SubmissionOut, dependencies=[Depends(rate_limit_user("submissions"))])
+async def submit_score(data: schemas.SubmissionIn, user: Principal = Depends(get_current_user)):
     if not user.team_id:
         raise HTTPException(status_code=400, detail="Create a team first")
-    team = db.query(models.Team).get(user.team_id)
-    if team.banned:
-        raise HTTPException(status_code=403, detail="Team is banned")
-    sub = models.Submission(team_id=team.id, score=float(data.score), week=data.week)
-    team.submission_count += 1
-    team.total_score += float(data.score)
-    db.add(sub)
-    db.add(team)
-    db.commit()
-    db.refresh(sub)
-    return sub
+
+    if submission_queue.enabled:
+        row = schemas.SubmissionBatchRow(team_id=user.team_id, score=float(data.score), week=data.week)
+        pending = submission_queue.submit(row)
+        if pending is None:
+            return JSONResponse({"queued": True, **row.model_dump()}, status_code=status.HTTP_202_ACCEPTED)
+        result = await pending
+        if not result["ok"]:
+            code = 404 if result["detail"] == "Team not found" else 403
+            raise HTTPException(status_code=code, detail=result["detail"])
+        return result["submission"]
+
+    def txn(db: Session):
+        recorded = crud.record_submission(db, user.team_id, float(data.score), data.week)
+        if recorded is None:
+            if db.query(models.Team.id).filter(models.Team.id == user.team_id).first() is None:
+                raise HTTPException(status_code=404, detail="Team not found")
+            raise HTTPException(status_code=403, detail="Team is banned")
+        sub, team = recorded
+        board.upsert(team)
+        public_cache.bump()
+        return sub
+
+    # A session of its own rather than a request dependency, which queued submissions never use
+    return await run_in_session(txn)
+
+_batch_row = TypeAdapter(schemas.SubmissionBatchRow)
+
+def parse_batch(body: bytes, content_type: str):
+    """Split a JSON array or NDJSON body into raw row objects."""
+    try:
+        if "ndjson" in content_type or "jsonlines" in content_type:
+            return [json.loads(line) for line in body.splitlines() if line.strip()]
+        rows = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed batch body: {e}")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of rows")
+    return rows
+
+@app.post("/submissions/batch", response_model=schemas.SubmissionBatchOut)
+async def submit_batch(request: Request, _: Principal = Depends(require_admin), db: Session = Depends(get_session)):
+    raw = parse_batch(await request.body(), request.headers.get("content-type", ""))
+    if len(raw) > SUBMISSION_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {SUBMISSION_BATCH_MAX} rows per batch")
+    valid, results = [], []
+    for index, obj in enumerate(raw):
+        try:
+            valid.append((index, _batch_row.validate_python(obj)))
+        except ValidationError as e:
+            results.append({"row": index, "ok": False, "detail": str(e.errors()[0]["msg"])})
+
+    def txn(db: Session):
+        ingested, touched = crud.ingest_submissions(db, valid)
+        for team in touched:
+            board.upsert(team)
+        if touched:
+            public_cache.bump()
+        return ingested
+
+    results.extend(await run_sync(db, txn))
+    results.sort(key=lambda r: r["row"])
+    accepted = sum(1 for r in results if r["ok"])
+    return {"accepted": accepted, "rejected": len(results) - accepted, "results": results}
 
 # ---------- Announcements ----------
+def announcements_json(db: Session, cursor, limit, include):
+    query = db.query(*announcement_projection.columns(include, "created_at", "id"))
+    rows, next_cursor = keyset_page(query, models.Announcement.created_at, models.Announcement.id, cursor, limit)
+    return dumps(announcement_projection.dicts(rows, include)), page_headers(next_cursor)
+
 @app.get("/announcements", response_model=list[schemas.AnnouncementOut])
-def get_announcements(db: Session = Depends(get_db)):
-    rows = db.query(models.Announcement).order_by(models.Announcement.created_at.desc()).all()
-    return rows
+async def get_announcements(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+    fields: Optional[str] = None,
+):
+    include = parse_fields(fields, schemas.AnnouncementOut.model_fields)
+    key = ("announcements", cursor, limit, frozenset(include or ()))
+    return await cached_json(request, key, lambda: run_in_read_session(announcements_json, cursor, limit, include))
 
 @app.post("/announcements", response_model=schemas.AnnouncementOut)
-def post_announcement(
+async def post_announcement(
     data: schemas.AnnouncementIn,
-    admin: models.User = Depends(require_admin),
-    db: Session = Depends(get_db)
+    admin: Principal = Depends(require_admin),
+    db: Session = Depends(get_session)
 ):
-    row = models.Announcement(title=data.title.strip(), body=data.body.strip(), created_by=admin.id)
-    db.add(row)
-    db.commit()
-    db.refresh(row)
-    return row
+    def txn(db: Session):
+        row = models.Announcement(title=data.title.strip(), body=data.body.strip(), created_by=admin.id)
+        db.add(row)
+        db.commit()
+        db.refresh(row)
+        public_cache.bump()
+        out = schemas.AnnouncementOut.model_validate(row)
+        broker.publish("announcements", "announcement", out.model_dump_json())
+        return out
+
+    return await run_sync(db, txn)
 
 @app.delete("/announcements/{ann_id}")
-def delete_announcement(ann_id: int, admin: models.User = Depends(require_admin), db: Session = Depends(get_db)):
-    row = db.query(models.Announcement).get(ann_id)
-    if not row:
-        raise HTTPException(status_code=404, detail="Announcement not found")
-    db.delete(row)
-    db.commit()
+async def delete_announcement(ann_id: int, admin: Principal = Depends(require_admin), db: Session = Depends(get_session)):
+    def txn(db: Session):
+        row = db.query(models.Announcement).get(ann_id)
+        if not row:
+            raise HTTPException(status_code=404, detail="Announcement not found")
+        db.delete(row)
+        db.commit()
+        public_cache.bump()
+        broker.publish("announcements", "announcement_deleted", {"id": ann_id})
+
+    await run_sync(db, txn)
     return {"ok": True}
 
+# ---------- Live streams (Server-Sent Events) ----------
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@app.get("/stream/leaderboard")
+async def stream_leaderboard(limit: Optional[int] = Query(None, ge=1)):
+    """`snapshot` with the current ranking, then `rank`/`remove` changes (and `reset`
+    when the board is rebuilt). Changes with seq <= the snapshot's seq are already in it."""
+    sub = broker.subscribe("leaderboard")
+    seq, rows = board.snapshot(0, limit)
+    snapshot = sse("snapshot", {"seq": seq, "rows": rows}, seq)
+    return StreamingResponse(broker.stream(sub, snapshot), media_type="text/event-stream", headers=STREAM_HEADERS)
+
+@app.get("/stream/announcements")
+async def stream_announcements():
+    """`snapshot` with the newest announcements, then `announcement`/`announcement_deleted`."""
+    sub = broker.subscribe("announcements")
+    try:
+        body, _ = await run_in_read_session(announcements_json, None, PAGE_DEFAULT_LIMIT, None)
+    except BaseException:
+        broker.unsubscribe(sub)
+        raise
+    snapshot = sse("snapshot", body.decode())
+    return StreamingResponse(broker.stream(sub, snapshot), media_type="text/event-stream", headers=STREAM_HEADERS)
+
 # ---------- Admin: Ban/Delete Teams ----------
-@app.post("/admin/teams/{team_id}/ban")
-def ban_team(team_id: int, _: models.User = Depends(require_admin), db: Session = Depends(get_db)):
-    team = db.query(models.Team).get(team_id)
-    if not team:
+def team_action(db: Session, team_ids, action: str) -> list:
+    """Ban, unban or delete `team_ids` with set-based statements in one transaction,
+    then update the board and caches. Returns the ids of the teams found."""
+    if action == "delete":
+        deleted, members = crud.delete_teams(db, team_ids)
+        found = [row.id for row in deleted]
+        for row in deleted:
+            board.remove(row.id, deleted=True, version=row.version)
+    else:
+        rows = crud.set_teams_banned(db, team_ids, action == "ban")
+        found = [row.id for row in rows]
+        members = crud.team_members(db, found)
+        for row in rows:
+            board.upsert(row)  # unranks banned teams
+    for username in members:
+        forget_principal(username)
+    if found:
+        public_cache.bump()
+    return found
+
+async def one_team_action(db, team_id: int, action: str):
+    if not await run_sync(db, team_action, [team_id], action):
         raise HTTPException(status_code=404, detail="Team not found")
-    team.banned = True
-    db.add(team)
-    db.commit()
+
+@app.post("/admin/teams/bulk", response_model=schemas.TeamBulkOut)
+async def bulk_team_action(data: schemas.TeamBulkIn, _: Principal = Depends(require_admin), db: Session = Depends(get_session)):
+    """Ban, unban or delete many teams at once; unknown ids are reported, not an error."""
+    found = await run_sync(db, team_action, data.team_ids, data.action)
+    missing = sorted(set(data.team_ids) - set(found))
+    return {"ok": True, "action": data.action, "affected": len(found), "not_found": missing}
+
+@app.post("/admin/teams/{team_id}/ban")
+async def ban_team(team_id: int, _: Principal = Depends(require_admin), db: Session = Depends(get_session)):
+    await one_team_action(db, team_id, "ban")
     return {"ok": True, "status": "banned"}
 
 @app.post("/admin/teams/{team_id}/unban")
-def unban_team(team_id: int, _: models.User = Depends(require_admin), db: Session = Depends(get_db)):
-    team = db.query(models.Team).get(team_id)
-    if not team:
-        raise HTTPException(status_code=404, detail="Team not found")
-    team.banned = False
-    db.add(team)
-    db.commit()
+async def unban_team(team_id: int, _: Principal = Depends(require_admin), db: Session = Depends(get_session)):
+    await one_team_action(db, team_id, "unban")
     return {"ok": True, "status": "unbanned"}
 
 @app.delete("/admin/teams/{team_id}")
-def delete_team(team_id: int, _: models.User = Depends(require_admin), db: Session = Depends(get_db)):
-    team = db.query(models.Team).get(team_id)
-    if not team:
-        raise HTTPException(status_code=404, detail="Team not found")
-    db.delete(team)
-    db.commit()
+async def delete_team(team_id: int, _: Principal = Depends(require_admin), db: Session = Depends(get_session)):
+    await one_team_action(db, team_id, "delete")
     return {"ok": True, "status": "deleted"}
+
+@app.post("/admin/reconcile")
+async def reconcile(repair: bool = False, _: Principal = Depends(require_admin), db: Session = Depends(get_session)):
+    def txn(db: Session):
+        drift = crud.reconcile_team_aggregates(db, repair=repair)
+        if repair and drift:
+            load_board(db)
+            bus.publish({"type": "reload"})
+            public_cache.bump()
+        return drift
+
+    drift = await run_sync(db, txn)
+    return {"ok": True, "drifted": len(drift), "repaired": repair and bool(drift), "teams": drift}
+
+@app.post("/admin/weekly-scores/rebuild")
+async def rebuild_weekly_scores(_: Principal = Depends(require_admin), db: Session = Depends(get_session)):
+    def txn(db: Session):
+        rows = crud.rebuild_weekly_scores(db)
+        public_cache.bump()
+        return rows
+
+    return {"ok": True, "rows": await run_sync(db, txn)}
+
+# ---------- Admin: exports ----------
+ExportFormat = Literal["csv", "ndjson", "parquet"]
+
+def export_response(name: str, stmt, format: str):
+    if format not in export.available_formats():
+        raise HTTPException(status_code=400, detail=f"{format} export needs pyarrow on the server")
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    headers = {
+        "Content-Disposition": f'attachment; filename="{name}-{stamp}.{format}"',
+        "Cache-Control": "no-store",
+        "X-Accel-Buffering": "no",
+    }
+    return StreamingResponse(export.stream(stmt, format), media_type=export.MEDIA_TYPES[format], headers=headers)
+
+@app.get("/admin/export/submissions")
+async def export_submissions(
+    format: ExportFormat = "csv",
+    week: Optional[str] = Query(None, max_length=32),
+    since: Optional[datetime] = None,
+    _: Principal = Depends(require_admin),
+):
+    """Every submission (optionally one week's, or those since a time), oldest first."""
+    return export_response("submissions", export.submissions_query(week, since), format)
+
+@app.get("/admin/export/teams")
+async def export_teams(
+    format: ExportFormat = "csv",
+    week: Optional[str] = Query(None, max_length=32),
+    since: Optional[datetime] = None,
+    _: Principal = Depends(require_admin),
+):
+    """Every team including banned ones; `week` keeps teams that submitted that week, `since` those created since."""
+    return export_response("teams", export.teams_query(week, since), format)
+
+@app.get("/admin/cache")
+async def cache_stats(_: Principal = Depends(require_admin)):
+    return {
+        "responses": public_cache.stats(),
+        "principals": principal_cache.stats(),
+        "bus": {"enabled": bus.client is not None, "sent": bus.sent, "received": bus.received, "dropped": bus.dropped},
+    }
@@ -0,0 +1,316 @@
+"""Prometheus text-format metrics without a client dependency.
+
+Metrics are per process; with several workers, scrape each one (or run a single
+worker per container). Every update is a dict lookup plus a short lock, which keeps
+instrumentation to a few microseconds per request.
+"""
+import re
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+from fastapi.routing import APIRoute
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+BCRYPT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def _header(name: str, help: str, kind: str):
+    return [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+
+
+def _histogram_lines(name: str, labelnames, labels, bounds, counts, total):
+    running = 0
+    for bound, count in zip(bounds, counts):
+        running += count
+        yield f"{name}_bucket{_labels(labelnames, labels, bound)} {running}"
+    yield f"{name}_sum{_labels(labelnames, labels)} {total}"
+    yield f"{name}_count{_labels(labelnames, labels)} {running}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames=(), registry: Registry = REGISTRY):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        registry.register(self)
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return list(self._values.items())
+
+    def expose(self):
+        lines = _header(self.name, self.help, self.kind)
+        lines.extend(f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in self.samples())
+        return lines
+
+
+class Gauge(Counter):
+    """Settable gauge, or a callback gauge when `collect` returns [(labels, value)]."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames=(), collect=None, registry: Registry = REGISTRY):
+        super().__init__(name, help, labelnames, registry)
+        self.collect = collect
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self):
+        return list(self.collect()) if self.collect is not None else super().samples()
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS, registry: Registry = REGISTRY):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self._series = {}
+        registry.register(self)
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def expose(self):
+        with self._lock:
+            snapshot = [(labels, list(series)) for labels, series in self._series.items()]
+        bounds = _bounds(self.buckets)
+        lines = _header(self.name, self.help, self.kind)
+        for labels, series in snapshot:
+            lines.extend(_histogram_lines(self.name, self.labelnames, labels, bounds, series[:-1], series[-1]))
+        return lines
+
+
+def _bounds(buckets):
+    return ['le="%s"' % bound for bound in buckets] + ['le="+Inf"']
+
+
+# ---------- HTTP ----------
+class _RouteSeries:
+    __slots__ = ("counts", "sum", "in_flight", "statuses")
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * (buckets + 1)
+        self.sum = 0.0
+        self.in_flight = 0
+        self.statuses = {}
+
+
+class HttpMetrics:
+    """Request count, latency histogram and in-flight gauge per (method, route template).
+
+    Only touched from the event loop thread (the middleware, the route wrapper and the
+    async /metrics handler), so unlike the generic metrics above it takes no lock:
+    one dict lookup per update, which keeps the per-request cost in the low microseconds.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS, registry: Registry = REGISTRY):
+        self.buckets = tuple(buckets)
+        self._series = {}
+        registry.register(self)
+
+    def series(self, method: str, route: str) -> _RouteSeries:
+        series = self._series.get((method, route))
+        if series is None:
+            series = self._series[(method, route)] = _RouteSeries(len(self.buckets))
+        return series
+
+    def observe(self, method: str, route: str, status: int, seconds: float):
+        series = self.series(method, route)
+        series.counts[bisect_left(self.buckets, seconds)] += 1
+        series.sum += seconds
+        series.statuses[status] = series.statuses.get(status, 0) + 1
+
+    def expose(self):
+        items = sorted(self._series.items())
+        bounds = _bounds(self.buckets)
+        names = ("method", "route")
+        lines = _header("http_requests_total", "Requests by route template and status.", "counter")
+        for labels, series in items:
+            for status, count in sorted(series.statuses.items()):
+                lines.append(f"http_requests_total{_labels(names + ('status',), labels + (status,))} {count}")
+        lines += _header("http_request_duration_seconds", "Time from request start to the last response byte.", "histogram")
+        for labels, series in items:
+            lines.extend(_histogram_lines("http_request_duration_seconds", names, labels, bounds, series.counts, series.sum))
+        lines += _header("http_requests_in_flight", "Requests currently inside a route handler.", "gauge")
+        for labels, series in items:
+            lines.append(f"http_requests_in_flight{_labels(names, labels)} {series.in_flight}")
+        return lines
+
+
+HTTP = HttpMetrics()
+UNMATCHED = "<unmatched>"
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware (BaseHTTPMiddleware would cost far more per request).
+
+    The route label is the matched path template, which FastAPI leaves in
+    `scope["route"]`; unmatched paths share one label to keep cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            HTTP.observe(scope["method"], route.path if route is not None else UNMATCHED, status, perf_counter() - start)
+
+
+class InstrumentedRoute(APIRoute):
+    """Route class that tracks in-flight requests per path template.
+
+    The middleware only learns the route once routing is done, so in-flight counts
+    are kept here, around the handler (dependencies, endpoint and serialization).
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        path = self.path
+
+        async def instrumented(request):
+            series = HTTP.series(request.method, path)
+            series.in_flight += 1
+            try:
+                return await handler(request)
+            finally:
+                series.in_flight -= 1
+        return instrumented
+
+
+# ---------- Database ----------
+QUERY_SECONDS = Histogram("db_query_duration_seconds", "Cursor execute time by statement kind and table.", ("statement", "table"), QUERY_BUCKETS)
+POOL_WAIT_SECONDS = Histogram("db_pool_wait_seconds", "Time spent waiting to check a connection out of the pool.", (), QUERY_BUCKETS)
+
+_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+"?(\w+)', re.IGNORECASE)
+_statement_labels = {}
+
+
+def _statement_label(statement: str):
+    # Compiled SQL strings are reused, so this is one (cached-hash) dict lookup per query
+    label = _statement_labels.get(statement)
+    if label is None:
+        words = statement.split(None, 1)
+        table = _TABLE.search(statement)
+        label = (words[0].upper() if words else "", table.group(1) if table else "")
+        if len(_statement_labels) < 4096:
+            _statement_labels[statement] = label
+    return label
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_start = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_metrics_start", None)
+    if start is not None:
+        QUERY_SECONDS.observe(perf_counter() - start, *_statement_label(statement))
+
+
+def timed_pool(pool_class):
+    """Subclass of a QueuePool-style `pool_class` that records checkout wait time."""
+
+    class TimedPool(pool_class):
+        def _do_get(self):
+            start = perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                POOL_WAIT_SECONDS.observe(perf_counter() - start)
+
+    TimedPool.__name__ = f"Timed{pool_class.__name__}"
+    return TimedPool
+
+
+_engines = {}
+
+def _pool_stats():
+    for role, engine in _engines.items():
+        pool = engine.pool  # replaced by engine.dispose()
+        for stat in ("size", "checkedout", "checkedin", "overflow"):
+            fn = getattr(pool, stat, None)
+            if fn is not None:
+                yield (role, stat), fn()
+
+
+POOL_CONNECTIONS = Gauge("db_pool_connections", "Pool size, checked out/in connections and current overflow, per engine.", ("engine", "state"), collect=_pool_stats)
+
+
+def instrument_engine(engine, role: str = "primary"):
+    """Time every statement on `engine` and expose its pool occupancy as `role`."""
+    from sqlalchemy import event
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    _engines[role] = engine
+
+
+# ---------- Password hashing ----------
+BCRYPT_SECONDS = Histogram("bcrypt_duration_seconds", "bcrypt hash/verify time, including hash pool queueing.", ("op",), BCRYPT_BUCKETS)
@@ -0,0 +1,273 @@
+"""Versioned schema migrations.
+
+    python -m backend.migrations upgrade            # apply every pending migration
+    python -m backend.migrations upgrade --to 1
+    python -m backend.migrations status
+
+Run `upgrade` once per deploy, before starting the API: app startup only checks
+that the database is at LATEST_VERSION (one query) and refuses to start when it
+is behind, unless MIGRATE_ON_STARTUP=1 (handy for development), in which case
+the first worker to get the lock migrates and the others find nothing to do.
+
+Applied versions are recorded in schema_migrations. A migration is a function
+of a Connection, registered with @migration(version, name); they run in
+version order in one transaction, under a lock that serializes concurrent
+upgrades (BEGIN IMMEDIATE on SQLite, an advisory lock on PostgreSQL). They
+spell out their own DDL instead of reading backend.models, so a migration keeps
+doing what it did when it was written; changing a model means adding one.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime
+
+from sqlalchemy import (
+    Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, func, inspect, select,
+)
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import crud
+from .database import ASYNC_MODE, async_engine, async_read_engine, engine, read_engine
+
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "0") in ("1", "true", "yes")
+# Arbitrary key for pg_advisory_xact_lock, shared by every process migrating this database
+_PG_LOCK_KEY = 0x6D656868
+
+log = logging.getLogger(__name__)
+
+schema_migrations = Table(
+    "schema_migrations", MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+MIGRATIONS = []  # (version, name, fn) in version order
+
+
+def migration(version: int, name: str):
+    def register(fn):
+        if MIGRATIONS and version <= MIGRATIONS[-1][0]:
+            raise ValueError(f"migration {version} registered after {MIGRATIONS[-1][0]}")
+        MIGRATIONS.append((version, name, fn))
+        return fn
+    return register
+
+
+# ---------- migrations ----------
+# The schema as of version 1, frozen: later model changes get a migration of their
+# own rather than showing up here, where only new databases would see them
+_schema_v1 = MetaData()
+
+Table(
+    "users", _schema_v1,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("username", String(64), unique=True, index=True, nullable=False),
+    Column("password_hash", String(255), nullable=False),
+    Column("is_admin", Boolean),
+    Column("team_id", Integer, ForeignKey("teams.id"), nullable=True, index=True),
+)
+_teams_v1 = Table(
+    "teams", _schema_v1,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("name", String(80), unique=True, index=True, nullable=False),
+    Column("member1", String(80), nullable=False),
+    Column("member2", String(80), nullable=False),
+    Column("member3", String(80), nullable=False),
+    Column("banned", Boolean),
+    Column("submission_count", Integer),
+    Column("total_score", Float),
+    Column("created_at", DateTime, server_default=func.now()),
+    Column("owner_user_id", Integer, ForeignKey("users.id"), nullable=True),
+)
+Index("ix_teams_banned_total_score", _teams_v1.c.banned, _teams_v1.c.total_score.desc(), _teams_v1.c.id)
+Index("ix_teams_banned_created_at", _teams_v1.c.banned, _teams_v1.c.created_at.desc(), _teams_v1.c.id.desc())
+_submissions_v1 = Table(
+    "submissions", _schema_v1,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("team_id", Integer, ForeignKey("teams.id"), nullable=False),
+    Column("score", Float, nullable=False),
+    Column("week", String(32), nullable=True),
+    Column("submitted_at", DateTime, server_default=func.now()),
+)
+Index("ix_submissions_team_id_submitted_at", _submissions_v1.c.team_id, _submissions_v1.c.submitted_at)
+Index(
+    "ix_submissions_week_score", _submissions_v1.c.week, _submissions_v1.c.score.desc(),
+    sqlite_where=_submissions_v1.c.week.isnot(None), postgresql_where=_submissions_v1.c.week.isnot(None),
+)
+_weekly_scores_v1 = Table(
+    "weekly_scores", _schema_v1,
+    Column("team_id", Integer, ForeignKey("teams.id"), primary_key=True),
+    Column("week", String(32), primary_key=True),
+    Column("total", Float, nullable=False),
+    Column("best", Float, nullable=False),
+    Column("count", Integer, nullable=False),
+)
+Index("ix_weekly_scores_week_total", _weekly_scores_v1.c.week, _weekly_scores_v1.c.total.desc(), _weekly_scores_v1.c.team_id)
+_announcements_v1 = Table(
+    "announcements", _schema_v1,
+    Column("id", Integer, primary_key=True, index=True),
+    Column("title", String(120), nullable=False),
+    Column("body", String(2000), nullable=False),
+    Column("created_at", DateTime, server_default=func.now()),
+    Column("created_by", Integer, ForeignKey("users.id"), nullable=True),
+)
+Index("ix_announcements_created_at", _announcements_v1.c.created_at.desc(), _announcements_v1.c.id.desc())
+
+
+@migration(1, "initial schema")
+def _initial_schema(conn):
+    # checkfirst everywhere: databases created by create_all before migrations existed
+    # are adopted as they are, with any index they were missing
+    _schema_v1.create_all(conn)
+    for table in _schema_v1.tables.values():
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+@migration(2, "backfill weekly_scores")
+def _backfill_weekly_scores(conn):
+    with Session(bind=conn) as db:
+        crud.ensure_weekly_scores(db)
+        db.flush()
+
+
+# Team children and members, and what deleting the team does to them
+_TEAM_FOREIGN_KEYS = (("submissions", "CASCADE"), ("weekly_scores", "CASCADE"), ("users", "SET NULL"))
+
+
+@migration(3, "on delete cascade for team foreign keys")
+def _team_foreign_keys(conn):
+    # SQLite cannot change a foreign key short of rebuilding the table, and only
+    # enforces them with PRAGMA foreign_keys (off here); crud.delete_teams clears
+    # the dependent rows itself, so existing SQLite databases keep theirs
+    if conn.dialect.name != "postgresql":
+        return
+    inspector = inspect(conn)
+    for table, action in _TEAM_FOREIGN_KEYS:
+        for fk in inspector.get_foreign_keys(table):
+            if fk["referred_table"] == "teams" and fk["constrained_columns"] == ["team_id"]:
+                conn.exec_driver_sql(f'ALTER TABLE {table} DROP CONSTRAINT "{fk["name"]}"')
+        conn.exec_driver_sql(
+            f"ALTER TABLE {table} ADD CONSTRAINT {table}_team_id_fkey "
+            f"FOREIGN KEY (team_id) REFERENCES teams (id) ON DELETE {action}"
+        )
+
+
+@migration(4, "teams.version")
+def _team_version(conn):
+    # Databases created by create_all since the model gained the column already have it
+    if "version" not in {c["name"] for c in inspect(conn).get_columns("teams")}:
+        conn.exec_driver_sql("ALTER TABLE teams ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ---------- running them ----------
+def current_version(conn) -> int:
+    """Highest applied version, 0 for a database never migrated."""
+    if not inspect(conn).has_table(schema_migrations.name):
+        return 0
+    return conn.execute(select(func.max(schema_migrations.c.version))).scalar() or 0
+
+
+def _lock(conn):
+    if conn.dialect.name == "sqlite":
+        # Takes the write lock now rather than at the first write, which another
+        # process could already hold after reading the same version
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    elif conn.dialect.name == "postgresql":
+        conn.exec_driver_sql(f"SELECT pg_advisory_xact_lock({_PG_LOCK_KEY})")
+
+
+def _upgrade(conn, target: int = None) -> list:
+    """Apply pending migrations up to `target` in the connection's transaction."""
+    target = LATEST_VERSION if target is None else target
+    _lock(conn)
+    schema_migrations.create(conn, checkfirst=True)
+    current = current_version(conn)
+    applied = []
+    for version, name, fn in MIGRATIONS:
+        if current < version <= target:
+            log.info("applying migration %d: %s", version, name)
+            fn(conn)
+            conn.execute(schema_migrations.insert().values(version=version, name=name, applied_at=datetime.utcnow()))
+            applied.append((version, name))
+    return applied
+
+
+def upgrade_engine(sync_engine, target: int = None) -> list:
+    """Migrate through a sync Engine (the CLI tools' own engines)."""
+    with sync_engine.begin() as conn:
+        return _upgrade(conn, target)
+
+
+async def upgrade(target: int = None) -> list:
+    if ASYNC_MODE:
+        async with async_engine.begin() as conn:
+            return await conn.run_sync(_upgrade, target)
+    return await run_in_threadpool(upgrade_engine, engine, target)
+
+
+async def schema_version() -> int:
+    if ASYNC_MODE:
+        async with async_read_engine.connect() as conn:
+            return await conn.run_sync(current_version)
+
+    def read():
+        with read_engine.connect() as conn:
+            return current_version(conn)
+    return await run_in_threadpool(read)
+
+
+async def check_schema():
+    """Startup check: the database must be at LATEST_VERSION (or get there, with MIGRATE_ON_STARTUP)."""
+    version = await schema_version()
+    if version < LATEST_VERSION:
+        if not MIGRATE_ON_STARTUP:
+            raise RuntimeError(
+                f"Database schema is at version {version}, this build needs {LATEST_VERSION}: "
+                "run `python -m backend.migrations upgrade` (or set MIGRATE_ON_STARTUP=1)"
+            )
+        await upgrade()
+    elif version > LATEST_VERSION:
+        # Rolled back past a migration; new columns and tables are simply unused
+        log.warning("database schema version %d is newer than this build's %d", version, LATEST_VERSION)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    up = commands.add_parser("upgrade", help="apply pending migrations")
+    up.add_argument("--to", type=int, help="stop at this version (default: latest)")
+    commands.add_parser("status", help="show applied and pending migrations")
+    args = parser.parse_args(argv)
+    logging.basicConfig(format="%(message)s")
+    log.setLevel(logging.INFO)
+
+    return asyncio.run(_cli(args))
+
+
+async def _cli(args) -> int:
+    try:
+        if args.command == "upgrade":
+            applied = await upgrade(args.to)
+            print(f"applied {len(applied)} migration(s)" if applied else "already up to date")
+            return 0
+        version = await schema_version()
+        for number, name, _ in MIGRATIONS:
+            print(f"  [{'x' if number <= version else ' '}] {number:>4}  {name}")
+        print(f"database at version {version}, latest is {LATEST_VERSION}")
+        return 0 if version >= LATEST_VERSION else 1
+    finally:
+        # aiosqlite runs each connection on a thread that would keep the process alive
+        if ASYNC_MODE:
+            await async_engine.dispose()
+            await async_read_engine.dispose()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Float, func
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Float, Index, func
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -8,9 +8,11 @@ class User(Base):
     username = Column(String(64), unique=True, index=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
     is_admin = Column(Boolean, default=False)
-    team_id = Column(Integer, ForeignKey("teams.id"), nullable=True)
+    team_id = Column(Integer, ForeignKey("teams.id", ondelete="SET NULL"), nullable=True, index=True)
 
-    team = relationship("Team", back_populates="owner", uselist=False)
+    # users.team_id and teams.owner_user_id are two independent links, so each side
+    # names its own foreign key (they are not inverses of each other)
+    team = relationship("Team", foreign_keys=[team_id], uselist=False)
 
 class Team(Base):
     __tablename__ = "teams"
@@ -22,22 +24,55 @@ class Team(Base):
     banned = Column(Boolean, default=False)
     submission_count = Column(Integer, default=0)
     total_score = Column(Float, default=0.0)
+    # Bumped by every write to what the leaderboard shows of the team (crud, update_my_team)
+    version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, server_default=func.now())
     owner_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
 
-    owner = relationship("User", back_populates="team")
-    submissions = relationship("Submission", back_populates="team", cascade="all, delete-orphan")
+    owner = relationship("User", foreign_keys=[owner_user_id])
+    # passive_deletes: deleting a Team leaves its rows to ON DELETE CASCADE instead of
+    # loading them first; crud.delete_teams also removes them in bulk, for SQLite
+    submissions = relationship("Submission", back_populates="team", cascade="all, delete-orphan", passive_deletes=True)
+    weekly_scores = relationship("WeeklyScore", cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        # Visible teams by score (leaderboard rebuild) and newest first (/teams/public pages)
+        Index("ix_teams_banned_total_score", banned, total_score.desc(), id),
+        Index("ix_teams_banned_created_at", banned, created_at.desc(), id.desc()),
+    )
 
 class Submission(Base):
     __tablename__ = "submissions"
     id = Column(Integer, primary_key=True, index=True)
-    team_id = Column(Integer, ForeignKey("teams.id"), nullable=False)
+    team_id = Column(Integer, ForeignKey("teams.id", ondelete="CASCADE"), nullable=False)
     score = Column(Float, nullable=False)
     week = Column(String(32), nullable=True)  # optional label like "2025-W35"
     submitted_at = Column(DateTime, server_default=func.now())
 
     team = relationship("Team", back_populates="submissions")
 
+    __table_args__ = (
+        Index("ix_submissions_team_id_submitted_at", team_id, submitted_at),
+        # Partial: only labelled submissions take part in weekly rankings
+        Index(
+            "ix_submissions_week_score", week, score.desc(),
+            sqlite_where=week.isnot(None), postgresql_where=week.isnot(None),
+        ),
+    )
+
+class WeeklyScore(Base):
+    """Per (team, week) aggregate of labelled submissions, kept in step by submit_score."""
+    __tablename__ = "weekly_scores"
+    team_id = Column(Integer, ForeignKey("teams.id", ondelete="CASCADE"), primary_key=True)
+    week = Column(String(32), primary_key=True)
+    total = Column(Float, nullable=False, default=0.0)
+    best = Column(Float, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_weekly_scores_week_total", week, total.desc(), team_id),
+    )
+
 class Announcement(Base):
     __tablename__ = "announcements"
     id = Column(Integer, primary_key=True, index=True)
@@ -45,3 +80,7 @@ class Announcement(Base):
     body = Column(String(2000), nullable=False)
     created_at = Column(DateTime, server_default=func.now())
     created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+
+    __table_args__ = (
+        Index("ix_announcements_created_at", created_at.desc(), id.desc()),
+    )
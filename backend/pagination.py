@@ -0,0 +1,59 @@
+import base64
+import os
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import String, literal, tuple_
+
+PAGE_DEFAULT_LIMIT = int(os.getenv("PAGE_DEFAULT_LIMIT", "100"))
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", "1000"))
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_fields(fields: Optional[str], allowed) -> Optional[set]:
+    """Turn `fields=a,b` into a set, rejecting names the schema does not have."""
+    if not fields:
+        return None
+    wanted = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = wanted - set(allowed)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return wanted
+
+
+def _bound(query, value: datetime):
+    # SQLite stores server_default timestamps as 'YYYY-MM-DD HH:MM:SS' text, but a bound
+    # datetime is rendered with microseconds, so ties on created_at would never compare equal.
+    if query.session.get_bind().dialect.name == "sqlite":
+        return literal(value.isoformat(sep=" "), String)
+    return value
+
+
+def keyset_page(query, created_col, id_col, cursor: Optional[str], limit: int):
+    """Newest-first page of `query` keyed on (created_at, id).
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        created_at = _bound(query, created_at)
+        # Row-value comparison lets the (created_at, id) index serve the range directly
+        query = query.filter(tuple_(created_col, id_col) < tuple_(created_at, row_id))
+    rows = query.order_by(created_col.desc(), id_col.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
@@ -0,0 +1,248 @@
+"""Token-bucket rate limiting for the expensive routes (bcrypt logins, signups, writes).
+
+Each route has a set of limits, one per key kind: the client IP, the attempted
+username (login passes it with the IP: guessing from one address is slowed, and
+nobody else's wrong passwords lock the owner out), the authenticated user or
+their team. A limit "N/S" is a bucket holding
+at most N tokens that refills at N per S seconds; every request takes one token
+from each of the route's buckets, and only when all of them have one.
+
+    RATE_LIMIT_ENABLED=0                           # switch limiting off
+    RATE_LIMIT_LOGIN="ip=30/60,username=10/60"     # override a route's limits ("" = none)
+
+Buckets live in this process, or in Redis (one atomic script call per request)
+when CACHE_URL points at it, so every worker and replica draws from the same
+buckets. The client IP is `request.client.host`; behind a proxy run uvicorn with
+--proxy-headers/--forwarded-allow-ips so that it is the real client.
+"""
+import math
+import os
+import time
+from dataclasses import dataclass
+
+from fastapi import Depends, HTTPException, Request, Response, status
+
+from .auth import Principal, get_current_user
+from .cache import CACHE_PREFIX, offload, shared_client
+from .metrics import Counter
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") not in ("0", "false", "no")
+# "auto" shares buckets through Redis when CACHE_URL is set, "memory" keeps them per process
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "auto")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+DEFAULT_LIMITS = {
+    "login": "ip=30/60,username=10/60",
+    "signup": "ip=5/60",
+    "submissions": "ip=120/60,user=30/60,team=60/60",
+}
+KEY_KINDS = ("ip", "username", "user", "team")
+
+RATE_LIMITED = Counter("rate_limited_total", "Requests rejected with 429, by route and the bucket that ran dry.", ("route", "key"))
+
+
+@dataclass(frozen=True)
+class Limit:
+    key: str        # one of KEY_KINDS
+    capacity: int   # burst size
+    period: float   # seconds to refill `capacity` tokens
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+
+def parse_limits(spec: str) -> tuple:
+    """Parse "ip=30/60,user=10/60" into Limits."""
+    limits = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        try:
+            key, rule = part.split("=")
+            capacity, period = rule.split("/")
+            limit = Limit(key.strip(), int(capacity), float(period))
+        except ValueError:
+            raise ValueError(f"Bad rate limit {part!r}, expected e.g. ip=30/60")
+        if limit.key not in KEY_KINDS or limit.capacity < 1 or limit.period <= 0:
+            raise ValueError(f"Bad rate limit {part!r}: key is one of {', '.join(KEY_KINDS)}, N >= 1, S > 0")
+        limits.append(limit)
+    return tuple(limits)
+
+
+def route_limits(route: str) -> tuple:
+    return parse_limits(os.getenv(f"RATE_LIMIT_{route.upper()}", DEFAULT_LIMITS.get(route, "")))
+
+
+class MemoryBuckets:
+    """Buckets in a dict: key -> (tokens, updated, full_at).
+
+    Only touched from the event loop thread (limits are checked in async
+    dependencies and handlers), so it takes no lock. A bucket past `full_at` has
+    refilled and carries no state; those are swept once the dict grows past
+    `max_keys`, and the next sweep waits until it has doubled, which keeps the
+    cost amortized O(1) per request.
+    """
+
+    remote = False
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._sweep_at = max_keys
+
+    def take(self, keys, limits, now: float):
+        """Take a token from every bucket if each has one. Returns (allowed, tokens left per bucket)."""
+        buckets = self._buckets
+        levels = []
+        for key, limit in zip(keys, limits):
+            state = buckets.get(key)
+            if state is None:
+                levels.append(float(limit.capacity))
+            else:
+                tokens, updated, _ = state
+                levels.append(min(limit.capacity, tokens + max(0.0, now - updated) * limit.rate))
+        allowed = all(level >= 1 for level in levels)
+        if allowed:
+            levels = [level - 1 for level in levels]
+        for key, level, limit in zip(keys, levels, limits):
+            buckets[key] = (level, now, now + (limit.capacity - level) / limit.rate)
+        if len(buckets) > self._sweep_at:
+            self._buckets = {k: v for k, v in buckets.items() if v[2] > now}
+            self._sweep_at = max(self.max_keys, 2 * len(self._buckets))
+        return allowed, levels
+
+    def clear(self):
+        self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# KEYS: bucket keys; ARGV: now, then capacity and rate for each key.
+# Same algorithm as MemoryBuckets.take, atomically across every worker.
+_TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local levels = {}
+local allowed = 1
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = tonumber(ARGV[2 * i + 1])
+    local state = redis.call('HMGET', key, 't', 'u')
+    local level = capacity
+    if state[1] then
+        level = math.min(capacity, tonumber(state[1]) + math.max(0, now - tonumber(state[2])) * rate)
+    end
+    levels[i] = level
+    if level < 1 then allowed = 0 end
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[2 * i])
+    local rate = tonumber(ARGV[2 * i + 1])
+    levels[i] = levels[i] - allowed
+    redis.call('HSET', key, 't', tostring(levels[i]), 'u', ARGV[1])
+    -- expire once full again: the bucket then carries no state
+    redis.call('PEXPIRE', key, math.ceil((capacity - levels[i]) / rate * 1000) + 1000)
+    levels[i] = tostring(levels[i])
+end
+return {allowed, levels}
+"""
+
+
+class RedisBuckets:
+    """Buckets shared by every worker, as hashes under `<prefix>:ratelimit:`.
+
+    The clock is the caller's wall clock: keep the API hosts NTP-synced (a skew of
+    a few milliseconds only shifts refills by as much).
+    """
+
+    remote = True
+
+    def __init__(self, client, prefix: str = CACHE_PREFIX):
+        self.client = client
+        self._ns = f"{prefix}:ratelimit:"
+        self._take = client.register_script(_TAKE_SCRIPT)
+
+    def take(self, keys, limits, now: float):
+        args = [repr(now)]
+        for limit in limits:
+            args += [limit.capacity, repr(limit.rate)]
+        allowed, levels = self._take(keys=[self._ns + k for k in keys], args=args)
+        return bool(allowed), [float(level) for level in levels]
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self._ns + "*"):
+            self.client.delete(key)
+
+
+def make_buckets(client):
+    if client is None or RATE_LIMIT_STORE == "memory":
+        return MemoryBuckets()
+    return RedisBuckets(client)
+
+
+class RateLimiter:
+    def __init__(self, buckets, enabled: bool = RATE_LIMIT_ENABLED, clock=time.time):
+        self.buckets = buckets
+        self.enabled = enabled
+        self.clock = clock
+        # Parsed up front so a bad RATE_LIMIT_* setting fails at startup
+        self._limits = {route: route_limits(route) for route in DEFAULT_LIMITS}
+
+    def limits(self, route: str) -> tuple:
+        limits = self._limits.get(route)
+        if limits is None:
+            limits = self._limits[route] = route_limits(route)
+        return limits
+
+    def check(self, route: str, request: Request, response: Response = None, **ids):
+        """Take a token for `route` from each of its buckets or raise 429.
+
+        `ids` supplies the non-IP keys (username=, user=, team=); a limit whose key
+        is missing or None is skipped, e.g. the team limit for a user without one.
+        On success the X-RateLimit-* headers of the tightest bucket go on `response`.
+        """
+        if not self.enabled:
+            return
+        limits, keys = [], []
+        for limit in self.limits(route):
+            value = request.client.host if limit.key == "ip" and request.client else ids.get(limit.key)
+            if value is not None:
+                limits.append(limit)
+                keys.append(f"{route}:{limit.key}:{value}")
+        if not limits:
+            return
+        allowed, levels = self.buckets.take(keys, limits, self.clock())
+        # The tightest bucket: the one that runs dry (or ran dry) first
+        level, limit = min(zip(levels, limits), key=lambda pair: pair[0] / pair[1].capacity)
+        remaining = max(0, math.floor(level))
+        headers = {
+            "X-RateLimit-Limit": str(limit.capacity),
+            "X-RateLimit-Remaining": str(remaining),
+            # seconds until the bucket is full again
+            "X-RateLimit-Reset": str(math.ceil((limit.capacity - level) / limit.rate)),
+        }
+        if not allowed:
+            dry = [(l, lv) for l, lv in zip(limits, levels) if lv < 1]
+            wait = max((1 - lv) / l.rate for l, lv in dry)
+            for l, _ in dry:
+                RATE_LIMITED.inc(route, l.key)
+            headers["Retry-After"] = str(max(1, math.ceil(wait)))
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Rate limit exceeded, retry later", headers=headers)
+        if response is not None:
+            response.headers.update(headers)
+
+
+limiter = RateLimiter(make_buckets(shared_client))
+
+
+def rate_limit(route: str):
+    """Dependency limiting `route` by client IP."""
+    async def dependency(request: Request, response: Response):
+        await offload(limiter.buckets, limiter.check, route, request, response)
+    return dependency
+
+
+def rate_limit_user(route: str):
+    """Dependency limiting `route` by client IP, authenticated user and their team."""
+    async def dependency(request: Request, response: Response, user: Principal = Depends(get_current_user)):
+        await offload(limiter.buckets, limiter.check, route, request, response, user=user.id, team=user.team_id)
+    return dependency
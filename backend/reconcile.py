@@ -0,0 +1,34 @@
+"""Recompute team aggregates from the submissions table.
+
+    python -m backend.reconcile            # report drift only
+    python -m backend.reconcile --repair   # report and fix it
+    python -m backend.reconcile --weekly   # also rebuild weekly_scores from submissions
+
+Running API processes keep their in-memory leaderboard until restarted or until
+POST /admin/reconcile?repair=true is called on them.
+"""
+import argparse
+import asyncio
+import json
+
+from . import crud
+from .database import run_in_session
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repair", action="store_true", help="rewrite drifted aggregates")
+    parser.add_argument("--weekly", action="store_true", help="rebuild the weekly_scores table")
+    args = parser.parse_args(argv)
+    if args.weekly:
+        rows = asyncio.run(run_in_session(crud.rebuild_weekly_scores))
+        print(f"weekly_scores rebuilt: {rows} row(s)")
+    drift = asyncio.run(run_in_session(crud.reconcile_team_aggregates, args.repair))
+    for d in drift:
+        print(json.dumps(d))
+    print(f"{len(drift)} team(s) drifted" + (", repaired" if args.repair and drift else ""))
+    return 1 if drift and not args.repair else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Literal, Optional, List
 from datetime import datetime
 
 class SignUpIn(BaseModel):
@@ -34,6 +34,16 @@ class TeamOut(BaseModel):
     class Config:
         from_attributes = True
 
+class TeamBulkIn(BaseModel):
+    action: Literal["ban", "unban", "delete"]
+    team_ids: List[int] = Field(min_length=1, max_length=10_000)
+
+class TeamBulkOut(BaseModel):
+    ok: bool
+    action: str
+    affected: int
+    not_found: List[int]
+
 class TeamUpdate(BaseModel):
     name: Optional[str] = None
     member1: Optional[str] = None
@@ -41,7 +51,7 @@ class TeamUpdate(BaseModel):
     member3: Optional[str] = None
 
 class SubmissionIn(BaseModel):
-    score: float
+    score: float = Field(allow_inf_nan=False)
     week: Optional[str] = None
 
 class SubmissionOut(BaseModel):
@@ -64,3 +74,19 @@ class AnnouncementOut(BaseModel):
     created_at: datetime
     class Config:
         from_attributes = True
+
+class SubmissionBatchRow(BaseModel):
+    team_id: int
+    score: float = Field(allow_inf_nan=False)
+    week: Optional[str] = None
+
+class SubmissionBatchResult(BaseModel):
+    row: int
+    ok: bool
+    team_id: Optional[int] = None
+    detail: Optional[str] = None
+
+class SubmissionBatchOut(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[SubmissionBatchResult]
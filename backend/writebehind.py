@@ -0,0 +1,153 @@
+"""Write-behind queue for POST /submissions with group commit.
+
+In the default `direct` mode every submission commits (and fsyncs) on its own,
+so on SQLite writers queue up on the database lock. With SUBMIT_MODE set to
+
+    flush    the handler enqueues the row and answers once its group commit is
+             durable, with the stored row (or the usual 403/404)
+    enqueue  the handler answers 202 as soon as the row is queued; rows lost to a
+             crash before the next flush, or rejected at flush time (team banned
+             or deleted meanwhile), are only visible in the logs and metrics
+
+a background task takes everything queued, up to SUBMIT_FLUSH_ROWS rows or
+SUBMIT_FLUSH_MS after the first one, and writes it in one transaction. While a
+flush commits, the next group collects. The queue holds at most SUBMIT_QUEUE_MAX
+rows; beyond that submitters get a 503 with Retry-After, like the hash pool.
+On shutdown new rows are refused and everything queued is flushed first.
+"""
+import asyncio
+import logging
+import os
+from time import perf_counter
+
+from fastapi import HTTPException, status
+
+from .metrics import Counter, Gauge, Histogram, QUERY_BUCKETS
+
+SUBMIT_MODE = os.getenv("SUBMIT_MODE", "direct")
+SUBMIT_FLUSH_MS = float(os.getenv("SUBMIT_FLUSH_MS", "10"))
+SUBMIT_FLUSH_ROWS = int(os.getenv("SUBMIT_FLUSH_ROWS", "500"))
+SUBMIT_QUEUE_MAX = int(os.getenv("SUBMIT_QUEUE_MAX", "10000"))
+SUBMIT_RETRY_AFTER = os.getenv("SUBMIT_RETRY_AFTER", "1")
+
+if SUBMIT_MODE not in ("direct", "flush", "enqueue"):
+    raise ValueError(f"SUBMIT_MODE must be direct, flush or enqueue, not {SUBMIT_MODE!r}")
+
+log = logging.getLogger(__name__)
+
+FLUSH_SECONDS = Histogram("submission_flush_duration_seconds", "Time to write and commit one group of queued submissions.", (), QUERY_BUCKETS)
+FLUSH_ROWS = Histogram("submission_flush_rows", "Submissions per group commit.", (), (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000))
+QUEUED_SECONDS = Histogram("submission_queued_seconds", "Time from enqueue until the submission's group is committed.", (), QUERY_BUCKETS)
+FLUSHED = Counter("submissions_flushed_total", "Queued submissions by outcome (stored, rejected, failed).", ("outcome",))
+
+
+class SubmissionQueue:
+    """Bounded queue of submission rows flushed by `commit(rows)` in groups.
+
+    `commit` receives [(index, row)] and returns one result dict per row, in order,
+    as crud.ingest_submissions does. Only used from the event loop thread.
+    """
+
+    def __init__(self, commit, mode: str = SUBMIT_MODE, maxsize: int = SUBMIT_QUEUE_MAX,
+                 flush_rows: int = SUBMIT_FLUSH_ROWS, flush_ms: float = SUBMIT_FLUSH_MS):
+        self.commit = commit
+        self.mode = mode
+        self.maxsize = maxsize
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_ms / 1000
+        self._queue = None
+        self._task = None
+        self._full = None
+        self._closing = False
+        Gauge("submission_queue_depth", "Submissions waiting for the next group commit.", collect=lambda: [((), self.depth)])
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "direct"
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        if not self.enabled:
+            return
+        self._queue = asyncio.Queue(self.maxsize)
+        self._full = asyncio.Event()
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Refuse new rows and flush everything already queued."""
+        if self._task is None:
+            return
+        self._closing = True
+        self._full.set()
+        await self._task
+        self._task = None
+
+    def submit(self, row):
+        """Queue `row`; returns a future for its result in flush mode, None in enqueue mode."""
+        if self._task is None or self._closing:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Server is shutting down", headers={"Retry-After": SUBMIT_RETRY_AFTER})
+        future = asyncio.get_running_loop().create_future() if self.mode == "flush" else None
+        try:
+            self._queue.put_nowait((row, future, perf_counter()))
+        except asyncio.QueueFull:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many pending submissions, retry shortly",
+                headers={"Retry-After": SUBMIT_RETRY_AFTER},
+            )
+        if self._queue.qsize() >= self.flush_rows:
+            self._full.set()
+        return future
+
+    async def _run(self):
+        queue = self._queue
+        while not (self._closing and queue.empty()):
+            if queue.empty():
+                # Woken by the first row of the next group, or by stop()
+                self._full.clear()
+                getter = asyncio.ensure_future(queue.get())
+                closing = asyncio.ensure_future(self._full.wait())
+                await asyncio.wait((getter, closing), return_when=asyncio.FIRST_COMPLETED)
+                closing.cancel()
+                if not getter.done():
+                    getter.cancel()
+                    continue
+                batch = [getter.result()]
+            else:
+                batch = [queue.get_nowait()]
+            if queue.qsize() < self.flush_rows - 1 and not self._closing:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.flush_seconds)
+                except asyncio.TimeoutError:
+                    pass
+            while len(batch) < self.flush_rows and not queue.empty():
+                batch.append(queue.get_nowait())
+            await self._flush(batch)
+
+    async def _flush(self, batch):
+        started = perf_counter()
+        try:
+            results = await self.commit([(index, row) for index, (row, _, _) in enumerate(batch)])
+        except Exception as exc:
+            log.exception("group commit of %d submissions failed", len(batch))
+            FLUSHED.inc("failed", amount=len(batch))
+            for _, future, _ in batch:
+                if future is not None and not future.done():
+                    future.set_exception(exc)
+            return
+        done = perf_counter()
+        FLUSH_SECONDS.observe(done - started)
+        FLUSH_ROWS.observe(len(batch))
+        for (row, future, queued), result in zip(batch, results):
+            QUEUED_SECONDS.observe(done - queued)
+            FLUSHED.inc("stored" if result["ok"] else "rejected")
+            if future is None:
+                if not result["ok"]:
+                    log.warning("queued submission for team %s rejected: %s", row.team_id, result["detail"])
+            elif not future.done():  # the submitter may have disconnected
+                future.set_result(result)
@@ -1,12 +1,17 @@
 import streamlit as st
-from utils import leaderboard, submit_score, get_my_team, me
+from utils import leaderboard, submit_score, get_my_team, me, fetch_concurrently
 
 st.set_page_config(page_title="Leaderboard & Submit", page_icon="🏅")
 st.title("🏅 Leaderboard")
 
+calls = {"leaderboard": leaderboard}
+if st.session_state.get("token"):
+    calls["me"] = me
+pending = fetch_concurrently(**calls)
+
 # Table
 try:
-    data = leaderboard()
+    data = pending["leaderboard"].result()
     if data:
         st.dataframe(
             [
@@ -33,10 +38,11 @@ if not st.session_state.get("token"):
     st.stop()
 
 try:
-    info = me()
+    info = pending["me"].result()
     if not info.get("team_id"):
         st.warning("Create a team first (Team Profile page).")
         st.stop()
+    # Only asked once /auth/me shows a team: without one it is a 404
     team = get_my_team()
     if team["banned"]:
         st.error("Your team is banned; submissions disabled.")
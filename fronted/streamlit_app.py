@@ -1,5 +1,5 @@
 import streamlit as st
-from utils import signup, login, me, public_teams, announcements
+from utils import signup, login, me, public_teams, announcements, fetch_concurrently
 
 st.set_page_config(page_title="ML League", page_icon="🏆", layout="wide")
 
@@ -10,10 +10,16 @@ if "is_admin" not in st.session_state:
 
 st.title("🏆 ML League Portal")
 
+# Independent reads go out together instead of one after another
+calls = {"announcements": announcements, "teams": public_teams}
+if st.session_state.token:
+    calls["me"] = me
+pending = fetch_concurrently(**calls)
+
 with st.sidebar:
     st.header("Account")
     if st.session_state.token:
-        info = me()
+        info = pending["me"].result()
         st.success(f"Logged in: {info['username']}" + (" (Admin)" if info["is_admin"] else ""))
         if st.button("Log out"):
             st.session_state.token = None
@@ -46,7 +52,7 @@ with st.sidebar:
 
 st.subheader("📣 Weekly Tasks & Announcements")
 try:
-    anns = announcements()
+    anns = pending["announcements"].result()
     if len(anns) == 0:
         st.info("No announcements yet.")
     for a in anns:
@@ -58,7 +64,7 @@ except Exception as e:
 
 st.subheader("👥 Public Teams")
 try:
-    teams = public_teams()
+    teams = pending["teams"].result()
     st.dataframe(
         [{"Team": t["name"], "Member 1": t["member1"], "Member 2": t["member2"], "Member 3": t["member3"]} for t in teams],
         use_container_width=True
@@ -1,83 +1,161 @@
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import streamlit as st
+from requests.adapters import HTTPAdapter
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from urllib3.util.retry import Retry
 
 API_BASE = os.getenv("API_BASE_URL") or st.secrets.get("API_BASE_URL") or "http://localhost:8000"
+TIMEOUT = (3.05, float(os.getenv("API_TIMEOUT", "15")))  # (connect, read) seconds
+PUBLIC_TTL = float(os.getenv("API_PUBLIC_TTL", "2"))
+PRIVATE_TTL = float(os.getenv("API_PRIVATE_TTL", "10"))
+CACHE_MAX_ENTRIES = int(os.getenv("API_CACHE_MAX_ENTRIES", "512"))
+
+@st.cache_resource
+def _session():
+    # One keep-alive connection pool shared by every Streamlit session in this process
+    retry = Retry(total=3, backoff_factor=0.3, status_forcelist=(502, 503, 504), allowed_methods=("GET",))
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=retry)
+    s = requests.Session()
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+# GET responses keyed by (token, path, params); public data is shared, token=None.
+# Entries are reused for their TTL, then revalidated with If-None-Match. Least
+# recently used first out past CACHE_MAX_ENTRIES: every login brings a new token,
+# and every page or search of a list a new key.
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+# Bumped by every write: a GET that was in flight across one is not cached, or the
+# pre-write state (e.g. /auth/me without a team_id) would be served for its TTL
+_generation = 0
 
 def _headers():
     token = st.session_state.get("token")
     return {"Authorization": f"Bearer {token}"} if token else {}
 
-def signup(username, password):
-    r = requests.post(f"{API_BASE}/auth/signup", json={"username": username, "password": password})
+def _invalidate():
+    # After our own writes, drop everything so the rerun shows fresh data
+    global _generation
+    with _cache_lock:
+        _cache.clear()
+        _generation += 1
+
+def _get(path, params=None, private=False):
+    """Cached GET returning (json, response headers)."""
+    token = st.session_state.get("token") if private else None
+    key = (token, path, tuple(sorted((params or {}).items())))
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached:
+            _cache.move_to_end(key)
+        generation = _generation
+    if cached and cached["expires"] > time.monotonic():
+        return cached["data"], cached["headers"]
+    headers = _headers() if private else {}
+    if cached and cached["headers"].get("ETag"):
+        headers["If-None-Match"] = cached["headers"]["ETag"]
+    r = _session().get(f"{API_BASE}{path}", params=params, headers=headers, timeout=TIMEOUT)
+    if r.status_code == 304 and cached:
+        data, resp_headers = cached["data"], cached["headers"]
+    else:
+        r.raise_for_status()
+        data, resp_headers = r.json(), dict(r.headers)
+    with _cache_lock:
+        if _generation != generation:
+            return data, resp_headers
+        _cache[key] = {
+            "expires": time.monotonic() + (PRIVATE_TTL if private else PUBLIC_TTL),
+            "data": data,
+            "headers": resp_headers,
+        }
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return data, resp_headers
+
+def _send(method, path, **kwargs):
+    r = _session().request(method, f"{API_BASE}{path}", headers=_headers(), timeout=TIMEOUT, **kwargs)
     r.raise_for_status()
+    _invalidate()
     return r.json()
 
+def _get_all_pages(path, page_size=1000):
+    # List endpoints are keyset-paginated; follow X-Next-Cursor until the last page
+    items, params = [], {"limit": page_size}
+    while True:
+        data, headers = _get(path, params)
+        items.extend(data)
+        cursor = headers.get("X-Next-Cursor")
+        if not cursor:
+            return items
+        params = {**params, "cursor": cursor}
+
+_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="api")
+
+def fetch_concurrently(**calls):
+    """Start independent API calls in parallel; returns {name: Future}.
+
+    `.result()` on a future returns the value or re-raises the call's exception, so
+    pages can keep their per-section error handling.
+    """
+    ctx = get_script_run_ctx()
+
+    def bind(fn):
+        def run():
+            # Give the worker thread the page's script context so st.session_state works
+            add_script_run_ctx(threading.current_thread(), ctx)
+            return fn()
+        return run
+    return {name: _pool.submit(bind(fn)) for name, fn in calls.items()}
+
+def signup(username, password):
+    return _send("POST", "/auth/signup", json={"username": username, "password": password})
+
 def login(username, password):
-    r = requests.post(f"{API_BASE}/auth/login", json={"username": username, "password": password})
-    r.raise_for_status()
-    return r.json()
+    return _send("POST", "/auth/login", json={"username": username, "password": password})
 
 def me():
-    r = requests.get(f"{API_BASE}/auth/me", headers=_headers())
-    r.raise_for_status()
-    return r.json()
+    return _get("/auth/me", private=True)[0]
 
 def create_team(name, m1, m2, m3):
-    r = requests.post(f"{API_BASE}/teams/create", json={"name": name, "member1": m1, "member2": m2, "member3": m3}, headers=_headers())
-    r.raise_for_status()
-    return r.json()
+    return _send("POST", "/teams/create", json={"name": name, "member1": m1, "member2": m2, "member3": m3})
 
 def get_my_team():
-    r = requests.get(f"{API_BASE}/teams/me", headers=_headers())
-    r.raise_for_status()
-    return r.json()
+    return _get("/teams/me", private=True)[0]
 
 def update_my_team(**kwargs):
-    r = requests.put(f"{API_BASE}/teams/me", json=kwargs, headers=_headers())
-    r.raise_for_status()
-    return r.json()
+    return _send("PUT", "/teams/me", json=kwargs)
 
 def public_teams():
-    r = requests.get(f"{API_BASE}/teams/public")
-    r.raise_for_status()
-    return r.json()
+    return _get_all_pages("/teams/public")
 
 def leaderboard():
-    r = requests.get(f"{API_BASE}/leaderboard")
-    r.raise_for_status()
-    return r.json()
+    return _get("/leaderboard")[0]
 
 def submit_score(score, week=None):
     payload = {"score": float(score)}
     if week:
         payload["week"] = week
-    r = requests.post(f"{API_BASE}/submissions", json=payload, headers=_headers())
-    r.raise_for_status()
-    return r.json()
+    return _send("POST", "/submissions", json=payload)
 
 def announcements():
-    r = requests.get(f"{API_BASE}/announcements")
-    r.raise_for_status()
-    return r.json()
+    return _get_all_pages("/announcements")
 
 def post_announcement(title, body):
-    r = requests.post(f"{API_BASE}/announcements", json={"title": title, "body": body}, headers=_headers())
-    r.raise_for_status()
-    return r.json()
+    return _send("POST", "/announcements", json={"title": title, "body": body})
 
 def delete_announcement(ann_id):
-    r = requests.delete(f"{API_BASE}/announcements/{ann_id}", headers=_headers())
-    r.raise_for_status()
-    return r.json()
+    return _send("DELETE", f"/announcements/{ann_id}")
 
 def admin_ban(team_id, unban=False):
     path = "unban" if unban else "ban"
-    r = requests.post(f"{API_BASE}/admin/teams/{team_id}/{path}", headers=_headers())
-    r.raise_for_status()
-    return r.json()
+    return _send("POST", f"/admin/teams/{team_id}/{path}")
 
 def admin_delete_team(team_id):
-    r = requests.delete(f"{API_BASE}/admin/teams/{team_id}", headers=_headers())
-    r.raise_for_status()
-    return r.json()
+    return _send("DELETE", f"/admin/teams/{team_id}")
@@ -0,0 +1,76 @@
+"""Shared fixtures: one API app on a temporary SQLite database for the whole run.
+
+backend.database and backend.main read their settings at import time, so the
+environment is set here, before any test module imports them.
+"""
+import itertools
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="ml-league-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'app.db')}"
+os.environ["MIGRATE_ON_STARTUP"] = "1"
+os.environ["ADMIN_USERNAME"] = "admin"
+os.environ["ADMIN_PASSWORD"] = "adminpw"
+os.environ["HASH_WORKERS"] = "0"
+os.environ["BCRYPT_ROUNDS"] = "4"
+# API tests make many requests from one client; test_ratelimit builds its own limiters
+os.environ["RATE_LIMIT_ENABLED"] = "0"
+os.environ.pop("CACHE_URL", None)
+
+import pytest
+from fastapi.testclient import TestClient
+
+_names = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from backend import main
+    with TestClient(main.app) as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+def login(client):
+    """Sign up (or with signup=False, log in) `username`; returns auth headers."""
+    def post(username, password="secret1", signup=True) -> dict:
+        r = client.post("/auth/signup" if signup else "/auth/login", json={"username": username, "password": password})
+        assert r.status_code == 200, r.text
+        return {"Authorization": "Bearer " + r.json()["access_token"]}
+    return post
+
+
+@pytest.fixture(scope="session")
+def admin(login):
+    return login("admin", "adminpw", signup=False)
+
+
+@pytest.fixture
+def make_team(client, login):
+    """Sign up a fresh user with a team of their own; returns (headers, team)."""
+    def make():
+        n = next(_names)
+        headers = login(f"user-{n}")
+        r = client.post("/teams/create", json={"name": f"team-{n}", "member1": "a", "member2": "b", "member3": "c"}, headers=headers)
+        assert r.status_code == 200, r.text
+        return headers, r.json()
+    return make
+
+
+@pytest.fixture
+def submit(client):
+    def post(headers, score, week=None):
+        r = client.post("/submissions", json={"score": score, "week": week}, headers=headers)
+        assert r.status_code == 200, r.text
+        return r.json()
+    return post
+
+
+@pytest.fixture
+def signup(login):
+    """Sign up a fresh user without a team; returns (username, headers)."""
+    def make():
+        username = f"user-{next(_names)}"
+        return username, login(username)
+    return make
@@ -0,0 +1,81 @@
+"""The API in async database mode (an async driver in DATABASE_URL).
+
+backend.database picks the mode at import time, so the app runs in a child
+interpreter on its own sqlite+aiosqlite database.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = r"""
+import json
+from fastapi.testclient import TestClient
+from backend import database, main
+
+out = {"async_mode": database.ASYNC_MODE, "sync_sessions": database.SessionLocal is not None}
+with TestClient(main.app) as client:
+    def login(username, signup=True):
+        r = client.post("/auth/signup" if signup else "/auth/login", json={"username": username, "password": "secret1"})
+        assert r.status_code == 200, r.text
+        return {"Authorization": "Bearer " + r.json()["access_token"]}
+
+    admin = {"Authorization": "Bearer " + client.post("/auth/login", json={"username": "admin", "password": "adminpw"}).json()["access_token"]}
+    teams = []
+    for i, scores in enumerate([(5.0, 7.0), (20.0,), (1.0, 2.0, 3.0)]):
+        headers = login(f"async-{i}")
+        team = client.post("/teams/create", json={"name": f"async-{i}", "member1": "a", "member2": "b", "member3": "c"}, headers=headers).json()
+        for score in scores:
+            r = client.post("/submissions", json={"score": score, "week": "2031-W01"}, headers=headers)
+            assert r.status_code == 200, r.text
+        teams.append((team["id"], headers))
+    out["me"] = client.get("/teams/me", headers=teams[0][1]).json()
+    out["relogin"] = client.post("/auth/login", json={"username": "async-0", "password": "secret1"}).status_code
+    out["leaderboard"] = client.get("/leaderboard").json()
+    out["week"] = client.get("/leaderboard", params={"week": "2031-W01"}).json()
+    out["public"] = client.get("/teams/public", params={"fields": "id,name"}).json()
+    out["batch"] = client.post("/submissions/batch", json=[{"team_id": teams[2][0], "score": 10.0}, {"team_id": 999999, "score": 1.0}], headers=admin).json()
+    out["ban"] = client.post(f"/admin/teams/{teams[1][0]}/ban", headers=admin).status_code
+    out["banned_submit"] = client.post("/submissions", json={"score": 1.0}, headers=teams[1][1]).status_code
+    out["after_ban"] = client.get("/leaderboard").json()
+    out["drift"] = client.post("/admin/reconcile", headers=admin).json()["drifted"]
+print(json.dumps(out))
+"""
+
+
+@pytest.fixture(scope="module")
+def run(tmp_path_factory):
+    path = tmp_path_factory.mktemp("async") / "app.db"
+    env = {**os.environ, "DATABASE_URL": f"sqlite+aiosqlite:///{path}"}
+    out = subprocess.run([sys.executable, "-c", SCRIPT], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120)
+    assert out.returncode == 0, out.stderr
+    return json.loads(out.stdout.splitlines()[-1])
+
+
+def test_runs_on_async_sessions_only(run):
+    assert run["async_mode"] is True
+    assert run["sync_sessions"] is False  # no sync sessionmaker to fall back on
+
+
+def test_reads_and_writes(run):
+    assert run["me"]["name"] == "async-0"
+    assert run["me"]["total_score"] == 12.0
+    assert run["relogin"] == 200
+    assert [(r["team_name"], r["total_score"]) for r in run["leaderboard"]] == [("async-1", 20.0), ("async-0", 12.0), ("async-2", 6.0)]
+    assert [(r["team_name"], r["total"], r["best"]) for r in run["week"]] == [("async-1", 20.0, 20.0), ("async-0", 12.0, 7.0), ("async-2", 6.0, 3.0)]
+    assert sorted(r["name"] for r in run["public"]) == ["async-0", "async-1", "async-2"]
+    assert set(run["public"][0]) == {"id", "name"}
+
+
+def test_batches_bans_and_reconcile(run):
+    assert run["batch"]["accepted"] == 1 and run["batch"]["rejected"] == 1
+    assert run["ban"] == 200
+    assert run["banned_submit"] == 403
+    assert [(r["team_name"], r["total_score"]) for r in run["after_ban"]] == [("async-2", 16.0), ("async-0", 12.0)]
+    assert run["drift"] == 0
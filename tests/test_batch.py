@@ -0,0 +1,51 @@
+import json
+
+from backend import main
+
+
+def test_mixed_batch_is_applied_in_one_go(client, admin, make_team):
+    (_, a), (_, b), (_, banned) = make_team(), make_team(), make_team()
+    client.post(f"/admin/teams/{banned['id']}/ban", headers=admin)
+    rows = [
+        {"team_id": a["id"], "score": 1.5, "week": "2032-W01"},
+        {"team_id": b["id"], "score": "not a number"},
+        {"team_id": a["id"], "score": 2.5, "week": "2032-W01"},
+        {"team_id": 10**9, "score": 1.0},
+        {"team_id": banned["id"], "score": 1.0},
+        {"team_id": b["id"], "score": 4.0},
+    ]
+    r = client.post("/submissions/batch", json=rows, headers=admin)
+    assert r.status_code == 200, r.text
+    out = r.json()
+    assert (out["accepted"], out["rejected"]) == (3, 3)
+    assert [x["row"] for x in out["results"]] == list(range(6))
+    assert [x["ok"] for x in out["results"]] == [True, False, True, False, False, True]
+    assert out["results"][3]["detail"] == "Team not found"
+    assert out["results"][4]["detail"] == "Team is banned"
+
+    ranked = {row["team_id"]: row for row in client.get("/leaderboard").json()}
+    assert (ranked[a["id"]]["submission_count"], ranked[a["id"]]["total_score"]) == (2, 4.0)
+    assert (ranked[b["id"]]["submission_count"], ranked[b["id"]]["total_score"]) == (1, 4.0)
+    week = {row["team_id"]: row for row in client.get("/leaderboard", params={"week": "2032-W01"}).json()}
+    assert (week[a["id"]]["total"], week[a["id"]]["best"], week[a["id"]]["submission_count"]) == (4.0, 2.5, 2)
+    assert b["id"] not in week
+
+
+def test_ndjson_body(client, admin, make_team):
+    _, team = make_team()
+    body = "\n".join(json.dumps({"team_id": team["id"], "score": s}) for s in (1, 2, 3)) + "\n\n"
+    r = client.post("/submissions/batch", content=body, headers={**admin, "Content-Type": "application/x-ndjson"})
+    assert r.json()["accepted"] == 3
+    assert client.get(f"/leaderboard/rank/{team['id']}").json()["total_score"] == 6.0
+
+
+def test_rejects_bad_bodies_and_non_admins(client, admin, make_team, monkeypatch):
+    headers, team = make_team()
+    assert client.post("/submissions/batch", json=[], headers=headers).status_code == 403
+    bad = client.post("/submissions/batch", content=b"[{", headers={**admin, "Content-Type": "application/json"})
+    assert bad.status_code == 400
+    assert client.post("/submissions/batch", json={"team_id": team["id"]}, headers=admin).status_code == 400
+    monkeypatch.setattr(main, "SUBMISSION_BATCH_MAX", 2)
+    rows = [{"team_id": team["id"], "score": 1.0}] * 3
+    assert client.post("/submissions/batch", json=rows, headers=admin).status_code == 413
+    assert client.get(f"/leaderboard/rank/{team['id']}").json()["submission_count"] == 0
@@ -0,0 +1,57 @@
+from backend import main, models
+from backend.database import SessionLocal
+
+UNKNOWN = 10 ** 9
+
+
+def bulk(client, admin, action, team_ids):
+    r = client.post("/admin/teams/bulk", json={"action": action, "team_ids": team_ids}, headers=admin)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def ranked(team_ids):
+    return {e["team_id"]: e["total_score"] for e in main.board.page() if e["team_id"] in team_ids}
+
+
+def test_ban_and_unban(client, admin, make_team, submit):
+    teams = [make_team() for _ in range(3)]
+    for i, (headers, _) in enumerate(teams):
+        submit(headers, i + 1.0)
+    a, b, c = (team["id"] for _, team in teams)
+
+    assert bulk(client, admin, "ban", [a, b, b, UNKNOWN]) == {"ok": True, "action": "ban", "affected": 2, "not_found": [UNKNOWN]}
+    assert ranked({a, b, c}) == {c: 3.0}
+    # Members' cached principals were dropped along with the ban
+    assert client.post("/submissions", json={"score": 1.0}, headers=teams[0][0]).status_code == 403
+
+    assert bulk(client, admin, "unban", [a, b])["affected"] == 2
+    assert ranked({a, b, c}) == {a: 1.0, b: 2.0, c: 3.0}
+    assert submit(teams[0][0], 1.0)["team_id"] == a
+
+
+def test_delete_removes_rows_and_frees_members(client, admin, make_team, submit):
+    (kept_headers, kept), (headers, gone) = make_team(), make_team()
+    submit(kept_headers, 5.0, "2035-W01")
+    submit(headers, 4.0, "2035-W01")
+
+    out = bulk(client, admin, "delete", [gone["id"], UNKNOWN])
+    assert (out["affected"], out["not_found"]) == (1, [UNKNOWN])
+    assert ranked({kept["id"], gone["id"]}) == {kept["id"]: 5.0}
+    with SessionLocal() as db:
+        assert db.get(models.Team, gone["id"]) is None
+        assert db.query(models.Submission).filter_by(team_id=gone["id"]).count() == 0
+        assert db.query(models.WeeklyScore).filter_by(team_id=gone["id"]).count() == 0
+        assert db.query(models.WeeklyScore).filter_by(team_id=kept["id"]).count() == 1
+    # The former member has no team and can create another
+    assert client.get("/teams/me", headers=headers).status_code == 404
+    assert client.get("/teams/me", headers=kept_headers).json()["id"] == kept["id"]
+    assert bulk(client, admin, "delete", [gone["id"]])["not_found"] == [gone["id"]]
+
+
+def test_validation_and_admins_only(client, admin, make_team):
+    headers, team = make_team()
+    assert client.post("/admin/teams/bulk", json={"action": "ban", "team_ids": [team["id"]]}, headers=headers).status_code == 403
+    assert client.post("/admin/teams/bulk", json={"action": "ban", "team_ids": []}, headers=admin).status_code == 422
+    assert client.post("/admin/teams/bulk", json={"action": "archive", "team_ids": [1]}, headers=admin).status_code == 422
+    assert client.delete(f"/admin/teams/{UNKNOWN}", headers=admin).status_code == 404
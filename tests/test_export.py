@@ -0,0 +1,106 @@
+import csv
+import io
+import asyncio
+import json
+from datetime import timedelta
+
+import pytest
+
+from backend import export, models
+from backend.database import SessionLocal, read_engine
+
+
+@pytest.fixture(scope="module")
+def exported(client, admin, login):
+    """Two teams with labelled and unlabelled submissions, one of them banned."""
+    ids = []
+    for name, scores in (("export-a", [(1.25, "2033-W01"), (2.5, None)]), ("export-b", [(3.0, "2033-W02")])):
+        headers = login(f"{name}-owner")
+        team = client.post("/teams/create", json={"name": name, "member1": "a,\"b\"", "member2": "ü", "member3": "c"}, headers=headers).json()
+        for score, week in scores:
+            client.post("/submissions", json={"score": score, "week": week}, headers=headers)
+        ids.append(team["id"])
+    client.post(f"/admin/teams/{ids[1]}/ban", headers=admin)
+    return ids
+
+
+def submissions(**where):
+    with SessionLocal() as db:
+        query = db.query(models.Submission).order_by(models.Submission.id)
+        return [(s.id, s.team_id, s.score, s.week) for s in query.filter_by(**where)]
+
+
+def get(client, admin, path, **params):
+    r = client.get(path, params=params, headers=admin)
+    assert r.status_code == 200, r.text
+    assert "attachment" in r.headers["content-disposition"]
+    return r
+
+
+def test_csv(client, admin, exported):
+    r = get(client, admin, "/admin/export/submissions", format="csv")
+    assert r.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(r.text)))
+    assert rows[0] == ["id", "team_id", "score", "week", "submitted_at"]
+    assert [(int(i), int(t), float(s), w or None) for i, t, s, w, _ in rows[1:]] == submissions()
+
+
+def test_ndjson_and_week(client, admin, exported):
+    r = get(client, admin, "/admin/export/submissions", format="ndjson", week="2033-W01")
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert [(x["id"], x["team_id"], x["score"], x["week"]) for x in rows] == submissions(week="2033-W01")
+    assert len(rows) == 1
+
+
+def test_parquet(client, admin, exported):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    table = parquet.read_table(io.BytesIO(get(client, admin, "/admin/export/submissions", format="parquet").content))
+    assert table.column_names == ["id", "team_id", "score", "week", "submitted_at"]
+    assert list(zip(*(table.column(c).to_pylist() for c in ("id", "team_id", "score", "week")))) == submissions()
+
+
+def test_teams_include_banned_ones(client, admin, exported):
+    rows = {int(r["id"]): r for r in csv.DictReader(io.StringIO(get(client, admin, "/admin/export/teams").text))}
+    a, b = rows[exported[0]], rows[exported[1]]
+    assert (a["name"], a["member1"], a["member2"], a["banned"]) == ("export-a", 'a,"b"', "ü", "False")
+    assert (b["banned"], float(b["total_score"])) == ("True", 3.0)
+    week = get(client, admin, "/admin/export/teams", format="ndjson", week="2033-W02").text.splitlines()
+    assert [json.loads(line)["id"] for line in week] == [exported[1]]
+
+
+def test_since_matches_the_stored_timestamps(client, admin, exported):
+    with SessionLocal() as db:
+        rows = db.query(models.Submission.id, models.Submission.submitted_at).order_by(models.Submission.id).all()
+    at = rows[-1].submitted_at  # naive UTC, whole seconds
+    expected = [i for i, when in rows if when >= at]
+
+    def ids(since):
+        return [json.loads(line)["id"] for line in get(client, admin, "/admin/export/submissions", format="ndjson", since=since).text.splitlines()]
+
+    assert ids(at.isoformat()) == expected
+    assert ids(at.isoformat() + "Z") == expected
+    assert ids((at + timedelta(hours=2)).isoformat() + "+02:00") == expected
+    assert ids((at + timedelta(seconds=1)).isoformat()) == []
+
+
+def test_admins_only(client, make_team, admin):
+    headers, _ = make_team()
+    assert client.get("/admin/export/submissions", headers=headers).status_code == 403
+    assert client.get("/admin/export/teams", params={"format": "xml"}, headers=admin).status_code == 422
+
+
+def test_partitions_page_by_id_without_holding_a_connection(exported):
+    async def read(stmt):
+        out = []
+        async for rows in export.partitions(stmt, chunk_rows=2):
+            assert len(rows) <= 2
+            assert read_engine.pool.checkedout() == 0
+            out.extend(rows)
+        return out
+
+    rows = asyncio.run(read(export.submissions_query()))
+    assert [(r.id, r.team_id, r.score, r.week) for r in rows] == submissions()
+    with SessionLocal() as db:
+        team_ids = [i for i, in db.query(models.Team.id).order_by(models.Team.id)]
+    assert [r.id for r in asyncio.run(read(export.teams_query()))] == team_ids
+    assert asyncio.run(read(export.submissions_query(week="no-such-week"))) == []
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from backend import auth, models
+from backend.database import SessionLocal
+
+
+def test_hashes_in_a_worker_process():
+    pool = auth.HashPool(workers=1, queue_depth=1)
+    try:
+        password_hash = asyncio.run(pool.run(auth.hash_password, "secret1"))
+    finally:
+        pool.shutdown()
+    assert auth.verify_password("secret1", password_hash)
+    assert not auth.verify_password("secret2", password_hash)
+
+
+def test_sheds_calls_beyond_workers_plus_queue():
+    pool = auth.HashPool(workers=0, queue_depth=1)  # threadpool, two calls admitted
+    release = threading.Event()
+
+    async def main():
+        busy = [asyncio.ensure_future(pool.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as exc:
+            await pool.run(auth.hash_password, "secret1")
+        release.set()
+        await asyncio.gather(*busy)
+        # Slots are given back once calls finish
+        return exc, await pool.run(auth.hash_password, "secret1")
+
+    exc, password_hash = asyncio.run(main())
+    assert auth.verify_password("secret1", password_hash)
+    assert exc.value.status_code == 503
+    assert exc.value.headers["Retry-After"] == auth.HASH_RETRY_AFTER
+
+
+def test_login_rehashes_outdated_hashes(client, signup):
+    username, _ = signup()
+    # Stored with a cost other than BCRYPT_ROUNDS (4 in the tests)
+    old = CryptContext(schemes=["bcrypt"], bcrypt__rounds=5).hash("secret1")
+    with SessionLocal() as db:
+        db.query(models.User).filter(models.User.username == username).update({"password_hash": old})
+        db.commit()
+    assert client.post("/auth/login", json={"username": username, "password": "wrong1"}).status_code == 401
+    with SessionLocal() as db:
+        assert db.query(models.User.password_hash).filter(models.User.username == username).scalar() == old
+    assert client.post("/auth/login", json={"username": username, "password": "secret1"}).status_code == 200
+    with SessionLocal() as db:
+        stored = db.query(models.User.password_hash).filter(models.User.username == username).scalar()
+    assert stored != old and stored.startswith("$2b$04$")
+    assert client.post("/auth/login", json={"username": username, "password": "secret1"}).status_code == 200
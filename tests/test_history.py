@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+import numpy as np
+import pytest
+
+from backend.history import ScoreHistory, lttb, minmax, to_epoch
+
+T0 = datetime(2030, 1, 1)
+
+
+def at(seconds):
+    return T0 + timedelta(seconds=seconds)
+
+
+@pytest.fixture
+def history():
+    h = ScoreHistory()
+    h.begin_load()
+    # team 1: 5 at t=10, 10 at t=30; teams 2 and 3 tie on 8 at t=20
+    assert h.load([(1, at(10), 5.0), (2, at(20), 8.0), (3, at(20), 8.0), (1, at(30), 5.0)])
+    return h
+
+
+def test_team_series_with_ranks(history):
+    out = history.team(1, [1, 2, 3])
+    assert out["times"] == [at(10), at(30)]
+    assert out["totals"] == [5.0, 10.0]
+    assert out["ranks"] == [1, 1]
+    # Ties go to the lower id, as on the leaderboard
+    assert history.team(3, [1, 2, 3])["ranks"] == [2]
+    assert history.team(1, [1, 2, 3], start=at(11))["totals"] == [10.0]
+    assert history.team(1, [1, 2, 3], end=at(29))["totals"] == [5.0]
+
+
+def test_top_samples_every_team_at_the_same_times(history):
+    out = history.top([{"team_id": 1, "team_name": "a"}, {"team_id": 2, "team_name": "b"}], [1, 2, 3], at(10), at(30), 3)
+    assert out["times"] == [at(10), at(20), at(30)]
+    a, b = out["teams"]
+    assert (a["totals"], a["ranks"]) == ([5.0, 5.0, 10.0], [1, 3, 1])
+    assert (b["totals"], b["ranks"]) == ([None, 8.0, 8.0], [None, 1, 2])
+    # Teams outside `ranked_ids` (banned) are not counted
+    assert history.top([{"team_id": 1, "team_name": "a"}], [1], at(10), at(30), 3)["teams"][0]["ranks"] == [1, 1, 1]
+
+
+def test_records_follow_submission_counts(history):
+    history.record(2, 20.0, 2, to_epoch(at(40)))
+    history.record(2, 15.0, 2, to_epoch(at(41)))  # same count again: already covered
+    history.record(2, 14.0, 1, to_epoch(at(42)))  # older change arriving late
+    assert history.team(2, [1, 2, 3])["totals"] == [8.0, 20.0]
+    history.forget(2)
+    assert history.team(2, [1, 2, 3])["totals"] == []
+
+
+def test_changes_during_a_load_are_replayed_and_reset_drops_it():
+    h = ScoreHistory()
+    h.begin_load()
+    h.record(1, 7.0, 2, to_epoch(at(50)))
+    assert h.load([(1, at(10), 3.0)])
+    assert h.team(1, [1])["totals"] == [3.0, 7.0]
+    h.begin_load()
+    h.reset()
+    assert not h.load([(1, at(10), 3.0)])
+    assert not h.loaded
+
+
+def test_downsampling_keeps_ends_and_extremes():
+    x = np.arange(1000, dtype=float)
+    y = np.sin(x / 37) * x
+    keep = lttb(x, y, 50)
+    assert len(keep) == 50 and keep[0] == 0 and keep[-1] == 999
+    assert np.all(np.diff(keep) > 0)
+    keep = minmax(x, y, 50)
+    assert len(keep) <= 50 and keep[0] == 0 and keep[-1] == 999
+    assert int(y.argmax()) in keep and int(y.argmin()) in keep
+    assert list(lttb(x[:10], y[:10], 50)) == list(range(10))
+
+
+def test_history_endpoints(client, admin, make_team, submit):
+    headers, team = make_team()
+    scores = [3e7, 1.0, 2.0, 4.0]
+    for score in scores:
+        submit(headers, score)
+    r = client.get(f"/teams/{team['id']}/history")
+    assert r.status_code == 200, r.text
+    out = r.json()
+    assert out["totals"] == list(accumulate(scores))
+    assert len(out["times"]) == len(out["ranks"]) == len(scores)
+    assert out["ranks"][-1] == 1
+    assert len(client.get(f"/teams/{team['id']}/history", params={"points": 2}).json()["totals"]) == 2
+    assert len(client.get(f"/teams/{team['id']}/history", params={"points": 3, "downsample": "minmax"}).json()["totals"]) <= 3
+
+    top = client.get("/leaderboard/history", params={"top": 1, "points": 5}).json()
+    assert len(top["times"]) == 5
+    assert top["teams"][0]["team_id"] == team["id"]
+    assert top["teams"][0]["totals"][-1] == sum(scores)
+
+    client.post(f"/admin/teams/{team['id']}/ban", headers=admin)
+    assert client.get(f"/teams/{team['id']}/history").status_code == 404
@@ -0,0 +1,154 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from backend import crud, main
+from backend.database import SessionLocal
+from backend.leaderboard import IndexableSkipList, Leaderboard
+
+
+def team(id, score, count=1, banned=False, name=None, version=None):
+    # Each submission bumps the version; banning, unbanning and renaming do too
+    version = count if version is None else version
+    return SimpleNamespace(id=id, name=name or f"t{id}", total_score=score, submission_count=count, banned=banned, version=version)
+
+
+def test_skip_list_matches_a_sorted_list():
+    rng = random.Random(5)
+    skips, reference = IndexableSkipList(), []
+    for step in range(3000):
+        key = (rng.randrange(200), rng.randrange(50))
+        if key in reference and rng.random() < 0.5:
+            assert skips.remove(key)
+            reference.remove(key)
+        elif key not in reference:
+            skips.insert(key, key)
+            reference.append(key)
+            reference.sort()
+        assert len(skips) == len(reference)
+        if step % 100 == 0:
+            for i, k in enumerate(reference):
+                assert skips.index(k) == i  # 0-based
+            assert skips.slice(0, len(reference)) == reference
+    for start, stop in [(0, 1), (5, 17), (len(reference) - 3, len(reference) + 10), (len(reference), len(reference) + 1)]:
+        assert skips.slice(start, stop) == reference[start:stop]
+
+
+def test_skip_list_missing_keys():
+    skips = IndexableSkipList()
+    skips.insert((1, 1), "a")
+    assert not skips.remove((2, 2))
+    with pytest.raises(KeyError):
+        skips.index((0, 0))
+    assert skips.slice(3, 1) == []
+
+
+def test_ranks_highest_total_first_ties_by_team_id():
+    board = Leaderboard()
+    board.rebuild([team(3, 10.0), team(1, 10.0), team(2, 30.0), team(4, 5.0, banned=False)])
+    assert [e["team_id"] for e in board.page()] == [2, 1, 3, 4]
+    assert board.rank(3)[0] == 3
+    assert [e["team_id"] for e in board.page(1, 2)] == [1, 3]
+    assert board.page(10, 5) == []
+    assert board.rank(99) is None
+
+
+def test_upsert_moves_bans_and_ignores_stale_updates():
+    board = Leaderboard()
+    board.rebuild([team(1, 10.0), team(2, 20.0)])
+    board.upsert(team(1, 25.0, count=2))
+    assert [e["team_id"] for e in board.page()] == [1, 2]
+    # An update committed before the one above arrives late: older version, ignored
+    board.upsert(team(1, 12.0, count=1))
+    assert board.rank(1)[1]["total_score"] == 25.0
+    board.upsert(team(2, 20.0, count=1, banned=True, version=2))
+    assert [e["team_id"] for e in board.page()] == [1]
+    assert len(board) == 1
+
+
+def test_late_updates_do_not_bring_back_removed_teams():
+    board = Leaderboard()
+    board.rebuild([team(1, 10.0), team(2, 20.0)])
+    # Banned at version 3 while a submission committed at version 2 was still on its way
+    board.upsert(team(1, 10.0, banned=True, version=3))
+    board.upsert(team(1, 15.0, count=2))
+    assert board.rank(1) is None
+    # Banning an unranked team leaves a tombstone all the same
+    board.upsert(team(3, 0.0, count=0, banned=True, version=4))
+    board.upsert(team(3, 5.0, count=1))
+    assert board.rank(3) is None
+    # A rebuild keeps the tombstones of teams it did not load
+    board.rebuild([team(2, 20.0)])
+    board.upsert(team(1, 15.0, count=2))
+    assert board.rank(1) is None
+    # Unbanning is newer than the ban
+    board.upsert(team(1, 10.0, version=5))
+    assert board.rank(1)[1]["total_score"] == 10.0
+    # A removal older than the entry is ignored
+    board.remove(1, version=4)
+    assert board.rank(1) is not None
+
+
+def test_deleted_ids_can_be_reused():
+    board = Leaderboard()
+    board.rebuild([team(1, 10.0, count=3)])
+    board.remove(1, deleted=True, version=3)
+    board.upsert(team(1, 12.0, count=3))
+    assert board.rank(1) is None
+    # SQLite gives the next team created the same id, at version 0
+    board.upsert(team(1, 0.0, count=0, name="new"))
+    assert board.rank(1)[1]["team_name"] == "new"
+
+
+def test_changes_carry_old_and_new_rank_in_seq_order():
+    changes = []
+    board = Leaderboard(on_change=changes.append)
+    board.rebuild([team(1, 10.0), team(2, 20.0), team(3, 30.0)])
+    board.upsert(team(1, 40.0, count=2))
+    board.remove(2, deleted=True)
+    reset, moved, removed = changes
+    assert reset["type"] == "reset"
+    assert (moved["type"], moved["old_rank"], moved["rank"], moved["version"]) == ("rank", 3, 1, 2)
+    assert (removed["type"], removed["old_rank"], removed["deleted"], removed["version"]) == ("remove", 3, True, 1)
+    assert [c["seq"] for c in changes] == sorted(c["seq"] for c in changes)
+
+
+def test_apply_replays_another_boards_changes():
+    changes = []
+    source, replica = Leaderboard(on_change=changes.append), Leaderboard()
+    source.rebuild([])
+    for i in range(1, 20):
+        source.upsert(team(i, float(i * 7 % 11), count=i))
+    source.upsert(team(4, 99.0, count=50))
+    source.remove(7)
+    for change in changes[1:]:
+        replica.apply(change)
+    assert replica.page() == source.page()
+    # Out of order and repeated, as over a bus: the newest version of each team wins
+    shuffled = Leaderboard()
+    rng = random.Random(3)
+    for change in rng.sample(changes[1:], len(changes) - 1) + changes[1:5]:
+        shuffled.apply(change)
+    assert shuffled.page() == source.page()
+
+
+def test_writes_bump_the_team_version(client, admin, make_team, submit):
+    headers, team = make_team()
+
+    def row():
+        with SessionLocal() as db:
+            return crud.team_rows(db, [team["id"]])[0]
+
+    assert row().version == 0
+    submit(headers, 1.0)
+    client.put("/teams/me", json={"name": f"{team['name']}-renamed"}, headers=headers)
+    before_ban = row()
+    assert before_ban.version == 2
+    client.post(f"/admin/teams/{team['id']}/ban", headers=admin)
+    assert row().version == 3
+    # The row read before the ban arriving late does not rank the team again
+    main.board.upsert(before_ban)
+    assert main.board.rank(team["id"]) is None
+    client.post(f"/admin/teams/{team['id']}/unban", headers=admin)
+    assert main.board.rank(team["id"])[1]["team_name"] == f"{team['name']}-renamed"
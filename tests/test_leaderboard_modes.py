@@ -0,0 +1,115 @@
+"""Every GET /leaderboard mode against a brute-force ranking of the raw submissions."""
+from collections import defaultdict
+
+import pytest
+
+from backend import models
+from backend.database import SessionLocal
+
+WEEKS = ("2031-W01", "2031-W02", "2031-W03")
+
+
+@pytest.fixture(scope="module")
+def league(client, admin, login):
+    scores = [
+        [(5, 0), (7, 0), (1, 1), (30, 2)],
+        [(12, 0), (2, 1), (2, 1)],
+        [(9, 1), (9, 2), (4, None)],
+        [(40, None)],
+        [(3, 0), (3, 1), (3, 2), (6, 2)],
+        [(50, 0)],  # banned below: on no leaderboard
+    ]
+    teams = []
+    for i, rows in enumerate(scores):
+        headers = login(f"modes-{i}")
+        team = client.post("/teams/create", json={"name": f"modes-{i}", "member1": "a", "member2": "b", "member3": "c"}, headers=headers).json()
+        for score, week in rows:
+            r = client.post("/submissions", json={"score": score, "week": None if week is None else WEEKS[week]}, headers=headers)
+            assert r.status_code == 200, r.text
+        teams.append(team["id"])
+    assert client.post(f"/admin/teams/{teams[-1]}/ban", headers=admin).status_code == 200
+    return teams
+
+
+def weekly_totals(banned=False):
+    """({team_id: name}, {team_id: {week: [scores]}}) for every visible team (every
+    team with `banned`), from the submissions table."""
+    with SessionLocal() as db:
+        teams = db.query(models.Team)
+        visible = {t.id: t.name for t in (teams if banned else teams.filter(models.Team.banned == False))}
+        out = defaultdict(lambda: defaultdict(list))
+        for team_id, score, week in db.query(models.Submission.team_id, models.Submission.score, models.Submission.week):
+            if team_id in visible:
+                out[team_id][week].append(score)
+    return visible, out
+
+
+def ranked(scores: dict):
+    return [team_id for team_id, _ in sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))]
+
+
+def check(rows, expected: dict, key, offset=0):
+    assert [r["team_id"] for r in rows] == ranked(expected)[offset:offset + len(rows)]
+    if rows and "rank" in rows[0]:  # the overall board's rows carry no rank
+        assert [r["rank"] for r in rows] == list(range(offset + 1, offset + len(rows) + 1))
+    for r in rows:
+        assert r[key] == pytest.approx(expected[r["team_id"]])
+
+
+def test_total(client, league):
+    visible, weeks = weekly_totals()
+    expected = {team_id: sum(sum(s) for s in weeks[team_id].values()) for team_id in visible}
+    check(client.get("/leaderboard").json(), expected, "total_score")
+    check(client.get("/leaderboard?offset=2&limit=3").json(), expected, "total_score", offset=2)
+    assert league[-1] not in [r["team_id"] for r in client.get("/leaderboard").json()]
+
+
+@pytest.mark.parametrize("week", WEEKS)
+def test_week(client, league, week):
+    visible, weeks = weekly_totals()
+    expected = {t: sum(w[week]) for t, w in weeks.items() if week in w}
+    rows = client.get("/leaderboard", params={"week": week}).json()
+    check(rows, expected, "total")
+    for r in rows:
+        assert r["week"] == week
+        assert r["best"] == max(weeks[r["team_id"]][week])
+        assert r["submission_count"] == len(weeks[r["team_id"]][week])
+    check(client.get("/leaderboard", params={"week": week, "offset": 1, "limit": 1}).json(), expected, "total", offset=1)
+
+
+def test_sum_of_weeks(client, league):
+    _, weeks = weekly_totals()
+    labelled = {t: {w: sum(s) for w, s in by_week.items() if w is not None} for t, by_week in weeks.items()}
+    expected = {t: sum(w.values()) for t, w in labelled.items() if w}
+    rows = client.get("/leaderboard", params={"mode": "sum_of_weeks"}).json()
+    check(rows, expected, "score")
+    for r in rows:
+        assert r["weeks"] == len(labelled[r["team_id"]])
+
+
+@pytest.mark.parametrize("n", [1, 2, 3])
+def test_best_of(client, league, n):
+    _, weeks = weekly_totals()
+    labelled = {t: sorted((sum(s) for w, s in by_week.items() if w is not None), reverse=True) for t, by_week in weeks.items()}
+    expected = {t: sum(totals[:n]) for t, totals in labelled.items() if totals}
+    r = client.get("/leaderboard", params={"mode": "best_of", "n": n})
+    assert r.status_code == 200, r.text
+    check(r.json(), expected, "score")
+    for row in r.json():
+        assert row["weeks"] == min(n, len(labelled[row["team_id"]]))
+
+
+def test_weeks(client, league):
+    # Week summaries count every team's weekly score, banned teams' too
+    _, weeks = weekly_totals(banned=True)
+    rows = {r["week"]: r for r in client.get("/leaderboard/weeks").json()}
+    for week in WEEKS:
+        teams = [w[week] for w in weeks.values() if week in w]
+        assert rows[week]["teams"] == len(teams)
+        assert rows[week]["submissions"] == sum(len(s) for s in teams)
+        assert rows[week]["top_total"] == pytest.approx(max(sum(s) for s in teams))
+
+
+def test_week_and_mode_together_is_rejected(client):
+    assert client.get("/leaderboard", params={"week": WEEKS[0], "mode": "best_of"}).status_code == 400
+    assert client.get("/leaderboard", params={"mode": "nope"}).status_code == 422
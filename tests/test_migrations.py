@@ -0,0 +1,96 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import create_engine, inspect
+
+from backend import migrations
+from backend.database import Base
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def url(tmp_path):
+    return f"sqlite:///{tmp_path / 'migrate.db'}"
+
+
+def schema(engine) -> dict:
+    """{table: (column names, index names)} of what is in the database."""
+    found = inspect(engine)
+    return {
+        table: ({c["name"] for c in found.get_columns(table)}, {i["name"] for i in found.get_indexes(table)})
+        for table in found.get_table_names() if table != migrations.schema_migrations.name
+    }
+
+
+def model_schema() -> dict:
+    return {
+        table.name: ({c.name for c in table.columns}, {i.name for i in table.indexes if i.name})
+        for table in Base.metadata.sorted_tables
+    }
+
+
+def test_fresh_database_matches_the_models(url):
+    engine = create_engine(url)
+    applied = migrations.upgrade_engine(engine)
+    assert [version for version, _ in applied] == [version for version, _, _ in migrations.MIGRATIONS]
+    with engine.connect() as conn:
+        assert migrations.current_version(conn) == migrations.LATEST_VERSION
+    assert schema(engine) == model_schema()
+    assert migrations.upgrade_engine(engine) == []
+
+
+def test_step_by_step_and_adopting_create_all_databases(url, tmp_path):
+    engine = create_engine(url)
+    assert [v for v, _ in migrations.upgrade_engine(engine, 1)] == [1]
+    with engine.connect() as conn:
+        assert migrations.current_version(conn) == 1
+    assert [v for v, _ in migrations.upgrade_engine(engine)] == [v for v, _, _ in migrations.MIGRATIONS[1:]]
+
+    # Created by create_all before migrations existed: adopted as it is
+    adopted = create_engine(f"sqlite:///{tmp_path / 'adopted.db'}")
+    Base.metadata.create_all(adopted)
+    migrations.upgrade_engine(adopted)
+    with adopted.connect() as conn:
+        assert migrations.current_version(conn) == migrations.LATEST_VERSION
+    assert schema(adopted) == model_schema()
+
+
+def python(code_or_args, url, **env):
+    args = ["-c", code_or_args] if isinstance(code_or_args, str) else code_or_args
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env={**os.environ, "DATABASE_URL": url, **env},
+                          capture_output=True, text=True, timeout=120)
+
+
+def test_cli_status_and_upgrade(url):
+    status = python(["-m", "backend.migrations", "status"], url)
+    assert status.returncode == 1
+    assert f"database at version 0, latest is {migrations.LATEST_VERSION}" in status.stdout
+    assert python(["-m", "backend.migrations", "upgrade"], url).returncode == 0
+    status = python(["-m", "backend.migrations", "status"], url)
+    assert status.returncode == 0 and "[ ]" not in status.stdout
+
+
+START = """
+from fastapi.testclient import TestClient
+from backend import main
+with TestClient(main.app) as client:
+    print(client.get("/").status_code)
+"""
+
+
+def test_startup_checks_the_schema_version(url):
+    refused = python(START, url, MIGRATE_ON_STARTUP="0")
+    assert refused.returncode != 0
+    assert "run `python -m backend.migrations upgrade`" in refused.stderr
+    started = python(START, url, MIGRATE_ON_STARTUP="1")
+    assert started.returncode == 0, started.stderr
+    assert started.stdout.split()[-1] == "200"
+
+
+def test_import_defers_heavy_modules(url):
+    out = python("import sys, backend.main; print(sorted(m for m in ('numpy', 'pyarrow', 'redis') if m in sys.modules))", url)
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.split()[-1] == "[]"
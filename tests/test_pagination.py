@@ -0,0 +1,58 @@
+from backend import models
+from backend.database import SessionLocal
+
+
+def walk(client, path, **params):
+    """Every row of `path`, following X-Next-Cursor; returns (rows, pages)."""
+    rows, pages, cursor = [], 0, None
+    while True:
+        r = client.get(path, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert r.status_code == 200, r.text
+        rows.extend(r.json())
+        pages += 1
+        cursor = r.headers.get("x-next-cursor")
+        if not cursor:
+            return rows, pages
+
+
+def test_team_pages_cover_every_visible_team_once(client, admin, make_team):
+    teams = [make_team()[1] for _ in range(7)]
+    client.post(f"/admin/teams/{teams[3]['id']}/ban", headers=admin)
+    rows, pages = walk(client, "/teams/public", limit=3)
+    with SessionLocal() as db:
+        expected = [
+            t.id for t in db.query(models.Team).filter(models.Team.banned == False)
+            .order_by(models.Team.created_at.desc(), models.Team.id.desc())
+        ]
+    assert [r["id"] for r in rows] == expected
+    assert pages == (len(expected) + 2) // 3
+    assert teams[3]["id"] not in expected
+
+
+def test_fields_select_columns(client, make_team):
+    make_team()
+    rows = client.get("/teams/public", params={"fields": "id,total_score", "limit": 5}).json()
+    assert rows and all(set(r) == {"id", "total_score"} for r in rows)
+    assert client.get("/teams/public", params={"fields": "id,password"}).status_code == 400
+    assert client.get("/teams/public", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_prefix_search(client, login):
+    for name in ("kp-alpha", "kp-alpine", "kp-beta", "kq-alpha"):
+        headers = login(f"{name}-owner")
+        client.post("/teams/create", json={"name": name, "member1": "a", "member2": "b", "member3": "c"}, headers=headers)
+    rows, _ = walk(client, "/teams/public", q="kp-alp", limit=1)
+    assert sorted(r["name"] for r in rows) == ["kp-alpha", "kp-alpine"]
+    assert sorted(r["name"] for r in client.get("/teams/public", params={"q": "kp-"}).json()) == ["kp-alpha", "kp-alpine", "kp-beta"]
+    assert client.get("/teams/public", params={"q": "kp-gamma"}).json() == []
+
+
+def test_announcement_pages(client, admin):
+    for i in range(5):
+        assert client.post("/announcements", json={"title": f"page-{i}", "body": "b"}, headers=admin).status_code == 200
+    rows, _ = walk(client, "/announcements", limit=2)
+    with SessionLocal() as db:
+        expected = [a.id for a in db.query(models.Announcement).order_by(models.Announcement.created_at.desc(), models.Announcement.id.desc())]
+    assert [r["id"] for r in rows] == expected
+    titles = [r["title"] for r in client.get("/announcements", params={"fields": "title", "limit": 5}).json()]
+    assert titles[:5] == [f"page-{i}" for i in reversed(range(5))]
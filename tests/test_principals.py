@@ -0,0 +1,37 @@
+from backend.auth import forget_principal, principal_cache
+
+
+def test_me_is_cached_until_forgotten(client, signup):
+    username, headers = signup()
+    assert client.get("/auth/me", headers=headers).json()["team_id"] is None
+    cached = principal_cache.get(username)
+    assert cached is not None and cached.team_id is None
+    forget_principal(username)
+    assert principal_cache.get(username) is None
+    assert client.get("/auth/me", headers=headers).json()["username"] == username
+
+
+def test_creating_a_team_refreshes_the_principal(client, signup):
+    username, headers = signup()
+    assert client.get("/auth/me", headers=headers).json()["team_id"] is None
+    r = client.post("/teams/create", json={"name": f"{username}-team", "member1": "a", "member2": "b", "member3": "c"}, headers=headers)
+    assert r.status_code == 200, r.text
+    assert client.get("/auth/me", headers=headers).json()["team_id"] == r.json()["id"]
+    assert client.get("/teams/me", headers=headers).json()["name"] == f"{username}-team"
+
+
+def test_deleting_a_team_refreshes_its_members(client, admin, make_team):
+    headers, team = make_team()
+    assert client.get("/auth/me", headers=headers).json()["team_id"] == team["id"]
+    assert client.delete(f"/admin/teams/{team['id']}", headers=admin).status_code == 200
+    assert client.get("/auth/me", headers=headers).json()["team_id"] is None
+    assert client.get("/teams/me", headers=headers).status_code == 404
+
+
+def test_banning_is_seen_on_the_next_request(client, admin, make_team, submit):
+    headers, team = make_team()
+    submit(headers, 1.0)
+    assert client.post(f"/admin/teams/{team['id']}/ban", headers=admin).status_code == 200
+    assert client.post("/submissions", json={"score": 1.0}, headers=headers).status_code == 403
+    client.post(f"/admin/teams/{team['id']}/unban", headers=admin)
+    submit(headers, 1.0)
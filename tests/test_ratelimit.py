@@ -0,0 +1,125 @@
+from types import SimpleNamespace
+
+import fakeredis
+import httpx
+import pytest
+from fastapi import HTTPException, Response
+
+from backend import main
+from backend.ratelimit import Limit, MemoryBuckets, RateLimiter, RedisBuckets, parse_limits
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def request(ip="10.0.0.1"):
+    return SimpleNamespace(client=SimpleNamespace(host=ip))
+
+
+def limiter(spec, buckets=None):
+    clock = Clock()
+    out = RateLimiter(buckets or MemoryBuckets(), enabled=True, clock=clock)
+    out._limits["test"] = parse_limits(spec)
+    return out, clock
+
+
+def test_parse_limits():
+    assert parse_limits("ip=30/60, user=10/1.5") == (Limit("ip", 30, 60.0), Limit("user", 10, 1.5))
+    assert parse_limits("") == ()
+    for bad in ("ip=30", "host=1/1", "ip=0/60", "ip=1/0"):
+        with pytest.raises(ValueError):
+            parse_limits(bad)
+
+
+def test_burst_then_refill_at_rate():
+    rl, clock = limiter("ip=3/30")  # one token per 10s
+    for _ in range(3):
+        rl.check("test", request())
+    with pytest.raises(HTTPException) as exc:
+        rl.check("test", request())
+    assert exc.value.status_code == 429
+    assert exc.value.headers["Retry-After"] == "10"
+    clock.now += 9.9
+    with pytest.raises(HTTPException):
+        rl.check("test", request())
+    clock.now += 0.2
+    rl.check("test", request())
+    # Buckets are per key: another client still has its burst
+    for _ in range(3):
+        rl.check("test", request("10.0.0.2"))
+
+
+def test_a_rejected_request_takes_no_token_from_any_bucket():
+    rl, clock = limiter("ip=10/10,user=1/10")
+    rl.check("test", request(), user=1)
+    with pytest.raises(HTTPException):
+        rl.check("test", request(), user=1)
+    # The user bucket ran dry, but the IP bucket was not charged for the rejection
+    response = Response()
+    rl.check("test", request(), response, user=2)
+    assert response.headers["X-RateLimit-Remaining"] == "0"  # user 2's bucket is now the tightest
+    # The IP bucket paid for the two allowed requests only (and for this take)
+    assert rl.buckets.take(["test:ip:10.0.0.1"], [Limit("ip", 10, 10)], clock.now)[1][0] == pytest.approx(7.0)
+
+
+def test_missing_keys_are_skipped_and_disabled_never_limits():
+    rl, _ = limiter("user=1/60,team=1/60")
+    for _ in range(5):
+        rl.check("test", request(), user=None, team=None)
+    rl.enabled = False
+    for _ in range(5):
+        rl.check("test", request(), user=1, team=1)
+
+
+def test_headers_describe_the_tightest_bucket():
+    rl, _ = limiter("ip=100/60,user=4/60")
+    response = Response()
+    rl.check("test", request(), response, user=7)
+    assert response.headers["X-RateLimit-Limit"] == "4"
+    assert response.headers["X-RateLimit-Remaining"] == "3"
+    assert response.headers["X-RateLimit-Reset"] == "15"
+
+
+def test_memory_buckets_sweep_full_buckets():
+    buckets = MemoryBuckets(max_keys=10)
+    limit = Limit("ip", 1, 1.0)
+    for i in range(10):
+        buckets.take([f"k{i}"], [limit], 0.0)
+    assert len(buckets) == 10
+    # The 11th key triggers a sweep; by now every earlier bucket has refilled
+    buckets.take(["late"], [limit], 100.0)
+    assert len(buckets) == 1
+
+
+def test_redis_buckets_agree_with_memory_buckets():
+    memory = MemoryBuckets()
+    redis = RedisBuckets(fakeredis.FakeRedis(server=fakeredis.FakeServer()), prefix="test")
+    limits = [Limit("ip", 5, 10.0), Limit("user", 2, 4.0)]
+    now = 1_000_000.0
+    for step in range(30):
+        now += (step % 4) * 0.7
+        a, b = memory.take(["ip", "user"], limits, now), redis.take(["ip", "user"], limits, now)
+        assert a[0] == b[0]
+        assert a[1] == pytest.approx(b[1])
+
+
+def test_failed_logins_do_not_lock_the_owner_out(client, signup, monkeypatch):
+    monkeypatch.setattr(main.limiter, "enabled", True)
+    monkeypatch.setitem(main.limiter._limits, "login", parse_limits("ip=100/60,username=3/60"))
+    username, _ = signup()
+
+    def login(ip, password):
+        async def post():
+            transport = httpx.ASGITransport(app=main.app, client=(ip, 40000))
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                return (await http.post("/auth/login", json={"username": username, "password": password})).status_code
+        return client.portal.call(post)
+
+    assert [login("10.6.6.6", "wrong-password") for _ in range(4)] == [401, 401, 401, 429]
+    # The owner, from another address, still gets in
+    assert login("10.1.1.1", "secret1") == 200
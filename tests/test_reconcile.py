@@ -0,0 +1,51 @@
+import threading
+
+from sqlalchemy import update
+
+from backend import crud, models, reconcile
+from backend.database import SessionLocal
+
+
+def test_concurrent_submissions_lose_no_updates(client, make_team):
+    _, team = make_team()
+
+    def submit(seed):
+        with SessionLocal() as db:
+            for i in range(25):
+                assert crud.record_submission(db, team["id"], (seed * 25 + i) / 4, "2032-W10") is not None
+
+    threads = [threading.Thread(target=submit, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with SessionLocal() as db:
+        stored = db.get(models.Team, team["id"])
+        assert (stored.submission_count, stored.total_score) == (200, sum(range(200)) / 4)
+        weekly = db.get(models.WeeklyScore, (team["id"], "2032-W10"))
+        assert (weekly.count, weekly.total, weekly.best) == (200, sum(range(200)) / 4, 199 / 4)
+        assert crud.reconcile_team_aggregates(db) == []
+
+
+def test_reports_then_repairs_drift(client, admin, make_team, submit):
+    headers, team = make_team()
+    submit(headers, 3.0)
+    submit(headers, 4.0)
+    with SessionLocal() as db:
+        db.execute(update(models.Team.__table__).where(models.Team.id == team["id"]).values(submission_count=9, total_score=100.0))
+        db.commit()
+
+    report = client.post("/admin/reconcile", headers=admin).json()
+    assert (report["drifted"], report["repaired"]) == (1, False)
+    assert report["teams"] == [{
+        "team_id": team["id"], "submission_count": 9, "expected_submission_count": 2,
+        "total_score": 100.0, "expected_total_score": 7.0,
+    }]
+    assert reconcile.main([]) == 1  # the CLI exits non-zero on unrepaired drift
+
+    repaired = client.post("/admin/reconcile", params={"repair": True}, headers=admin).json()
+    assert (repaired["drifted"], repaired["repaired"]) == (1, True)
+    entry = client.get(f"/leaderboard/rank/{team['id']}").json()
+    assert (entry["submission_count"], entry["total_score"]) == (2, 7.0)
+    assert client.post("/admin/reconcile", headers=admin).json()["drifted"] == 0
+    assert reconcile.main([]) == 0
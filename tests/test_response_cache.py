@@ -0,0 +1,31 @@
+import pytest
+
+
+@pytest.mark.parametrize("path", ["/leaderboard", "/leaderboard/weeks", "/teams/public", "/announcements"])
+def test_matching_etag_gets_304(client, path):
+    r = client.get(path)
+    assert r.status_code == 200
+    etag = r.headers["etag"]
+    again = client.get(path, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["etag"] == etag
+    assert client.get(path, headers={"If-None-Match": '"stale-0"'}).status_code == 200
+
+
+def test_a_write_changes_the_etag_and_the_body(client, make_team, submit):
+    headers, team = make_team()
+    before = client.get("/leaderboard")
+    submit(headers, 12345.0)
+    after = client.get("/leaderboard", headers={"If-None-Match": before.headers["etag"]})
+    assert after.status_code == 200
+    assert after.headers["etag"] != before.headers["etag"]
+    assert after.json()[0]["team_id"] == team["id"]
+
+
+def test_cached_body_is_served_until_the_next_write(client):
+    first = client.get("/leaderboard?offset=0&limit=5")
+    second = client.get("/leaderboard?offset=0&limit=5")
+    assert second.headers["etag"] == first.headers["etag"]
+    assert second.content == first.content
+    assert second.headers["cache-control"] == "public, max-age=0, must-revalidate"
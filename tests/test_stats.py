@@ -0,0 +1,108 @@
+import random
+import statistics
+
+import numpy as np
+import pytest
+
+from backend import main
+from backend.stats import LeaderboardStats, TeamColumns, describe
+
+
+@pytest.fixture
+def teams():
+    rnd = random.Random(7)
+    ids = rnd.sample(range(1, 1000), 60)
+    # Repeated totals exercise the tie order and the percentiles' `side="right"`
+    return [(i, f"t{i}", float(rnd.choice([0, 1.5, 2, 10, 10, 33.25])), rnd.randint(1, 9)) for i in ids]
+
+
+def build(teams, week_rows=(), previous_rows=()):
+    ids, names, totals, counts = zip(*teams)
+    return LeaderboardStats(
+        np.array(ids, dtype=np.int64), list(names), np.array(totals), np.array(counts, dtype=np.int64),
+        "2033-W02", "2033-W01", week_rows, previous_rows,
+    )
+
+
+def test_rows_against_brute_force(teams):
+    week = {i: float(i % 7) for i, *_ in teams[::2]}
+    previous = {i: 3.0 for i, *_ in teams[::3]}
+    stats = build(teams, list(week.items()) + [(5000, 1.0)], list(previous.items()))  # 5000: banned
+
+    totals = [t for _, _, t, _ in teams]
+    mean, std = statistics.fmean(totals), statistics.pstdev(totals)
+    expected = []
+    for rank, (team_id, name, total, count) in enumerate(sorted(teams, key=lambda t: (-t[2], t[0])), 1):
+        delta = None
+        if team_id in week or team_id in previous:
+            delta = week.get(team_id, 0.0) - previous.get(team_id, 0.0)
+        expected.append((rank, team_id, name, total, count, week.get(team_id), delta,
+                         100.0 * sum(t <= total for t in totals) / len(totals), (total - mean) / std))
+    got = [(r["rank"], r["team_id"], r["team_name"], r["total_score"], r["submission_count"], r["week_score"],
+            r["week_delta"], r["percentile"], r["z_score"]) for r in stats.rows()]
+    assert [g[:7] for g in got] == [e[:7] for e in expected]
+    assert [g[7:] for g in got] == [pytest.approx(e[7:]) for e in expected]
+    assert stats.rows(10, 5) == stats.rows()[10:15]
+
+    summary = stats.summary(bins=4)
+    assert summary["teams"] == len(teams)
+    assert summary["week"]["score"]["count"] == len(week)
+    deltas = [e[6] for e in expected if e[6] is not None]
+    assert summary["week"]["delta"]["count"] == len(deltas)
+    assert (summary["week"]["improved"], summary["week"]["declined"]) == (sum(d > 0 for d in deltas), sum(d < 0 for d in deltas))
+
+
+def test_describe_matches_numpy():
+    values = np.random.default_rng(3).normal(size=501)
+    out = describe(values, bins=8)
+    assert out["count"] == 501 and sum(out["histogram"]["counts"]) == 501
+    assert list(out["percentiles"].values()) == pytest.approx(np.percentile(values, [1, 5, 10, 25, 50, 75, 90, 95, 99]).tolist())
+    assert (out["min"], out["max"], out["std"]) == pytest.approx((values.min(), values.max(), values.std()))
+    assert describe(np.array([])) == {"count": 0}
+
+
+def test_team_columns_follow_changes():
+    columns = TeamColumns()
+    columns.begin_load()
+    columns.apply({"type": "rank", "seq": 5, "team_id": 3, "team_name": "c", "total_score": 9.0, "submission_count": 2})
+    assert columns.load(4, [{"team_id": 1, "team_name": "a", "total_score": 1.0, "submission_count": 1},
+                            {"team_id": 2, "team_name": "b", "total_score": 2.0, "submission_count": 1}])
+    columns.apply({"type": "remove", "seq": 6, "team_id": 1})
+    columns.apply({"type": "rank", "seq": 7, "team_id": 2, "team_name": "B", "total_score": 4.0, "submission_count": 2})
+    ids, names, totals, counts = columns.snapshot()
+    assert sorted(zip(ids.tolist(), names, totals.tolist(), counts.tolist())) == [(2, "B", 4.0, 2), (3, "c", 9.0, 2)]
+
+
+def test_stats_endpoint_matches_the_board(client, make_team, submit):
+    headers, team = make_team()
+    submit(headers, 6.0, "2034-W01")
+    submit(headers, 2.0, "2034-W02")
+    r = client.get("/leaderboard/stats", params={"week": "2034-W02", "limit": 1000})
+    assert r.status_code == 200, r.text
+    out = r.json()
+    board = main.board.page()
+    assert out["teams"] == len(board)
+    assert [(x["team_id"], x["total_score"]) for x in out["rows"]] == [(e["team_id"], e["total_score"]) for e in board]
+    mine = next(x for x in out["rows"] if x["team_id"] == team["id"])
+    assert (mine["week_score"], mine["week_delta"]) == (2.0, -4.0)
+    assert out["week"]["previous"] == "2034-W01"
+
+
+def test_non_finite_totals_are_excluded(teams):
+    stats = build(teams + [(2000, "inf", float("inf"), 1), (2001, "nan", float("nan"), 1)], [(2000, float("inf")), (teams[0][0], 4.0)])
+    assert len(stats) == len(teams) and stats.excluded == 2
+    summary = stats.summary()
+    assert (summary["teams"], summary["excluded"]) == (len(teams), 2)
+    assert summary["week"]["score"]["count"] == 1
+    assert {r["team_id"] for r in stats.rows()} == {t[0] for t in teams}
+
+
+def test_non_finite_scores_are_rejected(client, admin, make_team):
+    headers, team = make_team()
+    # 1e999 overflows to inf; Python's json also reads the bare Infinity and NaN tokens
+    r = client.post("/submissions", content=b'{"score": 1e999}', headers={**headers, "content-type": "application/json"})
+    assert r.status_code == 422
+    body = '[{"team_id": %d, "score": Infinity}, {"team_id": %d, "score": NaN}, {"team_id": %d, "score": 1}]' % ((team["id"],) * 3)
+    r = client.post("/submissions/batch", content=body, headers={**admin, "content-type": "application/json"})
+    assert [row["ok"] for row in r.json()["results"]] == [False, False, True]
+    assert client.get("/leaderboard/stats").status_code == 200
@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+from backend import events, main
+from backend.events import Broker, sse
+
+
+def parse(frame: bytes) -> dict:
+    fields = dict(line.split(": ", 1) for line in frame.decode().strip().split("\n"))
+    return {"id": int(fields["id"]) if "id" in fields else None, "event": fields["event"], "data": json.loads(fields["data"])}
+
+
+class Stream:
+    """A streaming endpoint's body, read on the app's event loop through the test client's portal."""
+
+    def __init__(self, client, endpoint, *args):
+        self.portal = client.portal
+        self.frames = self.portal.call(endpoint, *args).body_iterator
+
+    def next(self) -> dict:
+        async def read():
+            return await asyncio.wait_for(self.frames.__anext__(), 5)
+        return parse(self.portal.call(read))
+
+    def close(self):
+        self.portal.call(self.frames.aclose)
+
+
+def test_sse_frames():
+    assert sse("rank", {"a": 1}, 7) == b'id: 7\nevent: rank\ndata: {"a":1}\n\n'
+    assert sse("snapshot", "[]") == b"event: snapshot\ndata: []\n\n"
+
+
+def test_leaderboard_stream_sends_a_snapshot_then_changes(client, admin, make_team, submit):
+    headers, team = make_team()
+    stream = Stream(client, main.stream_leaderboard, None)
+    try:
+        snapshot = stream.next()
+        assert snapshot["event"] == "snapshot"
+        assert snapshot["data"]["rows"] == main.board.page()
+        submit(headers, 1e6)
+        change = stream.next()
+        assert change["event"] == "rank"
+        assert change["id"] == change["data"]["seq"] > snapshot["data"]["seq"]
+        assert (change["data"]["team_id"], change["data"]["rank"], change["data"]["total_score"]) == (team["id"], 1, 1e6)
+        client.post(f"/admin/teams/{team['id']}/ban", headers=admin)
+        removed = stream.next()
+        assert (removed["event"], removed["data"]["team_id"], removed["data"]["old_rank"]) == ("remove", team["id"], 1)
+    finally:
+        stream.close()
+    assert main.broker.subscribers("leaderboard") == 0
+
+
+def test_announcement_stream(client, admin):
+    stream = Stream(client, main.stream_announcements)
+    try:
+        assert stream.next()["event"] == "snapshot"
+        posted = client.post("/announcements", json={"title": "live", "body": "now"}, headers=admin).json()
+        frame = stream.next()
+        assert (frame["event"], frame["data"]["id"], frame["data"]["title"]) == ("announcement", posted["id"], "live")
+        client.delete(f"/announcements/{posted['id']}", headers=admin)
+        assert stream.next() == {"id": None, "event": "announcement_deleted", "data": {"id": posted["id"]}}
+    finally:
+        stream.close()
+
+
+def test_slow_subscribers_are_dropped_and_idle_streams_ping(monkeypatch):
+    monkeypatch.setattr(events, "STREAM_HEARTBEAT_SECONDS", 0.01)
+
+    async def run():
+        broker = Broker(queue_size=2)
+        broker.bind(asyncio.get_running_loop())
+        idle, slow = broker.subscribe("t"), broker.subscribe("t")
+        idle_frames = broker.stream(idle, b"snapshot")
+        assert await idle_frames.__anext__() == b"snapshot"
+        assert await idle_frames.__anext__() == b": ping\n\n"
+        await idle_frames.aclose()
+        for i in range(3):  # one more than the slow subscriber's queue holds
+            broker.publish("t", "rank", {"i": i}, i)
+        frames = [frame async for frame in broker.stream(slow, b"snapshot")]
+        return frames, broker.subscribers("t")
+
+    frames, left = asyncio.run(run())
+    assert frames[0] == b"snapshot"
+    assert parse(frames[-1])["event"] == "dropped"
+    assert len(frames) == 2  # queued frames are discarded for the sentinel
+    assert left == 0
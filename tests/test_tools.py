@@ -0,0 +1,123 @@
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from tools.bench import compare
+from tools.common import free_port
+from tools.stats_bench import differences, np_stats, py_stats, synthetic
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_tool(name, *args, timeout=300):
+    """Run `python -m tools.<name>` from the repository root, as its docstring says to."""
+    return subprocess.run(
+        [sys.executable, "-m", f"tools.{name}", *map(str, args)],
+        cwd=ROOT, capture_output=True, text=True, timeout=timeout,
+    )
+
+
+def test_query_plans_have_no_full_scans():
+    run = run_tool("query_plans", "--teams", 2000, "--submissions", 5000, "--announcements", 50)
+    assert run.returncode == 0, run.stdout + run.stderr
+    assert "0 full scan(s)" in run.stdout
+
+
+def test_workers_share_the_cache_and_invalidations():
+    run = run_tool("cache_check")
+    assert run.returncode == 0, run.stdout + run.stderr
+    assert "0 failure(s)" in run.stdout and "[FAIL]" not in run.stdout
+
+
+def test_micro_benchmarks_run(tmp_path):
+    out = tmp_path / "bench.json"
+    run = run_tool(
+        "bench", "--micro-only", "--database", tmp_path / "bench.db", "--teams", 60, "--submissions", 300,
+        "--announcements", 5, "--users", 10, "--micro-time", 0.01, "--out", out,
+    )
+    assert run.returncode == 0, run.stdout + run.stderr
+    micro = json.loads(out.read_text())["micro"]
+    assert "get_current_user (principal lookup)" in micro and "submission group commit (100 rows)" in micro
+    assert all(timing["runs"] >= 3 for timing in micro.values())
+
+
+def test_bench_compare_flags_slower_p95_and_lower_throughput():
+    def run(p95, rps, count=500, micro_p50=10.0):
+        endpoint = {"count": count, "p95_ms": p95, "rps": rps}
+        return {"mixes": {"polling": {"endpoints": {"GET /leaderboard": endpoint}}}, "micro": {"serialize": {"p50_us": micro_p50}}}
+
+    baseline = run(10.0, 1000.0)
+    assert compare(run(11.0, 950.0), baseline, 0.15) == []
+    assert compare(run(12.0, 1000.0), baseline, 0.15) == ["polling GET /leaderboard: p95 10.0ms -> 12.0ms"]
+    assert compare(run(10.0, 800.0), baseline, 0.15) == ["polling GET /leaderboard: 1000.0 -> 800.0 req/s"]
+    assert compare(run(10.0, 1000.0, micro_p50=12.0), baseline, 0.15) == ["micro serialize: p50 10.0us -> 12.0us"]
+    # Too few samples on either side to judge
+    assert compare(run(50.0, 10.0, count=20), baseline, 0.15) == []
+
+
+def test_fast_list_bodies_match_the_response_models():
+    run = run_tool("projection_check", "--teams", 300, "--no-bench")
+    assert run.returncode == 0, run.stdout + run.stderr
+    assert " 0 mismatch(es)" in run.stdout
+
+
+needs_aiosqlite = pytest.mark.skipif(importlib.util.find_spec("aiosqlite") is None, reason="aiosqlite is not installed")
+
+
+@pytest.mark.parametrize("driver", [[], pytest.param(["--async-db"], marks=needs_aiosqlite)], ids=["sync", "async"])
+def test_exports_round_trip_within_the_heap_budget(driver):
+    run = run_tool("export_check", "--submissions", 20000, "--teams", 100, "--max-peak-mb", 16, *driver)
+    assert run.returncode == 0, run.stdout + run.stderr
+    assert "0 failure(s)" in run.stdout
+
+
+def test_performance_profile_never_reports_a_locked_database():
+    run = run_tool(
+        "sqlite_bench", "--profile", "performance", "--teams", 200, "--submissions", 2000,
+        "--readers", 2, "--writers", 2, "--writes", 200,
+    )
+    assert run.returncode == 0, run.stdout + run.stderr
+    assert "[FAIL]" not in run.stdout
+
+
+needs_httpx = pytest.mark.skipif(importlib.util.find_spec("httpx") is None, reason="httpx is not installed")
+
+
+@needs_httpx
+def test_cold_start_stays_within_budget():
+    run = run_tool(
+        "startup_bench", "--teams", 200, "--submissions", 1000, "--runs", 1,
+        "--port", free_port(), "--max-seconds", 30,
+    )
+    assert run.returncode == 0, run.stdout + run.stderr
+    assert "0 regression(s)" in run.stdout
+
+
+@needs_httpx
+@pytest.mark.skipif(importlib.util.find_spec("fakeredis") is None, reason="fakeredis is not installed")
+def test_nodes_agree_after_parallel_submissions():
+    run = run_tool(
+        "cluster_check", "--nodes", 2, "--workers", 1, "--teams", 40, "--hot-teams", 5,
+        "--submissions", 400, "--submitters", 8,
+    )
+    assert run.returncode == 0, run.stdout + run.stderr
+    assert "0 failure(s)" in run.stdout
+
+
+def test_numpy_stats_match_the_pure_python_figures():
+    from backend.stats import TeamColumns
+
+    entries, week, previous, week_rows, previous_rows = synthetic(2000)
+    # Totals from before scores were checked for finiteness are left out on both sides
+    entries = [{**entries[0], "team_id": 2001, "total_score": float("inf")}, *entries,
+               {**entries[0], "team_id": 2002, "total_score": float("nan")}]
+    columns = TeamColumns()
+    columns.begin_load()
+    columns.load(0, entries)
+    found = np_stats(columns, week, previous, week_rows, previous_rows, 20)
+    assert found["excluded"] == 2
+    assert differences(found, py_stats(entries, week, previous, week_rows, previous_rows, 20)) == []
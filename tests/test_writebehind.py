@@ -0,0 +1,124 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from backend import main
+from backend.writebehind import SubmissionQueue
+
+
+class Commits:
+    """Stand-in for the group commit: records each group, rejects team 0."""
+
+    def __init__(self, fail: bool = False):
+        self.groups = []
+        self.fail = fail
+
+    async def __call__(self, rows):
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError("database went away")
+        self.groups.append([row.team_id for _, row in rows])
+        return [{"ok": row.team_id != 0, "detail": None if row.team_id else "Team not found", "row": i} for i, row in rows]
+
+
+def row(team_id):
+    return SimpleNamespace(team_id=team_id)
+
+
+def run(queue, body):
+    async def main():
+        await queue.start()
+        try:
+            return await body()
+        finally:
+            await queue.stop()
+    return asyncio.run(main())
+
+
+def test_flush_mode_answers_each_row_after_its_group_commit():
+    commits = Commits()
+    queue = SubmissionQueue(commits, mode="flush", flush_rows=3, flush_ms=50)
+
+    async def body():
+        return await asyncio.gather(*(queue.submit(row(i)) for i in (1, 2, 0, 4, 5, 6, 7)))
+
+    results = run(queue, body)
+    assert [r["ok"] for r in results] == [True, True, False, True, True, True, True]
+    assert [team for group in commits.groups for team in group] == [1, 2, 0, 4, 5, 6, 7]
+    assert max(len(group) for group in commits.groups) == 3
+
+
+def test_enqueue_mode_answers_at_once_and_flushes_later():
+    commits = Commits()
+    queue = SubmissionQueue(commits, mode="enqueue", flush_ms=20)
+
+    async def body():
+        assert [queue.submit(row(i)) for i in range(5)] == [None] * 5
+        assert queue.depth == 5 and commits.groups == []
+        await asyncio.sleep(0.2)
+        return queue.depth
+
+    assert run(queue, body) == 0
+    assert commits.groups == [[0, 1, 2, 3, 4]]
+
+
+def test_full_queue_and_shutdown_shed_with_503():
+    commits = Commits()
+    queue = SubmissionQueue(commits, mode="enqueue", maxsize=2, flush_ms=1000)
+
+    async def body():
+        queue.submit(row(1))
+        queue.submit(row(2))
+        with pytest.raises(HTTPException) as exc:
+            queue.submit(row(3))
+        return exc.value
+
+    exc = run(queue, body)
+    assert (exc.status_code, exc.headers["Retry-After"]) == (503, "1")
+    # stop() flushed what was queued, and later rows are refused
+    assert commits.groups == [[1, 2]]
+    with pytest.raises(HTTPException) as exc:
+        queue.submit(row(4))
+    assert exc.value.status_code == 503
+
+
+def test_failed_commit_fails_its_rows():
+    queue = SubmissionQueue(Commits(fail=True), mode="flush", flush_ms=5)
+
+    async def body():
+        return await asyncio.gather(queue.submit(row(1)), queue.submit(row(2)), return_exceptions=True)
+
+    assert [type(r) for r in run(queue, body)] == [RuntimeError, RuntimeError]
+
+
+@pytest.fixture
+def queued(client, monkeypatch):
+    """The app's submission queue switched on, in `mode`."""
+    def start(mode):
+        monkeypatch.setattr(main.submission_queue, "mode", mode)
+        client.portal.call(main.submission_queue.start)
+    yield start
+    client.portal.call(main.submission_queue.stop)
+
+
+def test_api_in_flush_mode(client, admin, make_team, queued):
+    queued("flush")
+    headers, team = make_team()
+    r = client.post("/submissions", json={"score": 2.5, "week": "2033-W10"}, headers=headers)
+    assert r.status_code == 200, r.text
+    assert (r.json()["team_id"], r.json()["score"], r.json()["week"]) == (team["id"], 2.5, "2033-W10")
+    assert client.get(f"/leaderboard/rank/{team['id']}").json()["total_score"] == 2.5
+    client.post(f"/admin/teams/{team['id']}/ban", headers=admin)
+    assert client.post("/submissions", json={"score": 1.0}, headers=headers).status_code == 403
+
+
+def test_api_in_enqueue_mode(client, make_team, queued):
+    queued("enqueue")
+    headers, team = make_team()
+    r = client.post("/submissions", json={"score": 4.0}, headers=headers)
+    assert r.status_code == 202
+    assert r.json() == {"queued": True, "team_id": team["id"], "score": 4.0, "week": None}
+    client.portal.call(main.submission_queue.stop)  # flushes
+    assert client.get(f"/leaderboard/rank/{team['id']}").json()["total_score"] == 4.0
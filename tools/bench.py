@@ -0,0 +1,426 @@
+"""Load test and micro-benchmarks for the API.
+
+    python -m tools.bench                                  # 10k teams / 100k submissions, every mix
+    python -m tools.bench --teams 100000 --submissions 1000000 --duration 30
+    python -m tools.bench --mix polling --mix submissions --concurrency 64 --out bench.json
+    python -m tools.bench --baseline bench-baseline.json   # exit 1 on a regression
+    python -m tools.bench --micro-only                     # in-process micro-benchmarks only
+
+Seeds a SQLite database, boots `uvicorn backend.main:app` on it and drives each
+traffic mix for --duration seconds, reporting req/s and p50/p95/p99 latency per
+endpoint. Results are written as JSON (--out), and can be compared against an
+earlier run (--baseline): a p95 more than --tolerance slower, or a throughput
+that much lower, counts as a regression. Needs httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from .common import ROOT, seed_league, temp_database, use_database
+
+PASSWORD = "bench-password"
+ADMIN = ("bench-admin", "bench-admin-password")
+WEEK = "2025-W35"
+
+# name -> [(weight, op)]; op names are "METHOD /route/template"
+MIXES = {
+    "login": [(1, "POST /auth/login")],
+    "polling": [
+        (40, "GET /leaderboard"), (20, "GET /leaderboard/rank/{team_id}"), (15, "GET /teams/public"),
+        (10, "GET /announcements"), (10, "GET /leaderboard?week="), (5, "GET /auth/me"),
+    ],
+    "submissions": [(90, "POST /submissions"), (10, "GET /leaderboard")],
+    "admin": [
+        (10, "POST /admin/teams/{team_id}/ban"), (10, "POST /admin/teams/{team_id}/unban"),
+        (60, "GET /leaderboard"), (20, "GET /teams/public"),
+    ],
+    "mixed": [
+        (30, "GET /leaderboard"), (15, "GET /leaderboard/rank/{team_id}"), (10, "GET /teams/public"),
+        (8, "GET /announcements"), (7, "GET /leaderboard?week="), (5, "GET /auth/me"),
+        (18, "POST /submissions"), (3, "POST /auth/login"),
+        (2, "POST /admin/teams/{team_id}/ban"), (2, "POST /admin/teams/{team_id}/unban"),
+    ],
+}
+
+
+def percentile(values, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(q * len(values) + 0.5)) - 1))]
+
+
+def summarize(latencies, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "count": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+# ---------- database ----------
+def prepare_database(args):
+    """Seed the benchmark database (unless --database points at an existing one)."""
+    from backend.auth import hash_password
+    from backend.database import engine
+    from backend.migrations import upgrade_engine
+
+    # The server refuses to start on an unmigrated database; a no-op when current
+    upgrade_engine(engine)
+    with engine.connect() as conn:
+        seeded = engine.dialect.has_table(conn, "teams") and conn.exec_driver_sql("SELECT count(*) FROM teams").scalar()
+    if seeded:
+        print(f"using existing database with {seeded} teams")
+        return
+    started = time.perf_counter()
+    seed_league(engine, args.teams, args.submissions, args.announcements,
+                password_hash=hash_password(PASSWORD), analyze=True)
+    print(f"seeded {args.teams} teams / {args.submissions} submissions in {time.perf_counter() - started:.1f}s")
+
+
+# ---------- server ----------
+def start_server(args, database_url: str):
+    env = dict(
+        os.environ, DATABASE_URL=database_url,
+        ADMIN_USERNAME=ADMIN[0], ADMIN_PASSWORD=ADMIN[1],
+        # A handful of simulated users would otherwise just measure the 429 path
+        RATE_LIMIT_ENABLED="1" if args.rate_limit else "0",
+        SUBMIT_MODE=args.submit_mode,
+    )
+    cmd = [
+        sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(args.port),
+        "--workers", str(args.workers), "--log-level", "warning", "--no-access-log",
+    ]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+    import httpx
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"server exited with {proc.returncode}")
+        try:
+            httpx.get(f"{args.base}/", timeout=1.0)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit("server did not come up within 60s")
+
+
+def login_pool(args):
+    """(team ids, bearer tokens) of --users seeded users, plus the admin's token."""
+    import httpx
+    with httpx.Client(base_url=args.base, timeout=30) as client:
+        def login(username, password):
+            r = client.post("/auth/login", json={"username": username, "password": password})
+            r.raise_for_status()
+            return r.json()["access_token"]
+        # tools.common.seed bans every 50th team; skip those so submissions succeed
+        ids = [i for i in range(1, args.teams + 1) if i % 50][:args.users]
+        return ids, [login(f"user-{i:07d}", PASSWORD) for i in ids], login(*ADMIN)
+
+
+# ---------- load generation ----------
+def _request(op: str, rng: random.Random, ctx: dict):
+    """(method, url, kwargs) for one `op`."""
+    teams = ctx["teams"]
+    user = rng.randrange(len(ctx["tokens"]))
+    auth = {"Authorization": f"Bearer {ctx['tokens'][user]}"}
+    if op == "GET /leaderboard":
+        return "GET", "/leaderboard?limit=100", {}
+    if op == "GET /leaderboard?week=":
+        return "GET", f"/leaderboard?week={WEEK}&limit=100", {}
+    if op == "GET /leaderboard/rank/{team_id}":
+        return "GET", f"/leaderboard/rank/{ctx['team_ids'][user]}", {}
+    if op == "GET /teams/public":
+        return "GET", "/teams/public?limit=100", {}
+    if op == "GET /announcements":
+        return "GET", "/announcements?limit=50", {}
+    if op == "GET /auth/me":
+        return "GET", "/auth/me", {"headers": auth}
+    if op == "POST /auth/login":
+        return "POST", "/auth/login", {"json": {"username": f"user-{rng.randint(1, teams):07d}", "password": PASSWORD}}
+    if op == "POST /submissions":
+        return "POST", "/submissions", {"json": {"score": round(rng.random() * 100, 3), "week": WEEK}, "headers": auth}
+    # Ban targets stay clear of the logged-in users so their requests keep succeeding
+    target = rng.randint(ctx["team_ids"][-1] + 1, max(ctx["team_ids"][-1] + 1, teams))
+    admin = {"Authorization": f"Bearer {ctx['admin']}"}
+    if op == "POST /admin/teams/{team_id}/ban":
+        return "POST", f"/admin/teams/{target}/ban", {"headers": admin}
+    if op == "POST /admin/teams/{team_id}/unban":
+        return "POST", f"/admin/teams/{target}/unban", {"headers": admin}
+    raise ValueError(op)
+
+
+async def _drive(ctx: dict, mix: str, concurrency: int, duration: float, seed: int):
+    import httpx
+
+    ops, weights = zip(*[(op, w) for w, op in MIXES[mix]])
+    latencies, statuses = defaultdict(list), defaultdict(lambda: defaultdict(int))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=ctx["base"], limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker(n):
+            rng = random.Random(seed * 1000 + n)
+            etags = {}  # like a browser: revalidate what we have already seen
+            while time.perf_counter() < deadline:
+                op = rng.choices(ops, weights)[0]
+                method, url, kwargs = _request(op, rng, ctx)
+                if method == "GET" and url in etags:
+                    kwargs.setdefault("headers", {})["If-None-Match"] = etags[url]
+                start = time.perf_counter()
+                try:
+                    r = await client.request(method, url, **kwargs)
+                    code = r.status_code
+                except httpx.HTTPError:
+                    code = "error"
+                latencies[op].append(time.perf_counter() - start)
+                statuses[op][code] += 1
+                if code == 200 and method == "GET" and "etag" in r.headers:
+                    etags[url] = r.headers["etag"]
+
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    return dict(latencies), {op: dict(codes) for op, codes in statuses.items()}
+
+
+def _drive_process(ctx, mix, concurrency, duration, seed):
+    return asyncio.run(_drive(ctx, mix, concurrency, duration, seed))
+
+
+def run_mix(args, ctx: dict, mix: str) -> dict:
+    """Run `mix` from --client-procs processes and merge their samples."""
+    per_proc = max(1, args.concurrency // args.client_procs)
+    started = time.perf_counter()
+    if args.client_procs == 1:
+        parts = [asyncio.run(_drive(ctx, mix, per_proc, args.duration, 1))]
+    else:
+        with ProcessPoolExecutor(args.client_procs) as pool:
+            futures = [pool.submit(_drive_process, ctx, mix, per_proc, args.duration, n + 1) for n in range(args.client_procs)]
+            parts = [f.result() for f in futures]
+    elapsed = time.perf_counter() - started
+    latencies, statuses = defaultdict(list), defaultdict(lambda: defaultdict(int))
+    for lat, codes in parts:
+        for op, values in lat.items():
+            latencies[op].extend(values)
+        for op, by_code in codes.items():
+            for code, n in by_code.items():
+                statuses[op][str(code)] += n
+    endpoints = {}
+    for op, values in sorted(latencies.items()):
+        codes = statuses[op]
+        ok = sum(n for code, n in codes.items() if code in ("200", "202", "304"))
+        endpoints[op] = {
+            **summarize(values, elapsed),
+            "errors": sum(codes.values()) - ok - codes.get("503", 0),
+            "shed": codes.get("503", 0),  # HashPool / submission queue back-pressure, expected under a storm
+            "status": dict(codes),
+        }
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "duration_s": round(elapsed, 2), "concurrency": per_proc * args.client_procs,
+        "requests": total, "rps": round(total / elapsed, 1), "endpoints": endpoints,
+    }
+
+
+# ---------- micro-benchmarks ----------
+def _time(fn, min_time: float = 1.0, min_runs: int = 20) -> dict:
+    samples = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < min_runs or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "runs": len(samples),
+        "mean_us": round(sum(samples) / len(samples) * 1e6, 2),
+        "p50_us": round(percentile(samples, 0.50) * 1e6, 2),
+        "p99_us": round(percentile(samples, 0.99) * 1e6, 2),
+    }
+
+
+def micro(args) -> dict:
+    """Time hot code paths in-process against the seeded database."""
+    from fastapi.security import HTTPAuthorizationCredentials
+    from backend import auth, crud, main
+    from backend.config import get_settings
+    from backend.database import SessionLocal
+
+    settings = get_settings()
+    results = {}
+    loop = asyncio.new_event_loop()
+    with SessionLocal() as db:
+        main.load_board(db)
+        username = "user-0000001"
+        token = auth.create_access_token({"sub": username, "is_admin": False}, settings.secret_key, settings.algorithm)
+        creds = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+        def current_user():
+            return loop.run_until_complete(auth.get_current_user(creds, settings))
+
+        current_user()
+        results["get_current_user (cached principal)"] = _time(current_user, args.micro_time)
+
+        def current_user_cold():
+            auth.forget_principal(username)
+            return current_user()
+
+        results["get_current_user (principal lookup)"] = _time(current_user_cold, args.micro_time)
+
+        rng = random.Random(7)
+        teams = len(main.board)
+        team_ids = [i for i in range(1, args.users + 1) if i % 50]
+
+        def submit():
+            recorded = crud.record_submission(db, rng.choice(team_ids), round(rng.random() * 100, 3), WEEK)
+            if recorded is not None:
+                main.board.upsert(recorded[1])
+
+        results["submit_score (record + board upsert)"] = _time(submit, args.micro_time)
+
+        # What SUBMIT_MODE=flush/enqueue does per flush: compare with 100x the line above
+        from backend.schemas import SubmissionBatchRow
+
+        def group_commit():
+            rows = [(i, SubmissionBatchRow(team_id=rng.choice(team_ids), score=round(rng.random() * 100, 3), week=WEEK)) for i in range(100)]
+            main.ingest_queued(db, rows)
+
+        results["submission group commit (100 rows)"] = _time(group_commit, args.micro_time)
+        results["leaderboard serialize top 100"] = _time(lambda: main.dumps(main.board.page(0, 100)), args.micro_time)
+        results[f"leaderboard serialize all {teams}"] = _time(lambda: main.dumps(main.board.page()), args.micro_time, 3)
+
+        # Bucket check as on POST /submissions (IP, user and team), limits too high to trip
+        from types import SimpleNamespace
+        from backend.ratelimit import MemoryBuckets, RateLimiter, parse_limits
+        limiter = RateLimiter(MemoryBuckets(), enabled=True)
+        limiter._limits["bench"] = parse_limits("ip=1000000000/1,user=1000000000/1,team=1000000000/1")
+        requests = [SimpleNamespace(client=SimpleNamespace(host=f"10.0.{i // 256}.{i % 256}")) for i in range(1000)]
+        results["rate limit check (3 buckets, memory)"] = _time(
+            lambda: limiter.check("bench", rng.choice(requests), None, user=rng.randrange(10_000), team=rng.randrange(5_000)), args.micro_time)
+    loop.close()
+    return results
+
+
+# ---------- reporting ----------
+def print_mix(name: str, result: dict):
+    print(f"\nmix {name}: {result['requests']} requests in {result['duration_s']}s "
+          f"({result['rps']} req/s), concurrency {result['concurrency']}")
+    print(f"  {'endpoint':<36}{'count':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'shed':>6}")
+    for op, s in result["endpoints"].items():
+        print(f"  {op:<36}{s['count']:>8}{s['rps']:>9}{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}{s['errors']:>8}{s['shed']:>6}")
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_count: int = 100):
+    """Regressions of `results` against `baseline` as printable strings.
+
+    Endpoints with fewer than `min_count` samples in either run are too noisy to judge.
+    """
+    found = []
+    for mix, result in results.get("mixes", {}).items():
+        for op, now in result["endpoints"].items():
+            then = baseline.get("mixes", {}).get(mix, {}).get("endpoints", {}).get(op)
+            if not then or min(then["count"], now["count"]) < min_count:
+                continue
+            if then["p95_ms"] and now["p95_ms"] > then["p95_ms"] * (1 + tolerance):
+                found.append(f"{mix} {op}: p95 {then['p95_ms']}ms -> {now['p95_ms']}ms")
+            if then["rps"] and now["rps"] < then["rps"] * (1 - tolerance):
+                found.append(f"{mix} {op}: {then['rps']} -> {now['rps']} req/s")
+    for name, now in results.get("micro", {}).items():
+        then = baseline.get("micro", {}).get(name)
+        if then and now["p50_us"] > then["p50_us"] * (1 + tolerance):
+            found.append(f"micro {name}: p50 {then['p50_us']}us -> {now['p50_us']}us")
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", help="SQLite file to seed (or reuse if already seeded); default: temp file")
+    parser.add_argument("--teams", type=int, default=10_000)
+    parser.add_argument("--submissions", type=int, default=100_000)
+    parser.add_argument("--announcements", type=int, default=500)
+    parser.add_argument("--users", type=int, default=200, help="logged-in users driving authenticated requests")
+    parser.add_argument("--mix", action="append", choices=sorted(MIXES), help="mix to run (repeatable; default: all)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per mix")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent client connections")
+    parser.add_argument("--client-procs", type=int, default=1, help="load-generator processes (one core each)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--rate-limit", action="store_true", help="keep rate limiting on in the server (off by default)")
+    parser.add_argument("--submit-mode", choices=("direct", "flush", "enqueue"), default=os.getenv("SUBMIT_MODE", "direct"),
+                        help="server SUBMIT_MODE: per-request commits or the write-behind queue")
+    parser.add_argument("--async-db", action="store_true", help="run the server on sqlite+aiosqlite")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--micro-time", type=float, default=1.0, help="seconds per micro-benchmark")
+    parser.add_argument("--micro-only", action="store_true", help="skip the load test")
+    parser.add_argument("--no-micro", action="store_true", help="skip the micro-benchmarks")
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--baseline", help="JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown vs. the baseline (0.15 = 15%%)")
+    parser.add_argument("--min-count", type=int, default=100, help="skip endpoints with fewer samples when comparing")
+    args = parser.parse_args(argv)
+
+    tmp = None
+    if args.database:
+        args.database = os.path.abspath(args.database)
+        use_database(f"sqlite:///{args.database}")
+    else:
+        tmp, args.database = temp_database("bench.db")
+    args.base = f"http://127.0.0.1:{args.port}"
+    args.users = min(args.users, args.teams)
+    prepare_database(args)
+
+    results = {
+        "meta": {
+            "python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+            "teams": args.teams, "submissions": args.submissions, "workers": args.workers,
+            "async_db": args.async_db, "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "mixes": {},
+    }
+    if not args.micro_only:
+        driver = "sqlite+aiosqlite" if args.async_db else "sqlite"
+        server = start_server(args, f"{driver}:///{args.database}")
+        try:
+            team_ids, tokens, admin = login_pool(args)
+            ctx = {"base": args.base, "team_ids": team_ids, "tokens": tokens, "admin": admin, "teams": args.teams}
+            for mix in args.mix or list(MIXES):
+                results["mixes"][mix] = run_mix(args, ctx, mix)
+                print_mix(mix, results["mixes"][mix])
+        finally:
+            server.terminate()
+            server.wait()
+    if not args.no_micro:
+        results["micro"] = micro(args)
+        print(f"\n  {'micro-benchmark':<44}{'runs':>8}{'mean us':>11}{'p50 us':>11}{'p99 us':>11}")
+        for name, s in results["micro"].items():
+            print(f"  {name:<44}{s['runs']:>8}{s['mean_us']:>11}{s['p50_us']:>11}{s['p99_us']:>11}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nresults written to {args.out}")
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_count)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        print(f"\n{len(regressions)} regression(s) vs {args.baseline} (tolerance {args.tolerance:.0%})")
+        status = 1 if regressions else 0
+    if tmp is not None:
+        tmp.cleanup()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
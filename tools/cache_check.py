@@ -0,0 +1,112 @@
+"""Cross-worker cache consistency check.
+
+    python -m tools.cache_check                             # in-process fakeredis
+    python -m tools.cache_check --url redis://localhost:6379/15
+
+Simulates two API workers (each with its own ResponseCache, principal cache,
+leaderboard and bus listener) against the same Redis and checks that entries are
+shared, that ETags agree and that invalidations reach the other worker. Point it
+at a scratch database: keys live under a random prefix and are removed afterwards.
+"""
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+
+def wait_for(predicate, timeout: float = 3.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def worker(client, prefix: str):
+    from backend.cache import InvalidationBus, RedisCache, ResponseCache
+    from backend.leaderboard import Leaderboard
+
+    bus = InvalidationBus(client, channel=f"{prefix}:invalidate")
+    remote = False
+
+    # Same wiring as backend.main: local changes go out on the bus, replayed ones do not
+    def on_change(change):
+        if change["type"] != "reset" and not remote:
+            bus.publish({"type": "board", "change": change})
+
+    def on_message(message):
+        nonlocal remote
+        if message["type"] == "board":
+            remote = True
+            try:
+                board.apply(message["change"])
+            finally:
+                remote = False
+
+    board = Leaderboard(on_change=on_change)
+    bus.subscribe(on_message)
+    responses = ResponseCache(RedisCache(client, "responses", 60, prefix=prefix), bus=bus)
+    responses.load()
+    bus.start()
+    return SimpleNamespace(
+        bus=bus, board=board, responses=responses,
+        principals=RedisCache(client, "principal", 60, prefix=prefix),
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="fakeredis://", help="Redis URL (default: in-process fakeredis)")
+    args = parser.parse_args(argv)
+
+    from backend.cache import redis_client
+
+    prefix = f"cache-check-{os.urandom(4).hex()}"
+    client = redis_client(args.url)
+    a, b = worker(client, prefix), worker(redis_client(args.url), prefix)
+    failures = 0
+
+    def check(name, ok):
+        nonlocal failures
+        failures += not ok
+        print(f"[{' ok ' if ok else 'FAIL'}] {name}")
+
+    try:
+        check("workers agree on the ETag", a.responses.etag() == b.responses.etag())
+        key = ("teams/public", None, 100, frozenset({"name", "id"}), None)
+        version, _ = a.responses.lookup(key)
+        a.responses.store(key, version, (b"[]", {}))
+        check("body stored by one worker is served by the other", b.responses.lookup(key)[1] == (b"[]", {}))
+
+        a.responses.bump()
+        check("bump reaches the other worker", wait_for(lambda: b.responses.version == a.responses.version))
+        check("ETags agree after a bump", a.responses.etag() == b.responses.etag())
+        check("bumped body is gone everywhere", b.responses.lookup(key)[1] is None)
+
+        a.principals.set("alice", {"id": 1, "team_id": None})
+        check("principal cached by one worker is seen by the other", b.principals.get("alice") == {"id": 1, "team_id": None})
+        b.principals.pop("alice")
+        check("forgetting a principal is global", a.principals.get("alice") is None)
+
+        team = SimpleNamespace(id=7, name="t7", banned=False, submission_count=1, total_score=42.0, version=1)
+        a.board.upsert(team)
+        check("leaderboard change is replayed", wait_for(lambda: b.board.rank(7) == a.board.rank(7)))
+        a.board.remove(7)
+        check("leaderboard removal is replayed", wait_for(lambda: b.board.rank(7) is None))
+        check("replayed changes are not echoed back", wait_for(lambda: b.bus.received == a.bus.sent) and b.bus.sent == 0)
+
+        for name, w in (("a", a), ("b", b)):
+            print(f"worker {name}: responses {w.responses.stats()} principals {w.principals.stats()}")
+    finally:
+        a.bus.stop()
+        b.bus.stop()
+        for key in client.scan_iter(match=prefix + ":*"):
+            client.delete(key)
+    print(f"{failures} failure(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
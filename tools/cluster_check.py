@@ -0,0 +1,275 @@
+"""Multi-node consistency check: several API nodes, one database, parallel submissions.
+
+    python -m tools.cluster_check                         # 3 nodes, throwaway database and Redis
+    python -m tools.cluster_check --nodes 4 --workers 2 --submissions 5000
+    python -m tools.cluster_check --database-url postgresql://league@localhost/league_check \\
+                                    --cache-url redis://localhost:6379/15
+
+Starts --nodes `uvicorn backend.main:app` processes (--workers each) on their own
+ports, as separate API nodes sharing one database and one Redis, with no
+stickiness: every request goes to a random node. Without --database-url it runs
+a throwaway PostgreSQL (initdb/pg_ctl on PATH, as pg_tmp does; not as root),
+falling back to a shared SQLite file; without --cache-url, an in-process
+fakeredis TCP server stands in for Redis. The database given is seeded with
+--teams teams (use an empty one).
+
+Then --submitters concurrent clients post --submissions scores for --hot-teams
+teams, so the same rows are updated from every node at once. Checks that
+  * each team's total and count in the database are the seeded values plus
+    exactly the accepted submissions (no lost or doubled updates),
+  * the aggregates agree with the submissions table (crud.reconcile_team_aggregates),
+  * every node's /leaderboard matches the database (after the bus settles).
+Exits non-zero on any mismatch. Needs httpx (pip install httpx).
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from .common import ROOT, free_port, seed_league, use_database
+
+PASSWORD = "cluster-password"
+
+
+def start_postgres(tmp: str):
+    """(url, stop) of a throwaway PostgreSQL cluster, or None when it cannot run here."""
+    initdb, pg_ctl = shutil.which("initdb"), shutil.which("pg_ctl")
+    if not (initdb and pg_ctl) or os.geteuid() == 0:  # initdb refuses to run as root
+        return None
+    data, port = os.path.join(tmp, "pg"), free_port()
+    subprocess.run([initdb, "-D", data, "-U", "league", "-A", "trust", "--no-sync"], check=True, capture_output=True)
+    options = f"-p {port} -k {tmp} -c listen_addresses=127.0.0.1 -c fsync=off -c max_connections=200"
+    subprocess.run([pg_ctl, "-D", data, "-o", options, "-w", "-l", os.path.join(tmp, "pg.log"), "start"], check=True, capture_output=True)
+    stop = lambda: subprocess.run([pg_ctl, "-D", data, "-m", "fast", "-w", "stop"], capture_output=True)
+    return f"postgresql://league@127.0.0.1:{port}/postgres", stop
+
+
+def start_fake_redis():
+    from fakeredis import TcpFakeServer
+    port = free_port()
+    server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    threading.Thread(target=server.serve_forever, name="fake-redis", daemon=True).start()
+    return f"redis://127.0.0.1:{port}/0", server.shutdown
+
+
+def prepare_database(args):
+    """Migrate and seed; returns {team_id: (submission_count, total_score)} of the hot teams."""
+    from sqlalchemy import text
+    from backend.auth import hash_password
+    from backend.database import engine
+
+    seed_league(engine, args.teams, args.teams * 5, password_hash=hash_password(PASSWORD))
+    if engine.dialect.name == "postgresql":
+        # seed() inserts explicit ids
+        with engine.begin() as conn:
+            for table in ("teams", "users"):
+                conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"))
+    return team_totals(args.hot)
+
+
+def team_totals(team_ids):
+    from sqlalchemy import select
+    from backend import models
+    from backend.database import SessionLocal
+    teams = models.Team.__table__
+    with SessionLocal() as db:
+        rows = db.execute(select(teams.c.id, teams.c.submission_count, teams.c.total_score).where(teams.c.id.in_(team_ids)))
+        return {i: (n, total) for i, n, total in rows}
+
+
+def start_nodes(args, env):
+    nodes = []
+    for _ in range(args.nodes):
+        port = free_port()
+        cmd = [
+            sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(args.workers), "--log-level", "warning", "--no-access-log",
+        ]
+        nodes.append((f"http://127.0.0.1:{port}", subprocess.Popen(cmd, cwd=ROOT, env=env)))
+    import httpx
+    deadline = time.monotonic() + 120
+    with httpx.Client(timeout=2.0) as client:
+        for base, proc in nodes:
+            while True:
+                if proc.poll() is not None:
+                    raise SystemExit(f"node {base} exited with {proc.returncode}")
+                if time.monotonic() > deadline:
+                    raise SystemExit(f"node {base} not ready within 120s")
+                try:
+                    if client.get(f"{base}/readyz").status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                time.sleep(0.1)
+    return nodes
+
+
+async def submit_load(args, bases, tokens):
+    """Post --submissions scores from --submitters clients; returns (accepted per team, status counts, seconds)."""
+    import httpx
+    accepted = defaultdict(lambda: [0, 0.0])
+    statuses = defaultdict(int)
+    remaining = [args.submissions]
+
+    async def submitter(client, seed):
+        rng = random.Random(seed)
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            team_id = rng.choice(args.hot)
+            score = rng.randrange(1, 200) / 2  # halves: the sums stay exact in floating point
+            try:
+                r = await client.post(f"{rng.choice(bases)}/submissions", json={"score": score, "week": "2025-W40"},
+                                      headers={"Authorization": f"Bearer {tokens[team_id]}"})
+                statuses[r.status_code] += 1
+            except httpx.HTTPError as exc:
+                statuses[exc.__class__.__name__] += 1
+                continue
+            if r.status_code == 200:
+                accepted[team_id][0] += 1
+                accepted[team_id][1] += score
+
+    started = time.perf_counter()
+    async with httpx.AsyncClient(timeout=60, limits=httpx.Limits(max_connections=args.submitters)) as client:
+        await asyncio.gather(*(submitter(client, i) for i in range(args.submitters)))
+    return accepted, statuses, time.perf_counter() - started
+
+
+def node_boards(bases, samples: int, teams: int):
+    """Each node's overall leaderboard, `samples` times (to reach each of its workers)."""
+    import httpx
+    boards = {}
+    with httpx.Client(timeout=10) as client:
+        for n, base in enumerate(bases):
+            for k in range(samples):
+                # A distinct limit per request: the response cache is shared, and each
+                # key has to be built from the board of the worker that serves it
+                r = client.get(f"{base}/leaderboard", params={"limit": teams + 1 + n * samples + k})
+                r.raise_for_status()
+                boards[(base, k)] = {row["team_id"]: (row["submission_count"], row["total_score"]) for row in r.json()}
+    return boards
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=2, help="uvicorn workers per node")
+    parser.add_argument("--teams", type=int, default=1000)
+    parser.add_argument("--hot-teams", type=int, default=20, help="teams receiving the submissions")
+    parser.add_argument("--submissions", type=int, default=2000)
+    parser.add_argument("--submitters", type=int, default=32, help="concurrent client connections")
+    parser.add_argument("--submit-mode", choices=("direct", "flush"), default="direct", help="server SUBMIT_MODE")
+    parser.add_argument("--database-url", help="an empty database to use (sync driver URL)")
+    parser.add_argument("--cache-url", help="Redis URL shared by the nodes")
+    parser.add_argument("--settle", type=float, default=10.0, help="seconds to wait for every board to converge")
+    args = parser.parse_args(argv)
+
+    tmp = tempfile.mkdtemp()
+    cleanup = []
+    try:
+        if args.database_url:
+            url = args.database_url
+        else:
+            started = start_postgres(tmp)
+            if started is None:
+                url = f"sqlite:///{os.path.join(tmp, 'cluster.db')}"
+                print("no PostgreSQL to start here (initdb/pg_ctl missing, or running as root): using a shared SQLite file")
+            else:
+                url, stop = started
+                cleanup.append(stop)
+        if args.cache_url:
+            cache_url = args.cache_url
+        else:
+            cache_url, stop = start_fake_redis()
+            cleanup.append(stop)
+        print(f"database {url}\ncache    {cache_url}")
+
+        env = dict(
+            os.environ, DATABASE_URL=url, CACHE_URL=cache_url, CACHE_PREFIX=f"cluster-check-{os.getpid()}",
+            WEB_CONCURRENCY=str(args.workers), DB_NODES=str(args.nodes),
+            RATE_LIMIT_ENABLED="0", SUBMIT_MODE=args.submit_mode, MIGRATE_ON_STARTUP="0",
+        )
+        env.pop("ADMIN_USERNAME", None)
+        use_database(url)
+        rng = random.Random(7)
+        # tools.common.seed bans every 50th team
+        args.hot = rng.sample([i for i in range(1, args.teams + 1) if i % 50], min(args.hot_teams, args.teams - args.teams // 50))
+        seeded = prepare_database(args)
+        print(f"seeded {args.teams} teams; {args.hot_teams} hot teams")
+
+        nodes = start_nodes(args, env)
+
+        def stop_nodes():
+            for _, proc in nodes:
+                proc.terminate()
+            for _, proc in nodes:
+                proc.wait()
+        cleanup.append(stop_nodes)
+        bases = [base for base, _ in nodes]
+        print(f"{args.nodes} nodes x {args.workers} workers ready: {', '.join(bases)}")
+
+        import httpx
+        tokens = {}
+        with httpx.Client(timeout=60) as client:
+            for n, team_id in enumerate(args.hot):
+                r = client.post(f"{bases[n % len(bases)]}/auth/login", json={"username": f"user-{team_id:07d}", "password": PASSWORD})
+                r.raise_for_status()
+                tokens[team_id] = r.json()["access_token"]
+
+        accepted, statuses, elapsed = asyncio.run(submit_load(args, bases, tokens))
+        total = sum(n for n, _ in accepted.values())
+        print(f"\n{total} of {args.submissions} submissions accepted in {elapsed:.1f}s ({total / elapsed:.0f}/s); "
+              f"responses: {', '.join(f'{k}: {v}' for k, v in sorted(statuses.items(), key=str))}")
+
+        failures = 0
+        # 1. No lost or doubled updates
+        stored = team_totals(args.hot)
+        for team_id in args.hot:
+            n, score = accepted.get(team_id, (0, 0.0))
+            want = (seeded[team_id][0] + n, seeded[team_id][1] + score)
+            if stored[team_id][0] != want[0] or abs(stored[team_id][1] - want[1]) > 1e-6:
+                failures += 1
+                print(f"[FAIL] team {team_id}: database has {stored[team_id]}, expected {want}")
+        print(f"[{' ok ' if not failures else 'FAIL'}] database totals = seeded + accepted for {len(args.hot)} teams")
+
+        # 2. Aggregates agree with the submissions table
+        from backend import crud
+        from backend.database import SessionLocal
+        with SessionLocal() as db:
+            drift = crud.reconcile_team_aggregates(db)
+        failures += bool(drift)
+        print(f"[{' ok ' if not drift else 'FAIL'}] team aggregates match the submissions table ({len(drift)} drifted)")
+
+        # 3. Every node's board matches the database once the bus has settled
+        samples = 2 * args.workers
+        deadline = time.monotonic() + args.settle
+        while True:
+            stale = []
+            for (base, k), board in node_boards(bases, samples, args.teams).items():
+                for team_id in args.hot:
+                    got = board.get(team_id)
+                    if got is None or got[0] != stored[team_id][0] or abs(got[1] - stored[team_id][1]) > 1e-6:
+                        stale.append(f"{base} sample {k}: team {team_id} shows {got}, database {stored[team_id]}")
+            if not stale or time.monotonic() > deadline:
+                break
+            time.sleep(0.5)
+        for line in stale[:20]:
+            print(f"[FAIL] {line}")
+        failures += len(stale)
+        print(f"[{' ok ' if not stale else 'FAIL'}] {len(bases)} nodes x {samples} leaderboard samples match the database")
+        print(f"\n{failures} failure(s)")
+        return 1 if failures else 0
+    finally:
+        for stop in reversed(cleanup):
+            stop()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""Database setup shared by the benchmark and check scripts in tools/.
+
+Run them from the repository root as `python -m tools.<name>`. backend.database
+builds its engines from DATABASE_URL when it is first imported, so a script
+points it at a database with `use_database` (or `temp_database`) before it
+imports anything from backend, then fills it with `seed_league`.
+"""
+import os
+import random
+import socket
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    """A localhost TCP port that nothing is listening on right now."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def use_database(url: str, **env) -> str:
+    """Make `url` (and any other settings in `env`) the backend's database; call
+    before importing backend.database, directly or through another backend module."""
+    if "backend.database" in sys.modules:
+        raise RuntimeError("backend.database is already imported, with the DATABASE_URL it had then")
+    os.environ.update(DATABASE_URL=url, **env)
+    return url
+
+
+def temp_database(name: str, driver: str = "sqlite", **env):
+    """(TemporaryDirectory, file path) of a fresh SQLite file made the backend's
+    database through `driver` (sqlite or sqlite+aiosqlite)."""
+    tmp = tempfile.TemporaryDirectory()
+    path = os.path.join(tmp.name, name)
+    use_database(f"{driver}:///{path}", **env)
+    return tmp, path
+
+
+def seed(engine, teams: int, submissions: int, announcements: int, batch: int = 20000, password_hash: str = "x"):
+    """Bulk-load a synthetic league straight through Core inserts.
+
+    Team i is "team-%07d", owned by user "user-%07d" with `password_hash`; every
+    50th team is banned. Team aggregates are left at zero: `seed_league` brings
+    them in line with the submissions.
+    """
+    from backend import models
+
+    t0 = datetime(2025, 1, 1)
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        for start in range(0, teams, batch):
+            ids = range(start + 1, min(start + batch, teams) + 1)
+            conn.execute(models.Team.__table__.insert(), [
+                {
+                    "id": i, "name": f"team-{i:07d}", "member1": "a", "member2": "b", "member3": "c",
+                    "banned": i % 50 == 0, "submission_count": 0, "total_score": 0.0,
+                    "created_at": t0 + timedelta(seconds=i // 3),
+                } for i in ids
+            ])
+            conn.execute(models.User.__table__.insert(), [
+                {"id": i, "username": f"user-{i:07d}", "password_hash": password_hash, "is_admin": False, "team_id": i}
+                for i in ids
+            ])
+        for start in range(0, submissions, batch):
+            conn.execute(models.Submission.__table__.insert(), [
+                {
+                    "team_id": rng.randint(1, teams), "score": rng.random() * 100,
+                    "week": f"2025-W{rng.randint(1, 52):02d}" if rng.random() < 0.8 else None,
+                    "submitted_at": t0 + timedelta(minutes=i),
+                } for i in range(start, min(start + batch, submissions))
+            ])
+        conn.execute(models.Announcement.__table__.insert(), [
+            {"title": f"a{i}", "body": "b", "created_at": t0 + timedelta(hours=i)} for i in range(announcements)
+        ])
+
+
+def seed_league(engine, teams: int, submissions: int, announcements: int = 1, batch: int = 20000,
+                password_hash: str = "x", analyze: bool = False):
+    """Migrate `engine`'s database (empty, or already at the latest version), `seed`
+    it, then recompute team aggregates and weekly_scores from the submissions.
+
+    `engine` is a sync engine; scripts running the backend on an async driver pass
+    one of their own on the same file. With `analyze`, ANALYZE runs last.
+    """
+    from sqlalchemy.orm import Session
+    from backend import crud
+    from backend.migrations import upgrade_engine
+
+    upgrade_engine(engine)
+    seed(engine, teams, submissions, announcements, batch=batch, password_hash=password_hash)
+    with Session(engine) as db:
+        crud.reconcile_team_aggregates(db, repair=True)
+        crud.rebuild_weekly_scores(db)
+    if analyze:
+        with engine.begin() as conn:
+            conn.exec_driver_sql("ANALYZE")
@@ -0,0 +1,125 @@
+"""Check that admin exports stream in constant memory.
+
+    python -m tools.export_check                          # 1M submissions in a temp SQLite db
+    python -m tools.export_check --submissions 5000000 --format csv
+    python -m tools.export_check --async-db               # through sqlite+aiosqlite
+
+Seeds the database, then drains `export.stream` for /admin/export/submissions in
+each format, the way the response would. Reports time to the first chunk, total
+time and throughput, the largest chunk, the Python heap peak (tracemalloc) and
+the process RSS growth (max RSS high-water mark), and parses the output back to check the row count. Exits
+non-zero when the rows do not round-trip or the heap peak grows with table size
+(more than --max-peak-mb).
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import resource
+import sys
+import time
+import tracemalloc
+
+from .common import seed_league, temp_database
+
+
+def count_rows(fmt: str, body: bytes) -> int:
+    if fmt == "csv":
+        return sum(1 for _ in csv.reader(io.StringIO(body.decode()))) - 1
+    if fmt == "ndjson":
+        return sum(1 for line in body.splitlines() if json.loads(line))
+    import pyarrow.parquet
+    return pyarrow.parquet.ParquetFile(io.BytesIO(body)).metadata.num_rows
+
+
+async def drain(export, stmt, fmt: str, keep: bool):
+    """Consume the stream; returns (seconds to first chunk, largest chunk, body or None)."""
+    started = time.perf_counter()
+    first = None
+    largest = 0
+    parts = [] if keep else None
+    async for chunk in export.stream(stmt, fmt):
+        if first is None:
+            first = time.perf_counter() - started
+        largest = max(largest, len(chunk))
+        if keep:
+            parts.append(chunk)
+    return first, largest, b"".join(parts) if keep else None
+
+
+def drain_once(export, stmt, fmt: str, keep: bool):
+    """`drain` in an event loop of its own. Pooled aiosqlite connections belong to
+    the loop that opened them, so the pool is emptied before that loop closes."""
+    from backend.database import async_read_engine
+
+    async def run():
+        try:
+            return await drain(export, stmt, fmt, keep)
+        finally:
+            if async_read_engine is not None:
+                await async_read_engine.dispose()
+    return asyncio.run(run())
+
+
+def rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--submissions", type=int, default=1_000_000)
+    parser.add_argument("--teams", type=int, default=10_000)
+    parser.add_argument("--format", action="append", choices=("csv", "ndjson", "parquet"), help="repeatable; default: all")
+    parser.add_argument("--async-db", action="store_true", help="read through sqlite+aiosqlite")
+    parser.add_argument("--no-verify", action="store_true", help="do not keep the output to count its rows")
+    parser.add_argument("--max-peak-mb", type=float, default=64.0, help="fail when the heap peak exceeds this")
+    args = parser.parse_args(argv)
+
+    tmp, path = temp_database("export.db", "sqlite+aiosqlite" if args.async_db else "sqlite")
+    from sqlalchemy import create_engine
+    from backend import export
+
+    started = time.perf_counter()
+    # A sync engine of its own: with --async-db the backend's engine is aiosqlite
+    seed_engine = create_engine(f"sqlite:///{path}")
+    seed_league(seed_engine, args.teams, args.submissions, batch=50_000)
+    seed_engine.dispose()
+    print(f"seeded {args.submissions} submissions in {time.perf_counter() - started:.1f}s")
+
+    failures = 0
+    stmt = export.submissions_query()
+    print(f"\n  {'format':<9}{'first ms':>10}{'seconds':>9}{'rows/s':>11}{'max chunk KB':>14}{'heap MB':>9}{'RSS +MB':>9}")
+    formats = args.format or export.available_formats()
+    for fmt in formats:
+        rss_before = rss_mb()
+        started = time.perf_counter()
+        first, largest, _ = drain_once(export, stmt, fmt, keep=False)
+        elapsed = time.perf_counter() - started
+        # ru_maxrss only grows, so this is how far the export pushed the high-water mark
+        grown = rss_mb() - rss_before
+        # Separate pass: tracemalloc slows allocation-heavy code several times over
+        tracemalloc.start()
+        drain_once(export, stmt, fmt, keep=False)
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+        if peak > args.max_peak_mb:
+            failures += 1
+            print(f"[FAIL] {fmt}: heap peak {peak:.1f}MB > {args.max_peak_mb}MB")
+        print(f"  {fmt:<9}{first * 1000:>10.1f}{elapsed:>9.2f}{args.submissions / elapsed:>11.0f}"
+              f"{largest / 1024:>14.0f}{peak:>9.1f}{grown:>9.1f}")
+    # Round trip last: holding whole bodies would spoil the RSS numbers above
+    for fmt in [] if args.no_verify else formats:
+        _, _, body = drain_once(export, stmt, fmt, keep=True)
+        rows = count_rows(fmt, body)
+        ok = rows == args.submissions
+        failures += not ok
+        print(f"[{' ok ' if ok else 'FAIL'}] {fmt}: {rows} rows read back from {len(body) / 2**20:.1f}MB")
+    tmp.cleanup()
+    print(f"\n{failures} failure(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""Check the list endpoints' fast path against the Pydantic response models.
+
+    python -m tools.projection_check                 # 50k teams in a temp SQLite db
+    python -m tools.projection_check --teams 5000 --no-bench
+
+For /teams/public (every field subset, several pages, prefix search), /announcements,
+the leaderboard in every mode (total, week=, sum_of_weeks, best_of) and
+/leaderboard/weeks, the body built from column tuples + `dumps` must be byte-for-byte
+what the ORM + TypeAdapter path produces. Afterwards both paths are timed on a
+single page holding every team, with tracemalloc peaks. Exits non-zero on any mismatch.
+"""
+import argparse
+import gc
+import itertools
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from .common import seed_league, temp_database
+
+
+def seed_edge_cases(engine, models, start_id: int):
+    """Rows that trip naive serializers: integer scores, microseconds, non-ASCII."""
+    with engine.begin() as conn:
+        conn.execute(models.Team.__table__.insert(), [
+            {"id": start_id, "name": "ünïcödé team", "member1": "\"q\"", "member2": "\\", "member3": "😀",
+             "banned": False, "submission_count": 3, "total_score": 10, "created_at": datetime(2030, 1, 1, 0, 0, 0, 123456)},
+            {"id": start_id + 1, "name": "float-edge", "member1": "a", "member2": "b", "member3": "c",
+             "banned": False, "submission_count": 1, "total_score": 0.1 + 0.2, "created_at": datetime(2030, 1, 1)},
+        ])
+        # An integer written straight into the REAL column, like a RETURNING/aggregate result
+        conn.exec_driver_sql("UPDATE teams SET total_score = 7 WHERE id = ?", (start_id + 1,))
+
+
+def reference_teams(db, models, schemas, cursor, limit, include, q):
+    """The previous implementation: full ORM entities through TypeAdapter(list[TeamOut])."""
+    from pydantic import TypeAdapter
+    from backend.pagination import keyset_page
+    adapter = TypeAdapter(list[schemas.TeamOut])
+    query = db.query(models.Team).filter(models.Team.banned == False)
+    if q:
+        query = query.filter(models.Team.name >= q, models.Team.name < q + "\U0010ffff")
+    teams, _ = keyset_page(query, models.Team.created_at, models.Team.id, cursor, limit)
+    teams = adapter.validate_python(teams, from_attributes=True)
+    return adapter.dump_json(teams, include={"__all__": include} if include else None)
+
+
+def reference_announcements(db, models, schemas, cursor, limit, include):
+    from pydantic import TypeAdapter
+    from backend.pagination import keyset_page
+    adapter = TypeAdapter(list[schemas.AnnouncementOut])
+    rows, _ = keyset_page(db.query(models.Announcement), models.Announcement.created_at, models.Announcement.id, cursor, limit)
+    rows = adapter.validate_python(rows, from_attributes=True)
+    return adapter.dump_json(rows, include={"__all__": include} if include else None)
+
+
+def measure(fn):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--teams", type=int, default=50_000)
+    parser.add_argument("--no-bench", action="store_true", help="only check equivalence")
+    args = parser.parse_args(argv)
+
+    tmp, _ = temp_database("projection.db")
+    from pydantic import TypeAdapter
+    from backend import crud, main as api, models, schemas
+    from backend.database import SessionLocal, engine
+    from backend.leaderboard import Leaderboard
+
+    seed_league(engine, args.teams, args.teams * 2, 300)
+    seed_edge_cases(engine, models, args.teams + 1)
+
+    failures = checked = 0
+
+    def check(name, fast, reference):
+        nonlocal failures, checked
+        checked += 1
+        if callable(fast):
+            try:
+                fast = fast()
+            except Exception as exc:
+                failures += 1
+                print(f"[FAIL] {name}: {type(exc).__name__}: {exc}")
+                return
+        if fast != reference:
+            failures += 1
+            at = next((i for i, (a, b) in enumerate(zip(fast, reference)) if a != b), min(len(fast), len(reference)))
+            print(f"[FAIL] {name}: first difference at byte {at}")
+            print(f"       fast:      {fast[max(0, at - 60):at + 60]!r}")
+            print(f"       reference: {reference[max(0, at - 60):at + 60]!r}")
+
+    fields = list(schemas.TeamOut.model_fields)
+    subsets = [None] + [set(c) for n in (1, 2, 3) for c in itertools.combinations(fields, n)]
+    with SessionLocal() as db:
+        for include in subsets:
+            for q in (None, "team-00001", "ünï"):
+                cursor = None
+                for _ in range(3):  # first pages, following X-Next-Cursor
+                    body, headers = api.public_teams_json(db, cursor, 50, include, q)
+                    check(f"teams include={include} q={q} cursor={cursor}", body, reference_teams(db, models, schemas, cursor, 50, include, q))
+                    cursor = headers.get("X-Next-Cursor")
+                    if not cursor:
+                        break
+        for include in [None] + [{f} for f in schemas.AnnouncementOut.model_fields]:
+            body, headers = api.announcements_json(db, None, 100, include)
+            check(f"announcements include={include}", body, reference_announcements(db, models, schemas, None, 100, include))
+            cursor = headers["X-Next-Cursor"]
+            body, _ = api.announcements_json(db, cursor, 100, include)
+            check(f"announcements include={include} page 2", body, reference_announcements(db, models, schemas, cursor, 100, include))
+
+        orm_board, row_board = Leaderboard(), Leaderboard()
+        orm_board.rebuild(db.query(models.Team).filter(models.Team.banned == False).all())
+        row_board.rebuild(crud.active_team_rows(db))
+        check("leaderboard rows", api.dumps(row_board.page()), TypeAdapter(list[dict]).dump_json(orm_board.page()))
+
+        # The database-backed modes, built as GET /leaderboard and /leaderboard/weeks do
+        as_dicts = TypeAdapter(list[dict])
+        weeks = crud.list_weeks(db)
+        check("leaderboard/weeks", lambda: api.dumps(weeks), as_dicts.dump_json(weeks))
+        for week in [weeks[0]["week"], weeks[-1]["week"], "1999-W01"]:
+            for offset, limit in ((0, None), (10, 25)):
+                rows = crud.weekly_leaderboard(db, week, offset, limit)
+                check(f"leaderboard week={week} offset={offset}", lambda: api.dumps(rows), as_dicts.dump_json(rows))
+        for mode, n in (("sum_of_weeks", 3), ("best_of", 1), ("best_of", 3)):
+            for offset, limit in ((0, None), (10, 25)):
+                rows = crud.multi_week_leaderboard(db, mode, n, offset, limit)
+                check(f"leaderboard mode={mode} n={n} offset={offset}", lambda: api.dumps(rows), as_dicts.dump_json(rows))
+    print(f"{checked} bodies compared, {failures} mismatch(es)")
+
+    if not args.no_bench:
+        everything = args.teams + 2
+        with SessionLocal() as db:
+            runs = {
+                "teams/public, old": lambda: reference_teams(db, models, schemas, None, everything, None, None),
+                "teams/public, new": lambda: api.public_teams_json(db, None, everything, None, None),
+                "leaderboard load, old": lambda: Leaderboard().rebuild(db.query(models.Team).filter(models.Team.banned == False).all()),
+                "leaderboard load, new": lambda: Leaderboard().rebuild(crud.active_team_rows(db)),
+            }
+            print(f"\n  {'one page of ' + str(everything) + ' teams':<28}{'seconds':>10}{'peak MB':>10}")
+            for name, fn in runs.items():
+                db.expunge_all()
+                elapsed, peak = measure(fn)
+                print(f"  {name:<28}{elapsed:>10.3f}{peak / 2**20:>10.1f}")
+    engine.dispose()
+    tmp.cleanup()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
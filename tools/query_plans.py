@@ -0,0 +1,126 @@
+"""Query-plan regression check for the API's hot queries.
+
+    python -m tools.query_plans                        # seed a temp SQLite db with 100k teams
+    python -m tools.query_plans --teams 20000 --submissions 100000
+    python -m tools.query_plans --database-url postgresql://...     # seeds into that database
+
+Each check calls the same helper the endpoint uses, captures the SQL it emits and
+runs EXPLAIN QUERY PLAN (SQLite) or EXPLAIN (PostgreSQL) on it. The command exits
+non-zero if any plan falls back to a full table scan.
+"""
+import argparse
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+from .common import seed_league, temp_database, use_database
+
+_SQLITE_FULL_SCAN = re.compile(r"^SCAN (\w+)$")
+_PG_FULL_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+def checks(teams: int):
+    from backend import auth, crud, main, models
+    from backend.pagination import encode_cursor
+
+    mid = teams // 2 + 1
+    cursor = encode_cursor(datetime(2025, 1, 1) + timedelta(seconds=mid // 3), mid)
+    return [
+        ("GET /teams/public", lambda db: main.public_teams_json(db, None, 100, None, None)),
+        ("GET /teams/public?cursor=", lambda db: main.public_teams_json(db, cursor, 100, None, None)),
+        ("GET /teams/public?q=", lambda db: main.public_teams_json(db, None, 100, None, "team-00012")),
+        ("GET /announcements", lambda db: main.announcements_json(db, None, 100, None)),
+        ("GET /announcements?cursor=", lambda db: main.announcements_json(db, cursor, 100, None)),
+        ("auth: user by username", lambda db: auth.get_user_by_username(db, f"user-{mid:07d}")),
+        ("GET /teams/me", lambda db: db.get(models.Team, mid)),
+        ("POST /teams/create: name check", lambda db: db.query(models.Team).filter(models.Team.name == "team-0000042").first()),
+        ("POST /submissions", lambda db: crud.record_submission(db, mid + 1, 1.0, "2025-W35")),
+        ("team mutation: member eviction", lambda db: main.forget_team_members(db, mid)),
+        ("team submissions by time", lambda db: db.query(models.Submission)
+            .filter(models.Submission.team_id == mid)
+            .order_by(models.Submission.submitted_at.desc()).limit(50).all()),
+        ("GET /leaderboard?week=", lambda db: crud.weekly_leaderboard(db, "2025-W35", 0, 100)),
+        ("week top scores", lambda db: db.query(models.Submission)
+            .filter(models.Submission.week == "2025-W35")
+            .order_by(models.Submission.score.desc()).limit(50).all()),
+        ("GET /leaderboard?mode=sum_of_weeks", lambda db: crud.multi_week_leaderboard(db, "sum_of_weeks", 3, 0, 100)),
+        ("GET /leaderboard?mode=best_of", lambda db: crud.multi_week_leaderboard(db, "best_of", 3, 0, 100)),
+        ("GET /leaderboard/weeks", crud.list_weeks),
+        ("GET /leaderboard/stats", lambda db: crud.week_and_previous_scores(db)),
+        ("GET /leaderboard/stats?week=", lambda db: crud.week_and_previous_scores(db, "2025-W35")),
+    ]
+
+
+def explain(conn, dialect: str, statement: str, params):
+    if dialect == "sqlite":
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, params).fetchall()
+        plan = [row[-1] for row in rows]
+        # Scanning a materialized subquery reads its temp table, not one of ours
+        derived = {line.split()[1] for line in plan if line.startswith("MATERIALIZE ")}
+        scans = [m.group(1) for m in map(_SQLITE_FULL_SCAN.match, plan) if m and m.group(1) not in derived]
+    else:
+        rows = conn.exec_driver_sql("EXPLAIN " + statement, params).fetchall()
+        plan = [row[0] for row in rows]
+        scans = [m.group(1) for line in plan for m in [_PG_FULL_SCAN.search(line)] if m]
+    return plan, scans
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="database to seed and inspect (default: temp SQLite file)")
+    parser.add_argument("--teams", type=int, default=100_000)
+    parser.add_argument("--submissions", type=int, default=500_000)
+    parser.add_argument("--announcements", type=int, default=5_000)
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every plan")
+    args = parser.parse_args(argv)
+
+    tmp = None
+    if args.database_url:
+        use_database(args.database_url)
+    else:
+        tmp, _ = temp_database("plans.db")
+    from sqlalchemy import event
+    from backend.database import ASYNC_MODE, SessionLocal, engine
+
+    if ASYNC_MODE:
+        parser.error("use a sync driver URL (plans are captured from the sync engine)")
+    started = time.perf_counter()
+    seed_league(engine, args.teams, args.submissions, args.announcements, analyze=True)
+    print(f"seeded {args.teams} teams / {args.submissions} submissions in {time.perf_counter() - started:.1f}s")
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+            captured.append((statement, parameters))
+
+    failures = 0
+    dialect = engine.dialect.name
+    for name, run in checks(args.teams):
+        captured.clear()
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            with SessionLocal() as db:
+                run(db)
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+        with engine.connect() as conn:
+            for statement, params in list(captured):
+                plan, scans = explain(conn, dialect, statement, params)
+                status = "FULL SCAN of " + ", ".join(scans) if scans else "ok"
+                failures += bool(scans)
+                print(f"[{'FAIL' if scans else ' ok '}] {name}: {status}")
+                if scans or args.verbose:
+                    print("       " + " ".join(statement.split()))
+                    for line in plan:
+                        print("         " + line)
+    if tmp is not None:
+        engine.dispose()
+        tmp.cleanup()
+    print(f"{failures} full scan(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""Concurrent read throughput during a write burst, per SQLite profile.
+
+    python -m tools.sqlite_bench                          # default vs performance
+    python -m tools.sqlite_bench --readers 8 --writers 4 --writes 4000
+    python -m tools.sqlite_bench --profile performance --teams 20000
+
+Seeds one database, then for each SQLITE_PROFILE runs a child process on a fresh
+copy of it (journal mode sticks to the file): --writers threads record
+--writes submissions between them, one commit each, through the write sessions,
+while --readers threads page the weekly leaderboard and the public team list
+through the read sessions, the way GET handlers do. Reports reads/s, read
+p50/p99 latency, writes/s and "database is locked" errors while the burst runs.
+The performance profile exists to make those errors go away: any is a failure.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+from .common import ROOT, seed_league, temp_database
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def child(args):
+    from sqlalchemy import select
+    from sqlalchemy.exc import OperationalError
+    from backend import crud, models
+    from backend.database import ReadSessionLocal, SessionLocal
+
+    with ReadSessionLocal() as db:
+        week = crud.list_weeks(db)[0]["week"]  # newest
+    teams = models.Team.__table__
+    page = select(teams.c.id, teams.c.name, teams.c.total_score).where(teams.c.banned == False).order_by(teams.c.id).limit(50)
+    done = threading.Event()
+    latencies, errors, writes = [], {"read": 0, "write": 0}, [0]
+    lock = threading.Lock()
+
+    def reader(seed):
+        rng = random.Random(seed)
+        own = []
+        while not done.is_set():
+            started = time.perf_counter()
+            try:
+                with ReadSessionLocal() as db:
+                    if rng.random() < 0.5:
+                        crud.weekly_leaderboard(db, week, rng.randrange(0, 200), 50)
+                    else:
+                        db.execute(page.where(teams.c.id > rng.randrange(args.teams))).all()
+            except OperationalError:
+                with lock:
+                    errors["read"] += 1
+                continue
+            own.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(own)
+
+    def writer(seed, count):
+        rng = random.Random(seed)
+        for _ in range(count):
+            try:
+                with SessionLocal() as db:
+                    crud.record_submission(db, rng.randrange(1, args.teams + 1), float(rng.randrange(100)), week)
+            except OperationalError:
+                with lock:
+                    errors["write"] += 1
+                continue
+            with lock:
+                writes[0] += 1
+
+    readers = [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    share = args.writes // args.writers
+    writers = [threading.Thread(target=writer, args=(1000 + i, share)) for i in range(args.writers)]
+    for thread in readers:
+        thread.start()
+    started = time.perf_counter()
+    for thread in writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    for thread in readers:
+        thread.join()
+    if writes[0] + errors["write"] != share * args.writers:
+        return 1  # a writer died, its traceback is above
+    print(json.dumps({
+        "seconds": elapsed,
+        "reads": len(latencies) / elapsed,
+        "p50": percentile(latencies, 0.50) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+        "writes": writes[0] / elapsed,
+        "read_errors": errors["read"],
+        "write_errors": errors["write"],
+    }))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--teams", type=int, default=5000)
+    parser.add_argument("--submissions", type=int, default=200_000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--writes", type=int, default=2000, help="submissions in the burst")
+    parser.add_argument("--profile", action="append", choices=("default", "performance"), help="repeatable; default: both")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        return child(args)
+
+    tmp, seeded = temp_database("seed.db", SQLITE_PROFILE="default")
+    from backend.database import engine
+
+    started = time.perf_counter()
+    seed_league(engine, args.teams, args.submissions, batch=50_000)
+    engine.dispose()
+    print(f"seeded {args.teams} teams / {args.submissions} submissions in {time.perf_counter() - started:.1f}s")
+    print(f"{args.readers} readers, {args.writers} writers recording {args.writes} submissions\n")
+
+    print(f"  {'profile':<13}{'reads/s':>9}{'read p50 ms':>13}{'read p99 ms':>13}{'writes/s':>10}{'locked r/w':>12}")
+    failures = 0
+    for profile in args.profile or ("default", "performance"):
+        path = os.path.join(tmp.name, f"{profile}.db")
+        shutil.copyfile(seeded, path)
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{path}", "SQLITE_PROFILE": profile}
+        command = [sys.executable, "-m", "tools.sqlite_bench", "--child", profile, "--teams", str(args.teams),
+                   "--readers", str(args.readers), "--writers", str(args.writers), "--writes", str(args.writes)]
+        out = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+        if out.returncode:
+            failures += 1
+            print(f"[FAIL] {profile}:\n{out.stderr}")
+            continue
+        r = json.loads(out.stdout.splitlines()[-1])
+        print(f"  {profile:<13}{r['reads']:>9.0f}{r['p50']:>13.2f}{r['p99']:>13.2f}{r['writes']:>10.0f}"
+              f"{str(r['read_errors']) + '/' + str(r['write_errors']):>12}")
+        if profile == "performance" and (r["read_errors"] or r["write_errors"]):
+            failures += 1
+            print(f"[FAIL] {profile}: {r['read_errors']} read(s) and {r['write_errors']} write(s) hit a locked database")
+    tmp.cleanup()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
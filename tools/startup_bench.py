@@ -0,0 +1,129 @@
+"""Cold-start benchmark: process start to the first `/` response.
+
+    python -m tools.startup_bench                         # 5 cold starts on a 10k-team database
+    python -m tools.startup_bench --runs 10 --out startup.json
+    python -m tools.startup_bench --baseline startup.json # exit 1 on a regression
+    python -m tools.startup_bench --max-seconds 2.5       # exit 1 above a fixed budget
+
+Seeds and migrates a SQLite database, then repeatedly boots
+`uvicorn backend.main:app` on it (with ADMIN_USERNAME/ADMIN_PASSWORD set, as in
+production) and times how long until GET / answers 200. Also times a bare
+`import backend.main` in a fresh interpreter, which every worker pays. A median
+cold start more than --tolerance slower than the --baseline run, or above
+--max-seconds, counts as a regression. Needs httpx (pip install httpx).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+from .common import ROOT, seed_league, temp_database
+
+ADMIN = ("startup-admin", "startup-admin-password")
+
+
+def time_import(env) -> float:
+    code = "import time; t = time.perf_counter(); import backend.main; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def cold_start(args, env) -> float:
+    import httpx
+    cmd = [
+        sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(args.port),
+        "--workers", str(args.workers), "--log-level", "warning", "--no-access-log",
+    ]
+    # Built up front: a client per attempt would compete with the server for the CPU
+    client = httpx.Client(base_url=f"http://127.0.0.1:{args.port}", timeout=1.0)
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+    try:
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise SystemExit(f"server exited with {proc.returncode}")
+            try:
+                if client.get("/").status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.005)
+        raise SystemExit("server did not come up within 60s")
+    finally:
+        client.close()
+        proc.terminate()
+        proc.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--teams", type=int, default=10_000)
+    parser.add_argument("--submissions", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--async-db", action="store_true", help="run the server on sqlite+aiosqlite")
+    parser.add_argument("--port", type=int, default=8798)
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--baseline", help="JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs. the baseline (0.25 = 25%%)")
+    parser.add_argument("--max-seconds", type=float, help="fail when the median cold start exceeds this")
+    args = parser.parse_args(argv)
+
+    tmp, path = temp_database("startup.db")
+    from backend.database import engine
+
+    seed_league(engine, args.teams, args.submissions)
+    engine.dispose()
+    print(f"seeded {args.teams} teams / {args.submissions} submissions")
+
+    env = dict(
+        os.environ, DATABASE_URL=f"sqlite{'+aiosqlite' if args.async_db else ''}:///{path}",
+        ADMIN_USERNAME=ADMIN[0], ADMIN_PASSWORD=ADMIN[1],
+    )
+    # The first boot also creates the admin account; later ones find it
+    first = cold_start(args, env)
+    imports = [time_import(env) for _ in range(args.runs)]
+    starts = [cold_start(args, env) for _ in range(args.runs)]
+    results = {
+        "meta": {
+            "python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+            "teams": args.teams, "workers": args.workers, "async_db": args.async_db,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "first_boot_s": round(first, 3),
+        "import_s": round(statistics.median(imports), 3),
+        "cold_start_s": round(statistics.median(starts), 3),
+        "cold_start_max_s": round(max(starts), 3),
+    }
+    tmp.cleanup()
+    print(f"\n  {'first boot (seeds admin)':<28}{results['first_boot_s']:>8.3f}s")
+    print(f"  {'import backend.main':<28}{results['import_s']:>8.3f}s  (median of {args.runs})")
+    print(f"  {'cold start to first /':<28}{results['cold_start_s']:>8.3f}s  (median of {args.runs}, max {results['cold_start_max_s']:.3f}s)")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nresults written to {args.out}")
+    regressions = []
+    if args.max_seconds is not None and results["cold_start_s"] > args.max_seconds:
+        regressions.append(f"cold start {results['cold_start_s']:.3f}s > budget {args.max_seconds:.3f}s")
+    if args.baseline:
+        with open(args.baseline) as f:
+            then = json.load(f)
+        for key in ("cold_start_s", "import_s"):
+            if then.get(key) and results[key] > then[key] * (1 + args.tolerance):
+                regressions.append(f"{key} {then[key]:.3f}s -> {results[key]:.3f}s")
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if args.baseline or args.max_seconds is not None:
+        print(f"\n{len(regressions)} regression(s)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
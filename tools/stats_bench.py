@@ -0,0 +1,181 @@
+"""Microbenchmark: /leaderboard/stats on NumPy arrays vs. the same figures in pure Python.
+
+    python -m tools.stats_bench                    # 100k teams, 5 runs
+    python -m tools.stats_bench --teams 1000000 --runs 3 --bins 50
+
+Builds a synthetic leaderboard (--teams entries in rank order) and two weeks of
+weekly_scores rows, then times what the endpoint does on a cache miss: build
+the per-team arrays (z-scores, percentile ranks, week-over-week deltas),
+summarize them (percentiles, histograms) and cut the first page of rows, once
+with backend.stats.LeaderboardStats and once with a straightforward list-and-
+loop version, the way a dashboard would on /teams/public. Exits 1 if the two
+disagree. No database involved.
+"""
+import argparse
+import bisect
+import math
+import random
+import statistics
+import sys
+import time
+
+from backend.stats import PERCENTILES, LeaderboardStats, TeamColumns
+
+PAGE = 100
+
+
+def synthetic(teams: int, seed: int = 7):
+    rng = random.Random(seed)
+    entries = [
+        {"team_id": i + 1, "team_name": f"team-{i + 1:07d}", "submission_count": rng.randint(0, 500),
+         "total_score": round(rng.lognormvariate(6, 1), 3)}
+        for i in range(teams)
+    ]
+    entries.sort(key=lambda e: (-e["total_score"], e["team_id"]))
+    # Weekly rows include a few unranked (banned) teams, which must be ignored
+    week_rows, previous_rows = [
+        [(team_id, round(rng.uniform(0, 500), 3)) for team_id in range(1, teams + teams // 50 + 1) if rng.random() < share]
+        for share in (0.7, 0.6)
+    ]
+    return entries, "2025-W02", "2025-W01", week_rows, previous_rows
+
+
+# ---------- pure-Python baseline ----------
+def py_describe(values, bins: int) -> dict:
+    if not values:
+        return {"count": 0}
+    ordered, n = sorted(values), len(values)
+    mean = math.fsum(values) / n
+    quantiles = {}
+    for p in PERCENTILES:
+        pos = (n - 1) * p / 100
+        lo = int(pos)
+        hi = min(lo + 1, n - 1)
+        quantiles[f"p{p}"] = ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+    low, high = ordered[0], ordered[-1]
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    width = (high - low) / bins
+    counts = [0] * bins
+    for x in values:
+        counts[min(int((x - low) / width), bins - 1)] += 1
+    return {
+        "count": n, "mean": mean, "std": statistics.pstdev(values, mean), "min": ordered[0], "max": ordered[-1],
+        "percentiles": quantiles,
+        "histogram": {"edges": [low + i * width for i in range(bins + 1)], "counts": counts},
+    }
+
+
+def py_stats(entries, week, previous, week_rows, previous_rows, bins: int) -> dict:
+    ranked = [e for e in entries if math.isfinite(e["total_score"])]
+    excluded, entries = len(entries) - len(ranked), ranked
+    n = len(entries)
+    totals = [e["total_score"] for e in entries]
+    counts = [e["submission_count"] for e in entries]
+    mean = math.fsum(totals) / n
+    std = statistics.pstdev(totals, mean)
+    ordered = sorted(totals)
+    index = {e["team_id"]: i for i, e in enumerate(entries)}
+    week_scores, previous_scores = [None] * n, [None] * n
+    for rows, scores in ((week_rows, week_scores), (previous_rows, previous_scores)):
+        for team_id, total in rows:
+            i = index.get(team_id)
+            if i is not None:
+                scores[i] = total
+    deltas = [
+        None if a is None and b is None else (a or 0.0) - (b or 0.0)
+        for a, b in zip(week_scores, previous_scores)
+    ]
+    rows = [
+        {
+            "rank": i + 1, "team_id": e["team_id"], "team_name": e["team_name"],
+            "total_score": e["total_score"], "submission_count": e["submission_count"],
+            "z_score": (e["total_score"] - mean) / std if std > 0 else 0.0,
+            "percentile": bisect.bisect_right(ordered, e["total_score"]) * 100.0 / n,
+            "week_score": week_scores[i], "week_delta": deltas[i],
+        }
+        for i, e in enumerate(entries[:PAGE])
+    ]
+    known = [d for d in deltas if d is not None]
+    return {
+        "teams": n,
+        "excluded": excluded,
+        "total_score": py_describe(totals, bins),
+        "submission_count": py_describe(counts, bins),
+        "week": {
+            "week": week, "previous": previous,
+            "score": py_describe([s for s in week_scores if s is not None], bins),
+            "delta": py_describe(known, bins),
+            "improved": sum(1 for d in known if d > 0),
+            "declined": sum(1 for d in known if d < 0),
+        },
+        "rows": rows,
+    }
+
+
+def np_stats(columns, week, previous, week_rows, previous_rows, bins: int) -> dict:
+    found = LeaderboardStats(*columns.snapshot(), week, previous, week_rows, previous_rows)
+    return {**found.summary(bins), "rows": found.rows(0, PAGE)}
+
+
+def differences(a, b, path="", tolerance=1e-6):
+    """Paths where two results disagree; histogram counts may differ by a value
+    landing on a bin edge, so they are compared in total."""
+    if isinstance(a, dict) and isinstance(b, dict):
+        if a.keys() != b.keys():
+            return [f"{path}: keys {sorted(a)} != {sorted(b)}"]
+        if "counts" in a and "edges" in a:
+            out = differences(a["edges"], b["edges"], path + ".edges", tolerance)
+            return out if sum(a["counts"]) == sum(b["counts"]) else out + [f"{path}.counts"]
+        return [d for k in a for d in differences(a[k], b[k], f"{path}.{k}", tolerance)]
+    if isinstance(a, list) and isinstance(b, list):
+        if len(a) != len(b):
+            return [f"{path}: {len(a)} != {len(b)} items"]
+        return [d for i, (x, y) in enumerate(zip(a, b)) for d in differences(x, y, f"{path}[{i}]", tolerance)]
+    if isinstance(a, float) or isinstance(b, float):
+        if a is None or b is None or not math.isclose(a, b, rel_tol=tolerance, abs_tol=tolerance):
+            return [f"{path}: {a!r} != {b!r}"]
+        return []
+    return [] if a == b else [f"{path}: {a!r} != {b!r}"]
+
+
+def timed(fn, runs: int, *args):
+    times, result = [], None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = fn(*args)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--teams", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--bins", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    entries, week, previous, week_rows, previous_rows = synthetic(args.teams)
+    print(f"{args.teams} teams, {len(week_rows) + len(previous_rows)} weekly rows, {args.bins} bins, median of {args.runs} runs\n")
+    # The API keeps these up to date as the board changes, so loading them is not timed
+    columns = TeamColumns()
+    columns.begin_load()
+    columns.load(0, entries)
+    np_stats(columns, week, previous, week_rows, previous_rows, args.bins)  # imports NumPy
+    np_s, np_out = timed(np_stats, args.runs, columns, week, previous, week_rows, previous_rows, args.bins)
+    py_s, py_out = timed(py_stats, args.runs, entries, week, previous, week_rows, previous_rows, args.bins)
+    found = LeaderboardStats(*columns.snapshot(), week, previous, week_rows, previous_rows)
+    summary_s, _ = timed(found.summary, args.runs, args.bins)
+
+    print(f"  {'numpy (snapshot + build + summary + page)':<44}{np_s * 1000:>9.1f} ms")
+    print(f"  {'  of which summary':<44}{summary_s * 1000:>9.1f} ms")
+    print(f"  {'pure Python':<44}{py_s * 1000:>9.1f} ms")
+    print(f"  {'speedup':<44}{py_s / np_s:>9.1f} x")
+    mismatches = differences(np_out, py_out)
+    for line in mismatches[:20]:
+        print(f"MISMATCH {line}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())